@@ -0,0 +1,78 @@
+"""Re-entrant calculation API.
+
+calculate() runs the report pipeline for one uploaded file inside its own
+run context (config.run_context). Rate tables, thresholds and the output
+folder are private to the call, so calls can run concurrently from several
+threads. The parsed duty tariff is shared read-only between calls (see
+main.load_duty_dict). Each call writes its reports to its own folder, a
+temporary one unless output_dir is given. It returns the summary figures
+and the report files.
+"""
+
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+from config import run_context
+from main import process_data
+
+# Settings a caller may override per call
+SETTINGS = [
+    "VAT_RATES", "COMMISSION_RATES", "DUTY_EXCLUDED_COUNTRIES", "CONSIGNMENT_THRESHOLD",
+    "DEFAULT_RETURN_PERIOD", "VALIDATION_MODE",
+]
+
+# Settings of every call: no on-disk state shared between calls, no worker processes
+RUN_DEFAULTS = {
+    "CHECKPOINT_DIR": None,
+    "RESULT_CACHE_DIR": None,
+    "DEDUP_INDEX_DIR": None,
+    "LOOKUP_INDEX_PATH": None,
+    "RGR_WORKERS": 1,
+}
+
+
+def calculate(
+        content: bytes,
+        data_type: str,
+        backend: str = "pandas",
+        outputs: Optional[Iterable[str]] = None,
+        settings: Optional[Dict[str, Any]] = None,
+        output_dir: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Compute the reports for one input file.
+
+    Args:
+        content: the input file's bytes
+        data_type: "csv", "xlsx" or "parquet"
+        backend, outputs: as for main.process_data
+        settings: overrides of SETTINGS for this call only (e.g. {"CONSIGNMENT_THRESHOLD": 150})
+        output_dir: folder to keep the reports in (default: a temporary folder)
+
+    Returns:
+        "summary": the INFORMATION.xlsx rows (None when not requested),
+        "files": report path relative to the output folder -> file bytes
+    """
+    if data_type not in ["csv", "xlsx", "parquet"]:
+        raise ValueError(f"Invalid data_type: {data_type}. Must be 'csv', 'xlsx' or 'parquet'")
+    settings = settings or {}
+    unknown = [name for name in settings if name not in SETTINGS]
+    if unknown:
+        raise ValueError(f"Settings {unknown} cannot be overridden. Must be among {SETTINGS}")
+
+    with tempfile.TemporaryDirectory(prefix="procarrier-") as work_dir:
+        input_file = Path(work_dir) / f"input.{data_type}"
+        input_file.write_bytes(content)
+        target = Path(output_dir or Path(work_dir) / "results").resolve()
+
+        with run_context(**{**RUN_DEFAULTS, **settings}):
+            results = process_data(str(input_file), data_type, str(target), backend=backend, outputs=outputs)
+
+        files = {
+            path.relative_to(target).as_posix(): path.read_bytes()
+            for path in sorted(target.rglob("*")) if path.is_file()
+        }
+
+    summary = results["summary"]["SUMMARY"] if "summary" in results else None
+    return {"summary": summary, "files": files}
@@ -0,0 +1,178 @@
+"""Multi-threaded Arrow CSV reader for consignment extracts.
+
+Extracts arrive from SFTP as .csv, .csv.gz or .csv.zst. The reader opens
+compressed files as a decompressing stream (pyarrow.input_stream), so they
+are never unpacked to disk, and the Arrow CSV parser parses the stream on
+all cores, block by block. The pipeline's schema is applied while parsing:
+
+- only the planned columns (ReadPlanner usecols) are converted;
+- identifier and free-text columns (TEXT_COLUMNS) are always read as text,
+  so MRNs, parcel IDs and tracking numbers are never turned into numbers;
+- the remaining columns are inferred as pandas would (int64 / float64 /
+  text), with pandas' default missing-value strings.
+
+The result has the same values and dtypes as pd.read_csv on the same
+columns, so every backend and report is unchanged. Set
+Config.CSV_READER = "pandas" to go back to pd.read_csv.
+
+Benchmark against pd.read_csv on a 1 GB+ extract with the JUL-SEP schema
+(the sample file's rows repeated), plain and gzip-compressed:
+
+    python arrow_csv.py "../JUL-SEP DATA.csv" --size-gb 1.2
+"""
+
+import argparse
+import gzip
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pv
+
+from config import Config
+
+# Strings pandas.read_csv treats as missing by default
+NA_VALUES = [
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan",
+    "1.#IND", "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None",
+    "n/a", "nan", "null",
+]
+
+# Compressed file suffix -> Arrow codec
+COMPRESSION = {".gz": "gzip", ".zst": "zstd", ".zstd": "zstd"}
+
+
+class ArrowCsvReader:
+    """Reads plain or compressed CSV extracts with the Arrow CSV parser."""
+
+    # Columns parsed as text whatever their values look like
+    TEXT_COLUMNS = [
+        'Parcel ID', 'MRN', 'Consignee Country', 'Consignee Name', 'Courier Tracking #',
+        'Line Item Name', 'Entry Date', 'EU Export Date',
+    ]
+
+    @staticmethod
+    def compression(file_name: str) -> Optional[str]:
+        """Arrow codec of a compressed file (by suffix), None for plain files."""
+        return COMPRESSION.get(Path(file_name).suffix.lower())
+
+    @staticmethod
+    def open(file_name: str) -> pa.NativeFile:
+        """The file's bytes, decompressed on the fly when compressed."""
+        return pa.input_stream(file_name, compression=ArrowCsvReader.compression(file_name))
+
+    @staticmethod
+    def read_header(file_name: str) -> List[str]:
+        """Column names, reading only the first block."""
+        with ArrowCsvReader.open(file_name) as stream:
+            reader = pv.open_csv(stream, read_options=pv.ReadOptions(block_size=1 << 16))
+            return reader.schema.names
+
+    @staticmethod
+    def read_table(file_name: str, usecols: Optional[List[str]] = None) -> pa.Table:
+        """Parse the file on all cores into an Arrow table of the usecols (default: all)."""
+        header = ArrowCsvReader.read_header(file_name)
+        if usecols is not None:
+            missing = [column for column in usecols if column not in header]
+            if missing:
+                raise ValueError(f"Usecols do not match columns, columns expected but not found: {missing}")
+
+        columns = header if usecols is None else [column for column in header if column in usecols]
+        convert_options = pv.ConvertOptions(
+            include_columns=columns,
+            column_types={column: pa.string() for column in ArrowCsvReader.TEXT_COLUMNS if column in columns},
+            null_values=NA_VALUES,
+            strings_can_be_null=True,
+        )
+        read_options = pv.ReadOptions(use_threads=True, block_size=Config.CSV_BLOCK_BYTES)
+
+        with ArrowCsvReader.open(file_name) as stream:
+            return pv.read_csv(stream, read_options=read_options, convert_options=convert_options)
+
+    @staticmethod
+    def to_pandas(table: pa.Table) -> pd.DataFrame:
+        """pandas frame with pd.read_csv's dtypes (object text with NaN for missing values)."""
+        df = table.to_pandas()
+        for column in df.columns:
+            if table.column(column).null_count == len(table):
+                # pd.read_csv reads an empty column as float NaN
+                df[column] = np.nan
+            elif df[column].dtype == object and table.column(column).null_count:
+                df[column] = df[column].where(df[column].notna(), np.nan)
+            elif pd.api.types.is_datetime64_any_dtype(df[column]):
+                # pd.read_csv leaves dates as text
+                df[column] = table.column(column).cast(pa.string()).to_pandas()
+        return df
+
+    @staticmethod
+    def read(file_name: str, usecols: Optional[List[str]] = None) -> pd.DataFrame:
+        """Read the usecols (default: all) of a plain or compressed CSV extract."""
+        return ArrowCsvReader.to_pandas(ArrowCsvReader.read_table(file_name, usecols))
+
+
+# ==================== BENCHMARK ====================
+
+def build_extract(sample_file: str, size_bytes: int, directory: str) -> Path:
+    """Repeat the sample file's rows into a CSV of at least size_bytes."""
+    header, body = Path(sample_file).read_bytes().split(b"\n", 1)
+    if not body.endswith(b"\n"):
+        body += b"\n"
+
+    path = Path(directory) / "extract.csv"
+    with open(path, "wb") as out:
+        out.write(header + b"\n")
+        written = 0
+        while written < size_bytes:
+            out.write(body)
+            written += len(body)
+    return path
+
+
+def benchmark(sample_file: str, size_gb: float, usecols: Optional[List[str]] = None) -> pd.DataFrame:
+    """Time pd.read_csv against ArrowCsvReader on plain and gzip extracts of size_gb."""
+    from read_planner import ReadPlanner
+
+    usecols = usecols or ReadPlanner.required_columns(ReadPlanner.STAGE_INPUTS)
+    rows = []
+    with tempfile.TemporaryDirectory(prefix="csv-bench-", dir=Config.SQL_TEMP_DIR) as directory:
+        plain = build_extract(sample_file, int(size_gb * 1024 ** 3), directory)
+        compressed = Path(directory) / "extract.csv.gz"
+        with open(plain, "rb") as source, gzip.open(compressed, "wb", compresslevel=1) as target:
+            shutil.copyfileobj(source, target, 16 * 1024 ** 2)
+
+        for path in (plain, compressed):
+            started = time.perf_counter()
+            expected = pd.read_csv(path, usecols=usecols)
+            pandas_seconds = time.perf_counter() - started
+
+            started = time.perf_counter()
+            actual = ArrowCsvReader.read(str(path), usecols)
+            arrow_seconds = time.perf_counter() - started
+
+            pd.testing.assert_frame_equal(actual, expected[actual.columns])
+            del expected, actual
+            rows.append({
+                "File": path.name,
+                "MB": round(path.stat().st_size / 1024 ** 2),
+                "pandas s": round(pandas_seconds, 2),
+                "arrow s": round(arrow_seconds, 2),
+                "Speed-up": round(pandas_seconds / arrow_seconds, 1),
+            })
+
+    results = pd.DataFrame(rows)
+    print(results.to_string(index=False))
+    print("✅ Arrow reader matches pd.read_csv")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the Arrow CSV reader against pd.read_csv.")
+    parser.add_argument("sample_file", help="CSV extract whose rows are repeated (e.g. ../JUL-SEP DATA.csv)")
+    parser.add_argument("--size-gb", type=float, default=1.2)
+    args = parser.parse_args()
+    benchmark(args.sample_file, args.size_gb)
@@ -0,0 +1,146 @@
+"""Execution backends for the ProCarrier pipeline."""
+
+from data_layer import DataLayer
+from lv_processes import LowValueProcessor
+from hv_processes import HighValueProcessor
+from returns_feed import ReturnsFeed
+
+
+class Backend:
+    """
+    Stage interface every backend implements.
+
+    Granular stages (read, clean, ledger, split_declaration, lv_ioss,
+    hv_nl_oss, hv_nl_rgr, hv_ie_rgr, hv_returned_lines, line_keys,
+    apply_returns, drop_lines, select_lines, release_lines, to_pandas) are what the stage graph in main.py
+    calls; load / process_low_value / process_high_value chain them for
+    callers that want the whole pipeline in one go.
+    """
+
+    name = None
+
+    # Whether line-level stage results (clean, ledger) can be checkpointed
+    checkpoint_lines = False
+
+    # Whether independent stages may run on concurrent threads
+    thread_safe = True
+
+    @staticmethod
+    def release_lines(lines):
+        """Free what select_lines set up for a selection once it is no longer used."""
+
+    @classmethod
+    def load(cls, file_name: str, data_type: str, usecols=None):
+        return cls.ledger(cls.clean(cls.read(file_name, data_type, usecols)))
+
+    @classmethod
+    def process_low_value(cls, low_value):
+        return cls.lv_ioss(low_value)
+
+    @classmethod
+    def process_high_value(cls, high_value, duty_dict):
+        hv_declared_in_IE, hv_declared_in_NL = cls.split_declaration(high_value)
+
+        combined_vat_per_country = cls.hv_nl_oss(hv_declared_in_NL)
+        vat_paid_by_broker, vat_to_return_from_nl, combined_refunds = cls.hv_nl_rgr(
+            hv_declared_in_NL, duty_dict
+        )
+        ie_refunds = cls.hv_ie_rgr(hv_declared_in_IE, duty_dict)
+
+        nl_results = [
+            vat_paid_by_broker,
+            vat_to_return_from_nl,
+            combined_vat_per_country,
+            combined_refunds,
+        ]
+        return nl_results, [ie_refunds]
+
+
+class PandasBackend(Backend):
+    """Default eager pandas implementation of the pipeline stages."""
+
+    name = "pandas"
+    checkpoint_lines = True
+
+    @staticmethod
+    def read(file_name: str, data_type: str, usecols=None):
+        return DataLayer.read_input(file_name, data_type, usecols)
+
+    @staticmethod
+    def clean(df):
+        return DataLayer.clean_data(df)
+
+    @staticmethod
+    def ledger(df):
+        return DataLayer.build_ledger(df)
+
+    @staticmethod
+    def line_keys(df, columns):
+        """Key columns of every line, in line order, as a pandas DataFrame."""
+        return df[columns]
+
+    @staticmethod
+    def drop_lines(df, mask):
+        """Remove lines where mask (aligned with line_keys) is True."""
+        return df[~mask]
+
+    @staticmethod
+    def select_lines(df, mask):
+        """Lines where mask (aligned with line_keys) is True; the input lines are left intact."""
+        return df[mask]
+
+    @staticmethod
+    def to_pandas(df):
+        """Ledger lines as a pandas DataFrame."""
+        return df
+
+    @staticmethod
+    def apply_returns(df, returned):
+        """Replace the extract's returned quantities with those from the returns feed."""
+        df = df.copy()
+        df["Line Item Quantity Returned"] = ReturnsFeed.returned_quantities(df, returned)
+        return df
+
+    @staticmethod
+    def split_declaration(high_value_df):
+        return HighValueProcessor.separate_by_declaration_country(
+            HighValueProcessor.clean_columns(high_value_df)
+        )
+
+    @staticmethod
+    def lv_ioss(low_value_df):
+        return LowValueProcessor.process_low_value_data(low_value_df)
+
+    @staticmethod
+    def hv_nl_oss(hv_declared_in_NL):
+        return HighValueProcessor.hv_nl_oss_processing(hv_declared_in_NL)
+
+    @staticmethod
+    def hv_nl_rgr(hv_declared_in_NL, duty_dict):
+        df = HighValueProcessor.duty_paid(hv_declared_in_NL.copy(), duty_dict)
+        return HighValueProcessor.hv_nl_rgr_processing(df, duty_dict)
+
+    @staticmethod
+    def hv_ie_rgr(hv_declared_in_IE, duty_dict):
+        df = HighValueProcessor.duty_paid(hv_declared_in_IE.copy(), duty_dict)
+        return HighValueProcessor.hv_ie_processing(df, duty_dict)[0]
+
+    @staticmethod
+    def hv_returned_lines(high_value_df):
+        """HV ledger lines with returns, as a pandas DataFrame."""
+        return high_value_df[high_value_df["Line Item Quantity Returned"] > 0].copy()
+
+
+def get_backend(name: str):
+    """Return the backend class registered under the given name."""
+    if name == "pandas":
+        return PandasBackend
+    if name == "polars":
+        from polars_backend import PolarsBackend
+
+        return PolarsBackend
+    if name == "duckdb":
+        from sql_backend import SqlBackend
+
+        return SqlBackend
+    raise ValueError(f"Invalid backend: {name}. Must be 'pandas', 'polars' or 'duckdb'")
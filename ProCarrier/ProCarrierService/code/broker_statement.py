@@ -0,0 +1,162 @@
+"""Broker statement reconciliation for NL import VAT.
+
+HighValueProcessor.calculate_vat_paid_by_broker_in_nl estimates what the NL
+broker paid: (consignment value + duty) x NL rate per HV consignment
+declared in NL. The broker's monthly statement lists what it actually paid
+per MRN. This module reconciles the two:
+
+- The expected per-MRN VAT and duty are the line ledger's "Import VAT" and
+  "Duty" summed over the MRN's HV NL lines. These are the same amounts
+  behind the AMOUNT BROKER PAID figure.
+- Statement entries are summed per MRN, since a broker may correct an entry
+  with a second line. MRNs are matched with one hash lookup
+  (pandas Index.get_indexer) over normalised MRN strings.
+- Every MRN is classified as "Matched" or "Mismatched" (VAT or duty differs
+  by more than Config.BROKER_TOLERANCE), "Missing from statement"
+  (computed, not billed) or "Not in ledger" (billed, not an HV NL
+  consignment of this run).
+
+Every MRN goes to BROKER_RECONCILIATION.parquet. All but the matched ones go
+to BROKER_VARIANCES.xlsx, largest variance first.
+"""
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from config import Config
+from report_writer import write_excel
+
+RECONCILIATION_COLUMNS = [
+    "MRN", "Status", "Consignee Country", "Consignment Value",
+    "Expected VAT", "Statement VAT", "VAT Variance",
+    "Expected Duty", "Statement Duty", "Duty Variance", "Statement Entries",
+]
+
+# Excel's sheet row limit (less the header row)
+EXCEL_MAX_ROWS = 1_048_575
+
+
+def _mrn(series: pd.Series) -> pd.Series:
+    """Normalise MRNs (case, surrounding spaces) so statement and ledger keys compare equal."""
+    codes, uniques = pd.factorize(series)
+    normalised = pd.Series(uniques, dtype="string").str.strip().str.upper().to_numpy(dtype=object)
+    return pd.Series(np.where(codes < 0, None, normalised[codes]), index=series.index, dtype=object)
+
+
+class BrokerStatement:
+    """Reconciles the broker's per-MRN statement with the computed broker VAT."""
+
+    # Statement columns; "Duty Paid" is optional
+    STATEMENT_COLUMNS = ["MRN", "VAT Paid", "Duty Paid"]
+
+    REPORT_NAME = "BROKER_RECONCILIATION.parquet"
+    VARIANCES_NAME = "BROKER_VARIANCES.xlsx"
+
+    @staticmethod
+    def read_statement(file_name: str, data_type: str) -> pd.DataFrame:
+        """Read a broker statement (csv, xlsx or parquet)."""
+        if data_type == "csv":
+            statement = pd.read_csv(file_name, dtype={"MRN": str})
+        elif data_type == "parquet":
+            statement = pd.read_parquet(file_name)
+        elif data_type == "xlsx":
+            statement = pd.read_excel(file_name, dtype={"MRN": str})
+        else:
+            raise ValueError(f"Invalid data_type: {data_type}. Must be 'csv', 'xlsx' or 'parquet'")
+
+        missing = [column for column in ["MRN", "VAT Paid"] if column not in statement]
+        if missing:
+            raise ValueError(f"Broker statement {file_name} is missing required columns {missing}")
+        return statement.reindex(columns=BrokerStatement.STATEMENT_COLUMNS)
+
+    @staticmethod
+    def expected(line_ledger: pd.DataFrame) -> pd.DataFrame:
+        """Computed broker VAT and duty per HV consignment declared in NL."""
+        lines = line_ledger[(line_ledger["Class"] == "HV") & (line_ledger["Declared In"] == "NL")]
+        return lines.groupby(_mrn(lines["MRN"]), sort=False).agg(**{
+            "Consignee Country": ("Consignee Country", "first"),
+            "Consignment Value": ("Consignment Value", "first"),
+            "Expected VAT": ("Import VAT", "sum"),
+            "Expected Duty": ("Duty", "sum"),
+        })
+
+    @staticmethod
+    def reconcile(expected: pd.DataFrame, statement: pd.DataFrame, tolerance: float) -> pd.DataFrame:
+        """
+        Join the statement to the expected amounts and classify every MRN.
+
+        Args:
+            expected: BrokerStatement.expected output (indexed by normalised MRN)
+            statement: broker statement with STATEMENT_COLUMNS
+            tolerance: largest absolute VAT / duty difference still "Matched"
+
+        Returns:
+            One row per MRN with RECONCILIATION_COLUMNS
+        """
+        has_duty = statement["Duty Paid"].notna().any()
+        billed = pd.DataFrame({
+            "MRN": _mrn(statement["MRN"]),
+            "Statement VAT": pd.to_numeric(statement["VAT Paid"], errors="coerce"),
+            "Statement Duty": pd.to_numeric(statement["Duty Paid"], errors="coerce"),
+            "Statement Entries": 1,
+        }).dropna(subset=["MRN"])
+        billed = billed.groupby("MRN", sort=False).agg({
+            "Statement VAT": "sum", "Statement Duty": "sum", "Statement Entries": "sum",
+        })
+
+        # Hash join: position of every statement MRN in the expected index (-1 = not computed)
+        positions = expected.index.get_indexer(billed.index)
+        found = positions >= 0
+        on_statement = np.zeros(len(expected), dtype=bool)
+        on_statement[positions[found]] = True
+
+        matched = expected.iloc[positions[found]].assign(**{
+            column: billed[column].to_numpy()[found] for column in billed.columns
+        })
+        unknown = billed[~found]
+        missing = expected[~on_statement].assign(**{"Statement Entries": 0})
+        report = pd.concat([matched, missing, unknown]).rename_axis("MRN").reset_index()
+
+        report["VAT Variance"] = report["Statement VAT"].fillna(0) - report["Expected VAT"].fillna(0)
+        report["Duty Variance"] = report["Statement Duty"].fillna(0) - report["Expected Duty"].fillna(0)
+        if not has_duty:
+            report["Statement Duty"] = np.nan
+            report["Duty Variance"] = 0.0
+
+        within = (report["VAT Variance"].abs() <= tolerance) & (report["Duty Variance"].abs() <= tolerance)
+        status = np.where(within, "Matched", "Mismatched")
+        status = np.where(report["Expected VAT"].isna(), "Not in ledger", status)
+        status = np.where(report["Statement Entries"] == 0, "Missing from statement", status)
+        report["Status"] = status
+        report["Statement Entries"] = report["Statement Entries"].astype(int)
+        return report[RECONCILIATION_COLUMNS]
+
+    @staticmethod
+    def store_reconciliation(report: pd.DataFrame) -> None:
+        """Save every MRN to Parquet and the variances (largest first) to Excel."""
+        data_dir = Path(Config.DATA_DIR)
+        data_dir.mkdir(exist_ok=True)
+
+        report.to_parquet(data_dir / BrokerStatement.REPORT_NAME, index=False, compression="zstd")
+
+        variances = report[report["Status"] != "Matched"]
+        variances = variances.iloc[np.argsort(-variances["VAT Variance"].abs().to_numpy(), kind="stable")]
+        if len(variances) > EXCEL_MAX_ROWS:
+            print(f"⚠️ WARNING: {len(variances)} broker variances, only the largest {EXCEL_MAX_ROWS} "
+                  f"fit in {BrokerStatement.VARIANCES_NAME} (all are in {BrokerStatement.REPORT_NAME})")
+            variances = variances.head(EXCEL_MAX_ROWS)
+        write_excel(variances, data_dir / BrokerStatement.VARIANCES_NAME)
+
+        counts = report["Status"].value_counts().to_dict()
+        print(f"🔎 Broker statement: {counts}, net VAT variance {report['VAT Variance'].sum():,.2f}")
+
+    @staticmethod
+    def reconciliation(line_ledger: pd.DataFrame, statement: pd.DataFrame) -> pd.DataFrame:
+        """Reconcile the statement with the run's line ledger and store the reports."""
+        report = BrokerStatement.reconcile(
+            BrokerStatement.expected(line_ledger), statement, Config.BROKER_TOLERANCE
+        )
+        BrokerStatement.store_reconciliation(report)
+        return report
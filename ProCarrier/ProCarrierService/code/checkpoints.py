@@ -0,0 +1,83 @@
+"""Stage checkpoints for resumable runs.
+
+Expensive stage results are pickled as soon as the stage finishes. The
+store's directory is keyed by the run's fingerprint, which covers the input
+files (path, size, mtime), the backend and options, and the code version.
+Each checkpoint file is also keyed by the Config values at the time the
+stage ran. A rerun after a late failure therefore finds the results of the
+stages that did finish and resumes from there. Changing an input, a rate
+table or the code starts from scratch. A stage that writes reports is only
+restored while those reports still exist in Config.DATA_DIR. The
+checkpoints of a run are removed once it completes.
+"""
+
+import hashlib
+import os
+import pickle
+import shutil
+from pathlib import Path
+from typing import Any, Iterable, Optional
+
+from config import Config
+
+
+def _digest(value: Any) -> str:
+    return hashlib.sha256(repr(value).encode("utf-8")).hexdigest()[:16]
+
+
+def file_fingerprint(file_name: Optional[str]) -> Optional[tuple]:
+    """(path, size, mtime) of an input file; None when there is no file."""
+    if not file_name:
+        return None
+    stat = os.stat(file_name)
+    return str(Path(file_name).resolve()), stat.st_size, stat.st_mtime_ns
+
+
+def config_fingerprint(exclude: Iterable[str] = ()) -> str:
+    """Hash of every Config setting (rate tables, thresholds, paths, ...) except the excluded ones."""
+    exclude = set(exclude)
+    settings = {name: getattr(Config, name) for name in vars(Config) if name.isupper() and name not in exclude}
+    return _digest(sorted(settings.items()))
+
+
+def code_version() -> str:
+    """Hash of the pipeline's source files."""
+    digest = hashlib.sha256()
+    for path in sorted(Path(__file__).parent.glob("*.py")):
+        digest.update(path.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+class CheckpointStore:
+    """Pickled stage results of one run, keyed by its fingerprint."""
+
+    def __init__(self, directory: str, fingerprint: Any):
+        self.path = Path(directory) / _digest((fingerprint, code_version()))
+
+    def file(self, stage: str) -> Path:
+        return self.path / f"{stage}-{config_fingerprint()}.pkl"
+
+    def has(self, stage: str, outputs: Iterable[str] = ()) -> bool:
+        """A checkpoint exists and the reports the stage wrote are still there."""
+        return self.file(stage).exists() and all(
+            (Path(Config.DATA_DIR) / output).exists() for output in outputs
+        )
+
+    def load(self, stage: str) -> Any:
+        with open(self.file(stage), "rb") as f:
+            result = pickle.load(f)
+        print(f"♻️ Resumed {stage} from checkpoint")
+        return result
+
+    def save(self, stage: str, result: Any) -> None:
+        """Write atomically, so a crash mid-write never leaves a corrupt checkpoint."""
+        self.path.mkdir(parents=True, exist_ok=True)
+        target = self.file(stage)
+        partial = target.with_suffix(".tmp")
+        with open(partial, "wb") as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        partial.replace(target)
+
+    def clear(self) -> None:
+        """Remove the run's checkpoints (after it completed)."""
+        shutil.rmtree(self.path, ignore_errors=True)
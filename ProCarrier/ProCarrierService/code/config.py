@@ -1,4 +1,28 @@
-class Config:
+import contextvars
+from contextlib import contextmanager
+
+# Setting overrides of the current run context (None outside run_context)
+_overrides: contextvars.ContextVar = contextvars.ContextVar("config_overrides", default=None)
+
+
+class _RunSettings(type):
+    """Reads settings from the active run context first, then from the class."""
+
+    def __getattribute__(cls, name):
+        overrides = _overrides.get()
+        if overrides is not None and name in overrides:
+            return overrides[name]
+        return super().__getattribute__(name)
+
+    def __setattr__(cls, name, value):
+        overrides = _overrides.get()
+        if overrides is not None and name.isupper():
+            overrides[name] = value
+        else:
+            super().__setattr__(name, value)
+
+
+class Config(metaclass=_RunSettings):
     """Configuration constants for VAT and duty calculations."""
 
     # ==================== VAT RATES ====================
@@ -32,9 +56,99 @@ class Config:
     # Input files
     DEFAULT_DUTY_EXCEL_PATH = "Duties Import Jan 99.xlsx"
 
-    # Return period
+    # Return period of a run that is not split by period (split runs use each period's label)
     DEFAULT_RETURN_PERIOD = "Q3 2024"
 
+    # ==================== CSV READER ====================
+    # "arrow": multi-threaded Arrow parser, reads .csv.gz / .csv.zst without unpacking
+    # "pandas": single-threaded pd.read_csv
+    CSV_READER = "arrow"
+    CSV_BLOCK_BYTES = 16 * 1024 ** 2  # bytes parsed per thread task
+
+    # ==================== XLSX READER ====================
+    # Streaming read-only reader (see xlsx_reader.py)
+    XLSX_SHEETS = ["Sheet1"]  # None -> every sheet with the input columns, read in parallel
+    XLSX_BATCH_ROWS = 50_000  # rows converted to a typed batch at a time
+    XLSX_WORKERS = None  # None -> one worker process per CPU (capped at the sheet count)
+
+    # ==================== SQL ENGINE ====================
+    # Embedded DuckDB engine: spills to disk above the memory limit
+    SQL_MEMORY_LIMIT = "2GB"
+    SQL_TEMP_DIR = None  # None -> system temp directory
+
+    # ==================== RGR DOCUMENTS ====================
+    # Per-parcel RGR refund documents (RGR_DOCUMENTS.zip + RGR_INDEX.csv)
+    RGR_TEMPLATE_PATH = None  # None -> built-in text template
+    RGR_WORKERS = None  # None -> one worker process per CPU
+
+    # ==================== SCENARIOS ====================
+    # Worker processes for large what-if grids (records shared through shared_ledger.py)
+    SCENARIO_WORKERS = 1
+
+    # ==================== MAP / REDUCE ====================
+    # map_reduce.py: worker processes standing in for nodes (None -> one per CPU)
+    MAP_REDUCE_WORKERS = None
+
+    # ==================== DEDUPLICATION ====================
+    # Cross-file line index; None disables the check
+    DEDUP_INDEX_DIR = None
+    DEDUP_MODE = "flag"  # "flag" -> report only, "drop" -> also remove lines of earlier sources
+    DEDUP_MAX_SEGMENTS = 8  # merge index segments beyond this count
+
+    # ==================== BROKER STATEMENT ====================
+    # Largest VAT / duty difference (EUR) per MRN still reconciled as "Matched"
+    BROKER_TOLERANCE = 0.01
+
+    # ==================== VALIDATION ====================
+    # "report" -> exceptions report only, "quarantine" -> also remove consignments with errors
+    VALIDATION_MODE = "report"
+
+    # ==================== PREVIEW ====================
+    # Stratified-sample estimate of the summary figures (--preview)
+    PREVIEW_SAMPLE_SIZE = 2000  # consignments (MRNs)
+    PREVIEW_SEED = 0
+    PREVIEW_CONFIDENCE = 0.95
+
+    # ==================== LINEAGE ====================
+    # Write the line-level audit trail (LINEAGE.parquet) with every run; otherwise
+    # only when it is requested (--outputs LINEAGE.parquet)
+    LINEAGE_OUTPUT = False
+
+    # ==================== CONCURRENCY ====================
+    # Threads running independent stages (reads, LV / HV aggregates) at the same time
+    PIPELINE_WORKERS = 4
+    # Background report writing: writer threads and the bound on queued workbooks
+    REPORT_WRITE_WORKERS = 2
+    REPORT_WRITE_QUEUE = 8
+
+    # ==================== WATCH FOLDER ====================
+    # watch_folder.py daemon: input files dropped in the inbox, one result folder per job in the outbox
+    WATCH_INBOX = "../inbox"
+    WATCH_OUTBOX = "../outbox"
+    WATCH_POLL_SECONDS = 5
+    WATCH_SETTLE_SECONDS = 30  # a file is picked up once its size and mtime stop changing for this long
+
+    # ==================== HTTP SERVICE ====================
+    # http_service.py: local calculation API
+    HTTP_HOST = "127.0.0.1"
+    HTTP_PORT = 8750
+    HTTP_WORKERS = 4  # requests computed at the same time
+    HTTP_MAX_UPLOAD_BYTES = 512 * 1024 ** 2
+
+    # ==================== CHECKPOINTS ====================
+    # Stage results of unfinished runs, so a rerun resumes (e.g. "../.checkpoints"); None disables checkpoints
+    CHECKPOINT_DIR = None
+
+    # ==================== RESULT CACHE ====================
+    # Reports of earlier runs keyed by input content (e.g. "../.result_cache"); None disables the cache
+    RESULT_CACHE_DIR = None
+    RESULT_CACHE_MAX_BYTES = 2 * 1024 ** 3
+    RESULT_CACHE_MAX_AGE_DAYS = 30
+
+    # ==================== LOOKUP INDEX ====================
+    # SQLite history of every run's line ledger; None disables the export
+    LOOKUP_INDEX_PATH = None
+
 
     # ==================== COLUMN DEFINITIONS ====================
     low_value_columns = [
@@ -61,4 +175,23 @@ class Config:
     @staticmethod
     def get_duty_revenue_rate(country: str) -> float:
         """Get duty revenue rate by country."""
-        return Config.COMMISSION_RATES[country]
\ No newline at end of file
+        return Config.COMMISSION_RATES[country]
+
+
+@contextmanager
+def run_context(**settings):
+    """
+    Give the block its own settings: Config reads return these overrides
+    (e.g. VAT_RATES, DATA_DIR), and Config assignments inside the block stay
+    local to it. Contexts nest and are independent per thread; threads started
+    inside the block must run in a copy of it (contextvars.copy_context).
+    """
+    unknown = [name for name in settings if not name.isupper() or not hasattr(Config, name)]
+    if unknown:
+        raise ValueError(f"Unknown settings: {unknown}")
+
+    token = _overrides.set({**(_overrides.get() or {}), **settings})
+    try:
+        yield
+    finally:
+        _overrides.reset(token)
@@ -1,6 +1,9 @@
 import pandas as pd
-from typing import Tuple
-from ProCarrier.ProCarrierService.code.config import Config
+from pathlib import Path
+from typing import List, Optional, Tuple
+from config import Config
+from arrow_csv import ArrowCsvReader, COMPRESSION
+from xlsx_reader import XlsxReader
 import warnings
 
 warnings.filterwarnings('ignore', category=pd.errors.SettingWithCopyWarning)
@@ -9,34 +12,84 @@ warnings.filterwarnings('ignore', category=pd.errors.SettingWithCopyWarning)
 class DataLayer:
     """Handles data loading, cleaning and preparation."""
 
-    @staticmethod
-    def load_excel(excel_path: str) -> Tuple[pd.DataFrame, pd.DataFrame]:
-        df = pd.read_excel(excel_path, sheet_name='Sheet1')
+    # Raw input columns read by clean_data / add_calculated_fields
+    INPUT_COLUMNS = ['Parcel ID', 'MRN', 'Line Item Quantity Imported', 'Line Item Unit Price', 'Consignee Country']
+
+    # Columns added by add_calculated_fields (never read from the input file)
+    CALCULATED_COLUMNS = ['Line Item Total Value', 'Consignment Value', 'VAT Rate']
+
+    # Destinations left out of every report
+    EXCLUDED_COUNTRIES = ['IC', 'CH']
 
-        # If multiple sheets were requested/returned, pick the first sheet's DataFrame
-        if isinstance(df, dict):
-            df = next(iter(df.values()))
+    # MRN placeholders treated as a missing MRN
+    MRN_NA_VALUES = ['#N/A', 'N/A', 'NA', 'na', '']
 
+    @staticmethod
+    def load_excel(excel_path: str, usecols: Optional[List[str]] = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        df = DataLayer.read_excel(excel_path, usecols)
         df = DataLayer.clean_data(df)
         df = DataLayer.add_calculated_fields(df)
         low_value_df, high_value_df = DataLayer.separate_data(df, Config.CONSIGNMENT_THRESHOLD)
         return low_value_df, high_value_df
 
     @staticmethod
-    def load_data(csv_path: str) -> Tuple[pd.DataFrame, pd.DataFrame]:
-        df = pd.read_csv(csv_path)
+    def load_data(csv_path: str, usecols: Optional[List[str]] = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        df = DataLayer.read_csv(csv_path, usecols)
         df = DataLayer.clean_data(df)
         df = DataLayer.add_calculated_fields(df)
         low_value_df, high_value_df = DataLayer.separate_data(df, Config.CONSIGNMENT_THRESHOLD)
         return low_value_df, high_value_df
 
+    @staticmethod
+    def load_parquet(parquet_path: str, usecols: Optional[List[str]] = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        df = pd.read_parquet(parquet_path, columns=usecols)
+        df = DataLayer.clean_data(df)
+        df = DataLayer.add_calculated_fields(df)
+        low_value_df, high_value_df = DataLayer.separate_data(df, Config.CONSIGNMENT_THRESHOLD)
+        return low_value_df, high_value_df
+
+    @staticmethod
+    def data_type(file_name: str) -> str:
+        """Input type from the file extension, ignoring a .gz / .zst compression suffix."""
+        path = Path(file_name)
+        if path.suffix.lower() in COMPRESSION:
+            path = path.with_suffix('')
+        return path.suffix.lstrip('.').lower()
+
+    @staticmethod
+    def read_csv(csv_path: str, usecols: Optional[List[str]] = None) -> pd.DataFrame:
+        """Read a plain, gzip or zstd CSV extract with the Config.CSV_READER parser."""
+        if Config.CSV_READER == 'arrow':
+            return ArrowCsvReader.read(csv_path, usecols)
+        return pd.read_csv(csv_path, usecols=usecols)
+
+    @staticmethod
+    def read_excel(excel_path: str, usecols: Optional[List[str]] = None) -> pd.DataFrame:
+        """Stream the Config.XLSX_SHEETS sheets of a workbook (see xlsx_reader.py)."""
+        return XlsxReader.read(excel_path, usecols)
+
+    @staticmethod
+    def read_input(file_name: str, data_type: str, usecols: Optional[List[str]] = None) -> pd.DataFrame:
+        """Read the raw consignment file without cleaning it."""
+        if data_type == 'csv':
+            return DataLayer.read_csv(file_name, usecols)
+        if data_type == 'parquet':
+            return pd.read_parquet(file_name, columns=usecols)
+        return DataLayer.read_excel(file_name, usecols)
+
+    @staticmethod
+    def build_ledger(df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Add calculated fields and split into low value / high value lines."""
+        df = DataLayer.add_calculated_fields(df)
+        return DataLayer.separate_data(df, Config.CONSIGNMENT_THRESHOLD)
+
     @staticmethod
     def clean_data(df: pd.DataFrame) -> pd.DataFrame:
         # Exclude IC and CH countries
-        df = df[~df['Consignee Country'].isin(['IC', 'CH'])]
+        df = df[~df['Consignee Country'].isin(DataLayer.EXCLUDED_COUNTRIES)]
 
         # Standardize missing values
-        df['MRN'] = df['MRN'].replace(['#N/A', 'N/A', 'NA', 'na', ''], pd.NA)
+        df['MRN'] = df['MRN'].replace(DataLayer.MRN_NA_VALUES, pd.NA)
 
         # Copy Parcel ID where MRN is missing
         df.loc[df['MRN'].isna(), 'MRN'] = df.loc[df['MRN'].isna(), 'Parcel ID']
@@ -0,0 +1,228 @@
+"""Persistent cross-file line-item deduplication index.
+
+Every processed line is identified by a 64-bit hash of its
+(Parcel ID, Line Item ID, MRN) key. The index directory holds segments of
+sorted hashes, each with a parallel array of the source file IDs that
+contributed them, and a manifest.json naming the sources. Segments are
+memory-mapped and probed with np.searchsorted. A bulk lookup of n lines
+against an index of N lines therefore costs O(n log N) and only touches the
+pages it needs, even at hundreds of millions of lines. Once there are more
+than Config.DEDUP_MAX_SEGMENTS segments, they are merged into one.
+
+Sources are named by the input file's full path and return period (see
+main.dedup_source). Re-processing the same file for the same period replaces
+its entries rather than flagging all of its lines as duplicates; a file of
+the same name in another folder or period is a different source.
+
+Lines repeated within one file are listed in the duplicates report but never
+dropped: only lines indexed by an earlier source are.
+
+Checking a run only reads the index. The run's new lines are registered
+(DedupIndex.commit) once its reports are written, so a failed or partial
+run never marks its lines as processed.
+"""
+
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config import Config
+
+
+class DedupIndex:
+    """Hash index of every line processed in earlier runs."""
+
+    KEY_COLUMNS = ['Parcel ID', 'Line Item ID', 'MRN']
+
+    MANIFEST_NAME = "manifest.json"
+    REPORT_NAME = "DUPLICATES.csv"
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+
+        manifest_file = self.path / DedupIndex.MANIFEST_NAME
+        if manifest_file.exists():
+            self.manifest = json.loads(manifest_file.read_text(encoding="utf-8"))
+        else:
+            self.manifest = {"sources": {}, "segments": [], "next_segment": 0}
+
+    # ==================== HASHING ====================
+
+    @staticmethod
+    def hash_lines(keys: pd.DataFrame) -> np.ndarray:
+        """uint64 hash per line of its (Parcel ID, Line Item ID, MRN) key."""
+        normalised = {}
+        for column in DedupIndex.KEY_COLUMNS:
+            values = keys[column]
+            if pd.api.types.is_float_dtype(values) and (values.dropna() % 1 == 0).all():
+                values = values.astype("Int64")  # 1.0 (from a column with gaps) -> 1
+            normalised[column] = values.astype(str).str.strip()
+        return pd.util.hash_pandas_object(pd.DataFrame(normalised), index=False).to_numpy()
+
+    # ==================== SEGMENTS ====================
+
+    def _segment(self, name: str):
+        hashes = np.load(self.path / f"{name}.hashes.npy", mmap_mode="r")
+        sources = np.load(self.path / f"{name}.sources.npy", mmap_mode="r")
+        return hashes, sources
+
+    def _write_segment(self, hashes: np.ndarray, sources: np.ndarray) -> None:
+        order = np.argsort(hashes, kind="stable")
+        name = f"segment_{self.manifest['next_segment']:06d}"
+        self.manifest["next_segment"] += 1
+
+        np.save(self.path / f"{name}.hashes.npy", hashes[order])
+        np.save(self.path / f"{name}.sources.npy", sources[order])
+        self.manifest["segments"].append(name)
+
+    def _delete_segment(self, name: str) -> None:
+        self.manifest["segments"].remove(name)
+        (self.path / f"{name}.hashes.npy").unlink()
+        (self.path / f"{name}.sources.npy").unlink()
+
+    def _save_manifest(self) -> None:
+        manifest_file = self.path / DedupIndex.MANIFEST_NAME
+        manifest_file.write_text(json.dumps(self.manifest, indent=2), encoding="utf-8")
+
+    def source_id(self, source: str) -> int:
+        sources = self.manifest["sources"]
+        if source not in sources:
+            sources[source] = {"id": len(sources), "lines": 0, "indexed": None}
+        return sources[source]["id"]
+
+    def source_names(self) -> Dict[int, str]:
+        return {entry["id"]: name for name, entry in self.manifest["sources"].items()}
+
+    def lookup(self, hashes: np.ndarray, exclude: Optional[str] = None) -> np.ndarray:
+        """Source ID that first indexed each hash (-1 where the hash is new or only indexed by exclude)."""
+        found = np.full(len(hashes), -1, dtype=np.int64)
+        excluded = self.manifest["sources"].get(exclude, {}).get("id", -1)
+
+        # Probe in sorted order so the memory-mapped pages are read sequentially
+        order = np.argsort(hashes)
+        sorted_hashes = hashes[order]
+        for name in self.manifest["segments"]:
+            segment_hashes, segment_sources = self._segment(name)
+            if not len(segment_hashes):
+                continue
+            positions = np.searchsorted(segment_hashes, sorted_hashes)
+            positions = np.minimum(positions, len(segment_hashes) - 1)
+            sources = np.asarray(segment_sources[positions])
+            hit = (np.asarray(segment_hashes[positions]) == sorted_hashes) & (sources != excluded) & (found[order] < 0)
+            found[order[hit]] = sources[hit]
+        return found
+
+    def remove_source(self, source: str) -> None:
+        """Drop a source's hashes from every segment (used when a file is re-processed)."""
+        if source not in self.manifest["sources"]:
+            return
+        source_id = self.manifest["sources"][source]["id"]
+        for name in list(self.manifest["segments"]):
+            hashes, sources = self._segment(name)
+            keep = np.asarray(sources) != source_id
+            if keep.all():
+                continue
+            hashes, sources = np.asarray(hashes)[keep], np.asarray(sources)[keep]
+            self._delete_segment(name)
+            if len(hashes):
+                self._write_segment(hashes, sources)
+        self._save_manifest()
+
+    def add(self, hashes: np.ndarray, source: str) -> None:
+        """Index new line hashes for a source and compact if there are too many segments."""
+        source_id = self.source_id(source)
+        self.manifest["sources"][source].update({
+            "lines": int(len(hashes)),
+            "indexed": datetime.now().isoformat(timespec="seconds"),
+        })
+        if len(hashes):
+            self._write_segment(hashes, np.full(len(hashes), source_id, dtype=np.uint32))
+
+        if len(self.manifest["segments"]) > Config.DEDUP_MAX_SEGMENTS:
+            self.compact()
+        self._save_manifest()
+
+    def compact(self) -> None:
+        """Merge all segments into one."""
+        segments = [self._segment(name) for name in self.manifest["segments"]]
+        hashes = np.concatenate([np.asarray(h) for h, _ in segments])
+        sources = np.concatenate([np.asarray(s) for _, s in segments])
+        del segments
+
+        for name in list(self.manifest["segments"]):
+            self._delete_segment(name)
+        self._write_segment(hashes, sources)
+
+    # ==================== CHECK ====================
+
+    def check(self, keys: pd.DataFrame, source: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Flag lines already processed and write the duplicates report; the index is not changed.
+
+        Args:
+            keys: the run's lines with KEY_COLUMNS, in line order
+            source: name of the input file the lines come from
+
+        Returns:
+            (boolean mask of the lines indexed by an earlier source,
+             hashes of the new lines, to commit once the run has succeeded)
+        """
+        hashes = DedupIndex.hash_lines(keys)
+
+        previous = self.lookup(hashes, exclude=source)
+        processed = previous >= 0
+        # Repeats within this file are only reported
+        repeated = pd.Series(hashes).duplicated().to_numpy() & ~processed
+        duplicate = processed | repeated
+
+        names = self.source_names()
+        report = keys.loc[duplicate, DedupIndex.KEY_COLUMNS].copy()
+        report["Duplicate Of"] = [
+            names[source_id] if source_id >= 0 else f"{source} (repeated line)"
+            for source_id in previous[duplicate]
+        ]
+        DedupIndex.store_duplicates(report)
+
+        return processed, np.unique(hashes[~processed])
+
+    def commit(self, hashes: np.ndarray, source: str) -> None:
+        """Register a successful run's new line hashes, replacing the source's earlier entries."""
+        self.remove_source(source)
+        self.add(hashes, source)
+
+    @staticmethod
+    def store_duplicates(report: pd.DataFrame) -> None:
+        """Save the duplicates report (CSV: overlapping extracts can repeat a whole quarter)."""
+        data_dir = Path(Config.DATA_DIR)
+        data_dir.mkdir(exist_ok=True)
+
+        report.to_csv(data_dir / DedupIndex.REPORT_NAME, index=False)
+
+        if len(report):
+            print(f"⚠️ WARNING: {len(report)} lines were already processed "
+                  f"({Config.DEDUP_MODE}): {report['Duplicate Of'].value_counts().to_dict()}")
+
+
+def lines_to_drop(keys: pd.DataFrame, source: str, index_dir: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Duplicate lines to drop from this run (those of earlier sources in "drop" mode,
+    none in "flag" mode) and the new line hashes to pass to register_lines once the run succeeds.
+    """
+    if Config.DEDUP_MODE not in ["flag", "drop"]:
+        raise ValueError(f"Invalid DEDUP_MODE: {Config.DEDUP_MODE}. Must be 'flag' or 'drop'")
+
+    duplicate, new_hashes = DedupIndex(index_dir or Config.DEDUP_INDEX_DIR).check(keys, source)
+    if Config.DEDUP_MODE == "drop":
+        return duplicate, new_hashes
+    return np.zeros(len(duplicate), dtype=bool), new_hashes
+
+
+def register_lines(hashes: np.ndarray, source: str, index_dir: Optional[str] = None) -> None:
+    """Add a successful run's new lines to the index."""
+    DedupIndex(index_dir or Config.DEDUP_INDEX_DIR).commit(hashes, source)
+    print(f"♻️ {len(hashes)} new lines of {source} added to the dedup index")
@@ -1,10 +1,10 @@
 """Duty calculation and processing logic."""
 
 import pandas as pd
-import numpy as np
-import re
 from typing import Dict
 
+from tariff_lookup import ERGA_OMNES, lookup_duty_rates, parse_duty_rate
+
 import warnings
 
 warnings.filterwarnings('ignore', category=pd.errors.SettingWithCopyWarning)
@@ -13,6 +13,9 @@ warnings.filterwarnings('ignore', category=pd.errors.SettingWithCopyWarning)
 class DutyProcessor:
     """Processes duty data from Excel files and calculates duty rates."""
 
+    # Digits of the HS code the EU tariff rates are keyed by
+    GOODS_CODE_LENGTH = 4
+
     @staticmethod
     def process_duty_data(df: pd.DataFrame) -> Dict[str, float]:
         """
@@ -25,12 +28,12 @@ class DutyProcessor:
             Dictionary mapping 4-digit goods codes to their maximum duty rates
         """
         # Extract first 4 digits from Goods code
-        df['Goods_Code_4'] = df['Goods code'].astype(str).str[:4]
+        df['Goods_Code_4'] = df['Goods code'].astype(str).str[:DutyProcessor.GOODS_CODE_LENGTH]
 
-        df = df[df['Origin'] == 'ERGA OMNES']
+        df = df[df['Origin'] == ERGA_OMNES]
 
         # Create new column with parsed duty rate
-        df['Duty_rate'] = df['Duty'].apply(DutyProcessor.parse_duty_rate)
+        df['Duty_rate'] = df['Duty'].apply(parse_duty_rate)
 
         # Summary of parsing
         total_rows = len(df)
@@ -48,29 +51,11 @@ class DutyProcessor:
         return duty_dict
 
     @staticmethod
-    def parse_duty_rate(val):
+    def duty_rates(hs_codes: pd.Series, duty_dict: Dict[str, float]) -> pd.Series:
         """
-        Parse duty strings and return duty rate as float (e.g. '12.000 %' -> 0.12).
-        Returns np.nan when no percentage can be found (e.g. 'NAR', 'Cond: ...').
+        Duty rate per line: the rate of the HS code's 4-digit goods code
+        (NaN when the tariff has none).
         """
-        if pd.isna(val):
-            return np.nan
-        s = str(val).strip()
-        # Look for percentage like '12.000 %' or '12%' with optional spaces and commas
-        m = re.search(r'([\d]+[.,]?\d*)\s*%', s)
-        if m:
-            num = m.group(1).replace(',', '.')
-            try:
-                return float(num) / 100.0
-            except ValueError:
-                return np.nan
-        # Fallback: if string is purely numeric (no percent sign) take it as percent
-        m2 = re.search(r'^([\d]+[.,]?\d*)$', s)
-        if m2:
-            num = m2.group(1).replace(',', '.')
-            try:
-                return float(num) / 100.0
-            except ValueError:
-                return np.nan
-        # No quantitative value found
-        return np.nan
+        tariff = pd.Series(duty_dict, dtype=float)
+        tariff.index = f"{ERGA_OMNES}:" + tariff.index.astype(str)
+        return lookup_duty_rates(tariff, hs_codes, lengths=[DutyProcessor.GOODS_CODE_LENGTH])
@@ -0,0 +1,157 @@
+"""Local HTTP service for the calculation API (api.calculate).
+
+Endpoints:
+    GET  /health                      -> {"status": "ok", "tariff_codes": ...}
+    POST /calculate?type=csv          body: the input file's bytes
+         &backend=pandas              optional, as for main.py --backend
+         &outputs=IOSS_SUM.xlsx       optional, repeatable
+         &settings={"CONSIGNMENT_THRESHOLD": 150}   optional JSON, see api.SETTINGS
+         &format=json|zip             json (default): summary rows and report names;
+                                      zip: every report file
+
+Requests are served by a pool of Config.HTTP_WORKERS threads, each call in
+its own run context. Libraries and the duty tariff are loaded once at start,
+so warm calls only pay for the calculation itself. Invalid requests get 400
+with {"error": ...}.
+
+Usage:
+    python http_service.py --port 8750
+"""
+
+import argparse
+import io
+import json
+import time
+import traceback
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import api
+import main
+from config import Config
+
+
+class PooledHTTPServer(HTTPServer):
+    """HTTPServer that handles requests on a fixed pool of worker threads."""
+
+    def __init__(self, address, handler, workers: int):
+        super().__init__(address, handler)
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="http")
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=True)
+
+
+class CalculationHandler(BaseHTTPRequestHandler):
+    """Routes /health and /calculate."""
+
+    def send_json(self, status: int, payload) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if urlparse(self.path).path != "/health":
+            self.send_json(404, {"error": f"Unknown path: {self.path}"})
+            return
+        self.send_json(200, {"status": "ok", "tariff_codes": len(main.load_duty_dict())})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/calculate":
+            self.send_json(404, {"error": f"Unknown path: {url.path}"})
+            return
+
+        try:
+            query = parse_qs(url.query)
+            length = int(self.headers.get("Content-Length") or 0)
+            if length <= 0:
+                raise ValueError("Empty request body: send the input file's bytes")
+            if length > Config.HTTP_MAX_UPLOAD_BYTES:
+                raise ValueError(f"Upload of {length} bytes exceeds {Config.HTTP_MAX_UPLOAD_BYTES}")
+            response_format = query.get("format", ["json"])[0]
+            if response_format not in ["json", "zip"]:
+                raise ValueError(f"Invalid format: {response_format}. Must be 'json' or 'zip'")
+
+            started = time.monotonic()
+            result = api.calculate(
+                self.rfile.read(length),
+                data_type=query.get("type", ["csv"])[0],
+                backend=query.get("backend", ["pandas"])[0],
+                outputs=query.get("outputs"),
+                settings=json.loads(query["settings"][0]) if "settings" in query else None,
+            )
+            elapsed = time.monotonic() - started
+        except (ValueError, KeyError) as e:
+            self.send_json(400, {"error": str(e)})
+            return
+        except Exception:
+            traceback.print_exc()
+            self.send_json(500, {"error": "Calculation failed, see the service log"})
+            return
+
+        if response_format == "zip":
+            buffer = io.BytesIO()
+            with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+                for name, content in result["files"].items():
+                    archive.writestr(name, content)
+            body = buffer.getvalue()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/zip")
+            self.send_header("Content-Disposition", 'attachment; filename="reports.zip"')
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        summary = result["summary"]
+        self.send_json(200, {
+            "summary": None if summary is None else json.loads(summary.to_json(orient="records")),
+            "files": list(result["files"]),
+            "seconds": round(elapsed, 3),
+        })
+
+
+def serve(host: str, port: int, workers: int) -> None:
+    """Warm up, then serve until interrupted."""
+    import openpyxl  # noqa: F401 -- imported here so the first request does not pay for it
+
+    print(f"♻️ Duty tariff loaded ({len(main.load_duty_dict())} codes)")
+    server = PooledHTTPServer((host, port), CalculationHandler, workers)
+    print(f"🔎 Serving on http://{host}:{server.server_port} ({workers} workers)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Stopped")
+    finally:
+        server.server_close()
+
+
+def main_loop():
+    parser = argparse.ArgumentParser(description="Serve the calculation engine over local HTTP.")
+    parser.add_argument("--host", default=Config.HTTP_HOST)
+    parser.add_argument("--port", type=int, default=Config.HTTP_PORT)
+    parser.add_argument("--workers", type=int, default=Config.HTTP_WORKERS)
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers)
+
+
+if __name__ == "__main__":
+    main_loop()
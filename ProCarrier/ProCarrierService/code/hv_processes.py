@@ -1,4 +1,6 @@
 from config import Config
+from duty_processor import DutyProcessor
+from report_writer import write_excel
 import pandas as pd
 from pathlib import Path
 from typing import Dict, Any
@@ -7,6 +9,8 @@ from typing import Dict, Any
 class HighValueProcessor:
     """Processes high value consignments (>150€)."""
 
+    INPUT_COLUMNS = Config.high_value_columns
+
     @staticmethod
     def process_high_value_data(
             df: pd.DataFrame, duty_dict: Dict[str, float]
@@ -35,13 +39,11 @@ class HighValueProcessor:
     def hv_ie_processing(
             hv_declared_in_IE: pd.DataFrame, duty_dict: Dict[str, float]
     ) -> list[Any]:
-        if not all(hv_declared_in_IE["Consignee Country"] == "IE"):
-            non_ie_dest = hv_declared_in_IE[
-                hv_declared_in_IE["Consignee Country"] != "IE"
-                ]["Consignee Country"].unique()
-            raise ValueError(
-                f"IE imports must be domestic (IE→IE only). Found invalid destinations: {non_ie_dest}"
-            )
+        # IE imports must be domestic (IE→IE only); validation reports the others
+        outside_ie = hv_declared_in_IE["Consignee Country"] != "IE"
+        if outside_ie.any():
+            HighValueProcessor.warn_outside_ie(hv_declared_in_IE.loc[outside_ie, "Consignee Country"].unique())
+            hv_declared_in_IE = hv_declared_in_IE[~outside_ie]
         return_rgr = HighValueProcessor.calculate_rgr_vat_return(
             hv_declared_in_IE, Config.VAT_RATES["IE"]
         )  # for rgr IE form
@@ -51,6 +53,12 @@ class HighValueProcessor:
 
         return [return_rgr]
 
+    @staticmethod
+    def warn_outside_ie(destinations) -> None:
+        """Report IE-declared lines left out of the IE figures for shipping elsewhere."""
+        print(f"⚠️ WARNING: IE declarations shipped outside IE left out of the IE refunds: "
+              f"{list(destinations)}")
+
     # ==================== HV DECLARED IN IE ==============================
 
     # ==================== HV DECLARED IN NL ==============================
@@ -59,17 +67,25 @@ class HighValueProcessor:
     def hv_nl_processing(
             hv_declared_in_NL: pd.DataFrame, duty_dict: Dict[str, float]
     ) -> list[Any]:
-        # Calculate import VAT that was paid by broker in NL
-        vat_that_was_paid_by_broker_in_nl = (
-            HighValueProcessor.calculate_vat_paid_by_broker_in_nl(hv_declared_in_NL)
-        )  # for summary
-
-        # Calculate import VAT that was paid by broker to return from NL
-        vat_to_return_from_nl = HighValueProcessor.calculate_vat_to_return_from_nl(
+        combined_vat_per_country = HighValueProcessor.hv_nl_oss_processing(
             hv_declared_in_NL
-        )  # for dutch vat form
+        )
+        (
+            vat_that_was_paid_by_broker_in_nl,
+            vat_to_return_from_nl,
+            combined_refunds,
+        ) = HighValueProcessor.hv_nl_rgr_processing(hv_declared_in_NL, duty_dict)
+
+        return [
+            vat_that_was_paid_by_broker_in_nl,
+            vat_to_return_from_nl,
+            combined_vat_per_country,
+            combined_refunds,
+        ]
 
-        ##################### FOR OSS DECLARATION ( no duty needed to calculate there with for vat calculation )
+    @staticmethod
+    def hv_nl_oss_processing(hv_declared_in_NL: pd.DataFrame) -> pd.DataFrame:
+        """OSS declaration ( no duty needed to calculate there with for vat calculation )."""
         oss_df = hv_declared_in_NL.copy()
         oss_df = oss_df[oss_df["Consignee Country"] != "NL"]
         vat_per_country = HighValueProcessor.calculate_oss_vat_per_country(
@@ -83,7 +99,25 @@ class HighValueProcessor:
                 vat_per_country, return_vat_per_country
             )
         )
-        #############################
+
+        HighValueProcessor.store_oss_data(combined_vat_per_country)
+
+        return combined_vat_per_country
+
+    @staticmethod
+    def hv_nl_rgr_processing(
+            hv_declared_in_NL: pd.DataFrame, duty_dict: Dict[str, float]
+    ) -> tuple[Any, Any, pd.DataFrame]:
+        """Broker VAT figures and RGR NL refunds ( based on imported vat and duty paid )."""
+        # Calculate import VAT that was paid by broker in NL
+        vat_that_was_paid_by_broker_in_nl = (
+            HighValueProcessor.calculate_vat_paid_by_broker_in_nl(hv_declared_in_NL)
+        )  # for summary
+
+        # Calculate import VAT that was paid by broker to return from NL
+        vat_to_return_from_nl = HighValueProcessor.calculate_vat_to_return_from_nl(
+            hv_declared_in_NL
+        )  # for dutch vat form
 
         # Calculate VAT refunds for returned items for RGR NL form ( based on imported vat and duty paid )
         return_rgr = HighValueProcessor.calculate_rgr_vat_return(
@@ -98,16 +132,11 @@ class HighValueProcessor:
         )
 
         # Save reports to CSV files
-        HighValueProcessor.store_nl_hv_data(
-            combined_vat_per_country, combined_refunds
-        )  # ALSO NEED TO PRODUCE A RGR FILE FOR EACH RETURNED PARCEL
+        HighValueProcessor.store_nl_refunds_data(
+            combined_refunds
+        )  # per-parcel RGR files: see rgr_documents.RgrDocumentGenerator
 
-        return [
-            vat_that_was_paid_by_broker_in_nl,
-            vat_to_return_from_nl,
-            combined_vat_per_country,
-            combined_refunds,
-        ]
+        return vat_that_was_paid_by_broker_in_nl, vat_to_return_from_nl, combined_refunds
 
     @staticmethod
     def create_combined_oss_vat_per_country(
@@ -234,17 +263,26 @@ class HighValueProcessor:
     @staticmethod
     def store_nl_hv_data(hv_vat_per_country, combined_refunds) -> None:
         """Save high value consignment data to Excel files."""
+        HighValueProcessor.store_nl_refunds_data(combined_refunds)
+        HighValueProcessor.store_oss_data(hv_vat_per_country)
+
+    @staticmethod
+    def store_nl_refunds_data(combined_refunds) -> None:
+        """Save HV NL refunds (RGR VAT + duty) to Excel."""
         # Create data directory if it doesn't exist
         data_dir = Path(Config.DATA_DIR)
         data_dir.mkdir(exist_ok=True)
 
-        # Save all dataframes to Excel format
-        combined_refunds.to_excel(
-            data_dir / "HV_EU_REFUNDS.xlsx", index=False, engine="openpyxl"
-        )
-        hv_vat_per_country.to_excel(
-            data_dir / "OSS_VAT_PER_COUNTRY.xlsx", index=False, engine="openpyxl"
-        )
+        write_excel(combined_refunds, data_dir / "HV_EU_REFUNDS.xlsx")
+
+    @staticmethod
+    def store_oss_data(hv_vat_per_country) -> None:
+        """Save HV OSS VAT per country to Excel."""
+        # Create data directory if it doesn't exist
+        data_dir = Path(Config.DATA_DIR)
+        data_dir.mkdir(exist_ok=True)
+
+        write_excel(hv_vat_per_country, data_dir / "OSS_VAT_PER_COUNTRY.xlsx")
 
     @staticmethod
     def store_ie_hv_data(combined_refunds) -> None:
@@ -254,9 +292,7 @@ class HighValueProcessor:
         data_dir.mkdir(exist_ok=True)
 
         # Save all dataframes to Excel format
-        combined_refunds.to_excel(
-            data_dir / "HV_IE_REFUNDS.xlsx", index=False, engine="openpyxl"
-        )
+        write_excel(combined_refunds, data_dir / "HV_IE_REFUNDS.xlsx")
 
     @staticmethod
     def duty_vat_hv_merge(vat_df: pd.DataFrame, duty_df: pd.DataFrame) -> pd.DataFrame:
@@ -311,11 +347,8 @@ class HighValueProcessor:
             ~returned_df["Consignee Country"].isin(Config.DUTY_EXCLUDED_COUNTRIES)
         ]
 
-        # Extract first 4 digits from HS CODE
-        returned_df["Goods_Code_4"] = returned_df["HS CODE"].astype(str).str[:4]
-
-        # Map duty rates
-        returned_df["Duty Rate"] = returned_df["Goods_Code_4"].map(duty_dict)
+        # Map duty rates by the first 4 digits of the HS CODE
+        returned_df["Duty Rate"] = DutyProcessor.duty_rates(returned_df["HS CODE"], duty_dict)
 
         # Calculate returned value
         returned_df["Returned Item Value"] = (
@@ -346,6 +379,28 @@ class HighValueProcessor:
     @staticmethod
     def calculate_rgr_vat_return(df: pd.DataFrame, vat_rate: float) -> pd.DataFrame:
         """Calculate VAT refunds for returned items per country."""
+        returned_df = HighValueProcessor.rgr_returned_lines(df, vat_rate)
+
+        # Group by Country and VAT Rate
+        summary = (
+            returned_df.groupby(["Consignee Country", "VAT Rate"])
+            .agg({"Returned Item Value": "sum", "VAT Refund": "sum"})
+            .reset_index()
+        )
+
+        # Rename columns for clarity
+        summary.columns = [
+            "Country",
+            "VAT Rate",
+            "Total Returned Value",
+            "Total VAT Refund",
+        ]
+
+        return summary
+
+    @staticmethod
+    def rgr_returned_lines(df: pd.DataFrame, vat_rate: float) -> pd.DataFrame:
+        """Returned lines with their RGR VAT refund (also used for per-parcel RGR documents)."""
         # Filter rows where items were returned
         returned_df = df[df["Line Item Quantity Returned"] > 0].copy()
 
@@ -365,22 +420,7 @@ class HighValueProcessor:
                                             returned_df["Returned Item Value"] + returned_df["Returned Duty"]
                                     ) * vat_rate
 
-        # Group by Country and VAT Rate
-        summary = (
-            returned_df.groupby(["Consignee Country", "VAT Rate"])
-            .agg({"Returned Item Value": "sum", "VAT Refund": "sum"})
-            .reset_index()
-        )
-
-        # Rename columns for clarity
-        summary.columns = [
-            "Country",
-            "VAT Rate",
-            "Total Returned Value",
-            "Total VAT Refund",
-        ]
-
-        return summary
+        return returned_df
 
     @staticmethod
     def clean_columns(df: pd.DataFrame) -> pd.DataFrame:
@@ -390,11 +430,8 @@ class HighValueProcessor:
     @staticmethod
     def duty_paid(df: pd.DataFrame, duty_dict: Dict[str, float]) -> pd.DataFrame:
         """Calculate duty paid for high value consignments."""
-        # Extract first 4 digits from HS CODE
-        df["Goods_Code_4"] = df["HS CODE"].astype(str).str[:4]
-
-        # Map duty rates
-        df["Duty Rate"] = df["Goods_Code_4"].map(duty_dict)
+        # Map duty rates by the first 4 digits of the HS CODE
+        df["Duty Rate"] = DutyProcessor.duty_rates(df["HS CODE"], duty_dict)
 
         # Calculate item value
         df["Item Value"] = (
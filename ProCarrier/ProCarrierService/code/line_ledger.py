@@ -0,0 +1,126 @@
+"""Line-level ledger: every line with the duty, VAT and refunds computed for it.
+
+Amounts are allocated to lines with the same rules the report stages use, so
+summing a column per country reproduces the report figures:
+
+- LV lines feed IOSS_SUM.xlsx: IOSS VAT on the line value and IOSS return
+  VAT on the returned value, both at the destination rate.
+- HV lines declared in NL pay import VAT through the broker:
+  (value + duty) x NL rate, which sums into INFORMATION.xlsx AMOUNT BROKER
+  PAID. For non-NL destinations that VAT is also AMOUNT THAT CAN BE CLAIMED
+  BACK, and the line feeds OSS_VAT_PER_COUNTRY.xlsx. Returns feed HV_EU_REFUNDS.xlsx:
+  (returned value + returned duty) x NL rate, plus the duty refund outside
+  Config.DUTY_EXCLUDED_COUNTRIES.
+- HV lines declared in IE feed HV_IE_REFUNDS.xlsx: the same VAT refund at
+  the IE rate, with no duty refund.
+
+As in the reports, a returned line without a duty rate gets no RGR VAT
+refund.
+
+"Reports" lists every report row a line rolled into, for example
+"OSS_VAT_PER_COUNTRY.xlsx[DE]; HV_EU_REFUNDS.xlsx[DE]". The rows are keyed by
+destination country, or by the summary row for the broker VAT figures. The
+ledger is written to LINEAGE.parquet, the audit trail from report totals
+back to lines, when that output is requested or Config.LINEAGE_OUTPUT is
+enabled.
+"""
+
+from pathlib import Path
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+from config import Config
+from duty_processor import DutyProcessor
+
+
+def _as_text(series: pd.Series) -> pd.Series:
+    """IDs as text (integral floats from columns with gaps lose their ".0")."""
+    if pd.api.types.is_float_dtype(series) and (series.dropna() % 1 == 0).all():
+        series = series.astype("Int64")
+    return series.astype("string")
+
+
+class LineLedger:
+    """Builds the per-line ledger from the LV / HV ledger lines."""
+
+    # Raw input columns the line ledger carries besides the LV / HV inputs
+    INPUT_COLUMNS = ['Parcel ID', 'Line Item ID', 'Courier Tracking #', 'HS CODE', 'Line Item Quantity Returned']
+
+    COLUMNS = [
+        "Parcel ID", "Line Item ID", "MRN", "Courier Tracking #", "Consignee Country", "HS CODE",
+        "Class", "Declared In",
+        "Line Item Quantity Imported", "Line Item Quantity Returned", "Line Item Unit Price",
+        "Line Item Total Value", "Consignment Value", "VAT Rate", "Duty Rate",
+        "Duty", "VAT Base", "Import VAT", "OSS VAT", "Returned Value", "Return VAT Base",
+        "Return VAT Refund", "OSS Return VAT", "Duty Refund", "Reports",
+    ]
+
+    LINEAGE_NAME = "LINEAGE.parquet"
+
+    @staticmethod
+    def build(low_value_df: pd.DataFrame, high_value_df: pd.DataFrame, duty_dict: Dict[str, float]) -> pd.DataFrame:
+        """One row per LV / HV ledger line with its computed amounts (see module docstring)."""
+        df = pd.concat(
+            [low_value_df.assign(Class="LV"), high_value_df.assign(Class="HV")], ignore_index=True
+        )
+
+        hv = (df["Class"] == "HV").to_numpy()
+        declared_in = np.where(df["MRN"].astype(str).str[2:4].str.upper() == "IE", "IE", "NL")
+        df["Declared In"] = np.where(hv, declared_in, None)
+        nl, ie = hv & (declared_in == "NL"), hv & (declared_in == "IE")
+
+        country = df["Consignee Country"]
+        value = df["Line Item Quantity Imported"] * df["Line Item Unit Price"]
+        returned = df["Line Item Quantity Returned"].where(df["Line Item Quantity Returned"] > 0, 0)
+        returned_value = returned * df["Line Item Unit Price"]
+        has_returns = (returned_value > 0).to_numpy()
+
+        duty_rate = DutyProcessor.duty_rates(df["HS CODE"], duty_dict)
+        df["Duty Rate"] = duty_rate.where(hv)
+        df["Duty"] = (value * duty_rate).fillna(0).where(hv, 0)  # no tariff rate -> no duty, as in the reports
+        returned_duty = returned_value * duty_rate
+
+        declaration_rate = np.where(ie, Config.VAT_RATES["IE"], Config.VAT_RATES["NL"])
+        non_nl_destination = nl & (country != "NL").to_numpy()
+
+        df["VAT Base"] = np.where(hv, value + df["Duty"], value)
+        df["Import VAT"] = np.where(hv, df["VAT Base"] * declaration_rate, value * df["VAT Rate"])
+        df["OSS VAT"] = np.where(non_nl_destination, value * df["VAT Rate"], 0)
+        df["Returned Value"] = returned_value
+        df["Return VAT Base"] = np.where(hv, returned_value + returned_duty, returned_value)
+        df["Return VAT Refund"] = np.where(
+            hv, (df["Return VAT Base"] * declaration_rate).fillna(0), returned_value * df["VAT Rate"]
+        )
+        df["OSS Return VAT"] = np.where(non_nl_destination, returned_value * df["VAT Rate"], 0)
+        duty_refundable = nl & ~country.isin(Config.DUTY_EXCLUDED_COUNTRIES).to_numpy()
+        df["Duty Refund"] = np.where(duty_refundable, returned_duty.fillna(0), 0)
+
+        # Report rows each line rolled into
+        row = "[" + country.astype(str) + "]"
+        report_rows = [
+            (~hv, "IOSS_SUM.xlsx" + row),
+            (nl, "INFORMATION.xlsx[AMOUNT BROKER PAID]"),
+            (non_nl_destination, "INFORMATION.xlsx[AMOUNT THAT CAN BE CLAIMED BACK]"),
+            (non_nl_destination, "OSS_VAT_PER_COUNTRY.xlsx" + row),
+            (nl & has_returns, "HV_EU_REFUNDS.xlsx" + row),
+            (ie & has_returns, "HV_IE_REFUNDS.xlsx" + row),
+        ]
+        reports = pd.Series("", index=df.index, dtype=object)
+        for mask, report_row in report_rows:
+            reports = reports.where(~mask, reports + "; " + report_row)
+        df["Reports"] = reports.str.lstrip("; ")
+
+        for column in ["Parcel ID", "Line Item ID", "MRN", "Courier Tracking #", "HS CODE"]:
+            df[column] = _as_text(df[column])
+
+        return df[LineLedger.COLUMNS]
+
+    @staticmethod
+    def store_lineage(ledger: pd.DataFrame) -> None:
+        """Save the line ledger as zstd-compressed Parquet."""
+        data_dir = Path(Config.DATA_DIR)
+        data_dir.mkdir(exist_ok=True)
+
+        ledger.to_parquet(data_dir / LineLedger.LINEAGE_NAME, index=False, compression="zstd")
@@ -0,0 +1,155 @@
+"""Persistent MRN / parcel lookup index across all processed periods.
+
+Each run stores its line ledger (line_ledger.LineLedger) in a local SQLite
+database, and runs are recorded in a "runs" table. A run's source is its
+input file and period; re-running a source replaces its earlier run and
+lines in the same transaction, so the history holds each line once.
+B-tree indexes on MRN, Parcel ID and courier tracking number make every
+lookup O(log n) across the full history, without opening the raw quarter files.
+
+Usage:
+    python lookup_index.py lookup.sqlite --parcel ULW000000037
+    python lookup_index.py lookup.sqlite --mrn 25NL7A0W5GR7QEZDR9
+    python lookup_index.py lookup.sqlite --tracking JJD149990200065772746
+    python lookup_index.py lookup.sqlite --runs
+"""
+
+import argparse
+import sqlite3
+from datetime import datetime
+from typing import Optional
+
+import pandas as pd
+
+from line_ledger import LineLedger
+
+# Lookup keys and the index that serves each
+KEYS = {
+    "mrn": ("MRN", "idx_lines_mrn"),
+    "parcel": ("Parcel ID", "idx_lines_parcel"),
+    "tracking": ("Courier Tracking #", "idx_lines_tracking"),
+}
+
+TEXT_COLUMNS = ["Parcel ID", "Line Item ID", "MRN", "Courier Tracking #", "Consignee Country",
+                "HS CODE", "Class", "Declared In", "Reports"]
+
+
+def _quote(column: str) -> str:
+    return '"' + column.replace('"', '""') + '"'
+
+
+class LookupIndex:
+    """SQLite-backed line ledger history with indexed MRN / parcel / tracking lookups."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.con = sqlite3.connect(path)
+        self.create_tables()
+
+    def create_tables(self) -> None:
+        columns = ", ".join(
+            f"{_quote(c)} {'TEXT' if c in TEXT_COLUMNS else 'REAL'}" for c in LineLedger.COLUMNS
+        )
+        self.con.executescript(f"""
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id INTEGER PRIMARY KEY,
+                source TEXT,
+                output_dir TEXT,
+                processed_at TEXT,
+                lines INTEGER
+            );
+            CREATE TABLE IF NOT EXISTS lines (run_id INTEGER, {columns});
+        """)
+        for column, index in KEYS.values():
+            self.con.execute(f"CREATE INDEX IF NOT EXISTS {index} ON lines ({_quote(column)})")
+        self.con.execute("CREATE INDEX IF NOT EXISTS idx_lines_run ON lines (run_id)")
+        self.con.commit()
+
+    def add_run(self, ledger: pd.DataFrame, source: str, output_dir: str) -> int:
+        """Store one run's line ledger, replacing earlier runs of the same source; returns its run_id."""
+        rows = ledger[LineLedger.COLUMNS].astype(object).where(ledger[LineLedger.COLUMNS].notna(), None)
+        placeholders = ", ".join("?" * (len(LineLedger.COLUMNS) + 1))
+
+        # One transaction: a failed insert keeps the earlier run
+        with self.con:
+            self.con.execute("DELETE FROM lines WHERE run_id IN (SELECT run_id FROM runs WHERE source = ?)", (source,))
+            self.con.execute("DELETE FROM runs WHERE source = ?", (source,))
+            cursor = self.con.execute(
+                "INSERT INTO runs (source, output_dir, processed_at, lines) VALUES (?, ?, ?, ?)",
+                (source, output_dir, datetime.now().isoformat(timespec="seconds"), len(ledger)),
+            )
+            run_id = cursor.lastrowid
+            self.con.executemany(
+                f"INSERT INTO lines VALUES ({placeholders})",
+                ((run_id, *row) for row in rows.itertuples(index=False, name=None)),
+            )
+        return run_id
+
+    def lookup(
+            self,
+            mrn: Optional[str] = None,
+            parcel: Optional[str] = None,
+            tracking: Optional[str] = None,
+    ) -> pd.DataFrame:
+        """Every ledger line (from every run) matching the given MRN, Parcel ID or tracking number."""
+        conditions, params = [], []
+        for key, value in {"mrn": mrn, "parcel": parcel, "tracking": tracking}.items():
+            if value is not None:
+                conditions.append(f"l.{_quote(KEYS[key][0])} = ?")
+                params.append(str(value))
+        if not conditions:
+            raise ValueError("Lookup needs at least one of mrn, parcel or tracking")
+
+        return pd.read_sql_query(
+            f"""
+            SELECT r.source, r.processed_at, l.*
+            FROM lines l JOIN runs r ON r.run_id = l.run_id
+            WHERE {" AND ".join(conditions)}
+            ORDER BY l.run_id
+            """,
+            self.con,
+            params=params,
+        )
+
+    def runs(self) -> pd.DataFrame:
+        return pd.read_sql_query("SELECT * FROM runs ORDER BY run_id", self.con)
+
+    def close(self) -> None:
+        self.con.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Look up declared and refunded amounts by MRN, parcel or tracking number.")
+    parser.add_argument("database", help="Lookup index file (Config.LOOKUP_INDEX_PATH)")
+    parser.add_argument("--mrn")
+    parser.add_argument("--parcel", help="Parcel ID")
+    parser.add_argument("--tracking", help="Courier tracking number")
+    parser.add_argument("--runs", action="store_true", help="List the indexed runs")
+    args = parser.parse_args()
+
+    index = LookupIndex(args.database)
+    try:
+        if args.runs:
+            print(index.runs().to_string(index=False))
+            return
+
+        lines = index.lookup(mrn=args.mrn, parcel=args.parcel, tracking=args.tracking)
+        if lines.empty:
+            print("No lines found")
+            return
+
+        pd.set_option("display.width", 200)
+        pd.set_option("display.max_columns", None)
+        print(lines.to_string(index=False))
+
+        totals = lines.groupby(["run_id", "source", "MRN"])[
+            ["Duty", "Import VAT", "OSS VAT", "Return VAT Refund", "OSS Return VAT", "Duty Refund"]
+        ].sum()
+        print("\nTotals per run and MRN:")
+        print(totals.to_string())
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 from config import Config
+from report_writer import write_excel
 import pandas as pd
 import warnings
 from pathlib import Path
@@ -9,6 +10,8 @@ warnings.filterwarnings("ignore", category=pd.errors.SettingWithCopyWarning)
 class LowValueProcessor:
     """Processes low value consignments (<=150€)."""
 
+    INPUT_COLUMNS = Config.low_value_columns
+
     @staticmethod
     def process_low_value_data(df: pd.DataFrame) -> pd.DataFrame:
         df = LowValueProcessor.clean_columns(df)
@@ -144,6 +147,4 @@ class LowValueProcessor:
         data_dir.mkdir(exist_ok=True)
 
         # Save all dataframes to Excel format
-        lv_vat_per_country.to_excel(
-            data_dir / "IOSS_SUM.xlsx", index=False, engine="openpyxl"
-        )
+        write_excel(lv_vat_per_country, data_dir / "IOSS_SUM.xlsx")
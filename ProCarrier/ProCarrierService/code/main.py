@@ -1,14 +1,46 @@
+from backends import get_backend
 from data_layer import DataLayer
 from duty_processor import DutyProcessor
+from read_planner import ReadPlanner
+from pipeline import Pipeline
+from rgr_documents import RgrDocumentGenerator
+from returns_feed import ReturnsFeed
+from broker_statement import BrokerStatement
+from dedup_index import DedupIndex, lines_to_drop, register_lines
+from line_ledger import LineLedger
+from lookup_index import LookupIndex
+from periods import PeriodSplitter
+from validation import LineValidator
+from preview import PreviewEstimator
+from report_writer import ReportWriter, write_excel
+from checkpoints import CheckpointStore, file_fingerprint
+from result_cache import CachedResults, result_cache, snapshot
 from config import Config
+import argparse
 import pandas as pd
+import threading
 import warnings
 from pathlib import Path
-from lv_processes import LowValueProcessor
-from hv_processes import HighValueProcessor
 
 warnings.filterwarnings("ignore")
 
+# Workbooks of a full run; only a run producing all of them registers its lines in the dedup index
+FILING_REPORTS = [
+    "IOSS_SUM.xlsx",
+    "OSS_VAT_PER_COUNTRY.xlsx",
+    "HV_EU_REFUNDS.xlsx",
+    "HV_IE_REFUNDS.xlsx",
+    "INFORMATION.xlsx",
+]
+
+REPORTS = [
+    *FILING_REPORTS,
+    "RGR_DOCUMENTS.zip",
+    "LINEAGE.parquet",
+    "BROKER_VARIANCES.xlsx",
+    "BROKER_RECONCILIATION.parquet",
+]
+
 
 def generate_summary_table(data: dict):
     # Calculate VAT RETURN components
@@ -108,88 +140,565 @@ def generate_summary_table(data: dict):
 
     data_dir = Path(Config.DATA_DIR)
     data_dir.mkdir(exist_ok=True)
-    summary_df.to_excel(data_dir / "INFORMATION.xlsx", index=False, engine="openpyxl")
+    write_excel(summary_df, data_dir / "INFORMATION.xlsx")
+    return summary_df
+
+
+def build_form(lv_results, hv_vat_per_country, nl_rgr_results, ie_combined_refunds) -> dict:
+    """Collect stage results into the form consumed by generate_summary_table."""
+    dr_lv_fee, import_ioss, returned_ioss = lv_results
+    (
+        vat_that_was_paid_by_broker_in_nl,
+        vat_to_return_from_nl,
+        nl_combined_refunds,
+    ) = nl_rgr_results
+
+    return {
+        # stats only
+        "VAT_PAID_DURING_IMPORT_TO_NL": vat_that_was_paid_by_broker_in_nl,
+        # VAT form
+        "VAT_TO_RETURN_FROM_NL_FOR_IMPORT": vat_to_return_from_nl,
+        "IMPORT_IOSS": import_ioss,
+        "RETURN_IOSS": returned_ioss,
+        "LV DR FEE": dr_lv_fee,
+        # OSS VAT form
+        "OSS_HV_VAT_DF": hv_vat_per_country,
+        # Combined refunds
+        "IE_REFUNDS": ie_combined_refunds,
+        "NL_REFUNDS": nl_combined_refunds,
+    }
+
 
+# Parsed duty tariffs kept for the life of the process: path -> (file fingerprint, duty dict)
+_duty_dicts = {}
+_duty_lock = threading.Lock()
 
-def process_data(file_name: str, data_type: str, output_folder):
+
+def load_duty_dict(refresh: bool = False) -> dict:
     """
-    Process VAT and duty data from a given file.
+    Parse the duty tariff into max duty rate per 4-digit goods code.
+
+    The parsed tariff is kept in memory and reused until the file changes,
+    so a long-running process (watch_folder.py, http_service.py) parses it
+    once. The dict is shared between runs and must not be modified.
 
     Args:
-        file_name: Name or path of the file to process (e.g., "JUL-SEP DATA.csv" or "OCT DATA.xlsx")
-        data_type: Type of the data file - either "csv" or "xlsx"
-        output_folder: Name of the folder where results should be saved (optional, defaults to "data")
+        refresh: parse the tariff again even if the file has not changed
+    """
+    path = Config.DEFAULT_DUTY_EXCEL_PATH
+    fingerprint = file_fingerprint(path)
+    with _duty_lock:
+        if refresh or path not in _duty_dicts or _duty_dicts[path][0] != fingerprint:
+            duty_data = pd.read_excel(path)
+            _duty_dicts[path] = (fingerprint, DutyProcessor.process_duty_data(duty_data))
+        return _duty_dicts[path][1]
 
-    Returns:
-        Dictionary containing all processed data
+
+def dedup_source(file_name: str, period_split=None) -> str:
+    """Dedup index source of a run: the input file's full path and the period it is filed for."""
+    period = f"split by {period_split}" if period_split else Config.DEFAULT_RETURN_PERIOD
+    return f"{Path(file_name).resolve()} ({period})"
+
+
+def output_directory(output_folder) -> str:
+    """Folder the reports of a run go to: an absolute path as given, else relative to the parent folder."""
+    return f"{output_folder}/" if Path(output_folder).is_absolute() else f"../{output_folder}/"
+
+
+def summarise(lv_results, hv_vat_per_country, nl_rgr_results, ie_combined_refunds) -> dict:
+    form = build_form(lv_results, hv_vat_per_country, nl_rgr_results, ie_combined_refunds)
+    form["SUMMARY"] = generate_summary_table(form)
+    return form
+
+
+def export_lookup_index(line_ledger: pd.DataFrame, file_name: str, period: str) -> int:
     """
-    # Validate data type
-    if data_type not in ["csv", "xlsx"]:
-        raise ValueError(f"Invalid data_type: {data_type}. Must be 'csv' or 'xlsx'")
+    Store this run's line ledger in the lookup index, replacing an earlier run of
+    the same file and period; returns the run_id.
+    """
+    index = LookupIndex(Config.LOOKUP_INDEX_PATH)
+    try:
+        run_id = index.add_run(line_ledger, f"{Path(file_name).resolve()} ({period})", Config.DATA_DIR)
+    finally:
+        index.close()
+    print(f"🔎 {len(line_ledger)} lines added to lookup index {Config.LOOKUP_INDEX_PATH} (run {run_id})")
+    return run_id
+
+
+def build_pipeline(
+        file_name: str,
+        data_type: str,
+        engine,
+        returns_file=None,
+        period_split=None,
+        checkpoints=None,
+        broker_statement=None,
+) -> Pipeline:
+    """
+    Declare the ProCarrier stage graph for one input file and backend.
 
-    output_dir = f"../{output_folder}/"
+    The "period" stage holds the period being reported:
+    Config.DEFAULT_RETURN_PERIOD unless run_periods sets it. With period_split
+    ("month" / "quarter"), the stages from "ledger" on only see its lines.
 
-    # Create output directory if it doesn't exist
-    Path(output_dir).mkdir(exist_ok=True, parents=True)
+    With a broker_statement, the broker's per-MRN NL import VAT statement is
+    reconciled with the line ledger (see broker_statement.py).
 
-    Config.DATA_DIR = output_dir
+    RGR_DOCUMENTS.zip and LINEAGE.parquet (unless Config.LINEAGE_OUTPUT) are
+    optional outputs, produced only when requested.
 
-    # ==================== PROCESS DUTY DATA ====================
-    duty_data = pd.read_excel(Config.DEFAULT_DUTY_EXCEL_PATH)
-    duty_dict = DutyProcessor.process_duty_data(duty_data)
+    Stages marked checkpoint=True are persisted to the checkpoint store, if
+    one is given. Independent stages run on Config.PIPELINE_WORKERS threads
+    when the backend allows it.
+    """
+    pipeline = Pipeline(checkpoints, workers=Config.PIPELINE_WORKERS if engine.thread_safe else 1)
+
+    # Fail fast on missing columns before any heavy work starts
+    pipeline.add_stage("plan", lambda: ReadPlanner.plan(file_name, data_type, pipeline.reads()))
 
     # ==================== LOAD CONSIGNMENT DATA ====================
-    if data_type == "csv":
-        low_value_df, high_value_df = DataLayer.load_data(file_name)
-    elif data_type == "xlsx":
-        low_value_df, high_value_df = DataLayer.load_excel(file_name)
+    pipeline.add_stage(
+        "load", lambda usecols: engine.read(file_name, data_type, usecols), deps=["plan"], reads=["load"]
+    )
+    pipeline.add_stage("clean", engine.clean, deps=["load"], checkpoint=engine.checkpoint_lines)
+
+    # ==================== DEDUPLICATE AGAINST EARLIER PERIODS ====================
+    lines = "clean"
+    if Config.DEDUP_INDEX_DIR:
+        pipeline.add_stage(
+            "dedup_check",
+            lambda df: lines_to_drop(
+                engine.line_keys(df, DedupIndex.KEY_COLUMNS), dedup_source(file_name, period_split)
+            ),
+            deps=[lines],
+            reads=["dedup"],
+        )
+        pipeline.add_stage(
+            "dedup", lambda df, check: engine.drop_lines(df, check[0]), deps=[lines, "dedup_check"]
+        )
+        lines = "dedup"
+
+    # ==================== MATCH RETURNS FEED ====================
+    if returns_file:
+        pipeline.add_stage(
+            "return_events",
+            lambda: ReturnsFeed.read_events(returns_file, Path(returns_file).suffix.lstrip(".").lower()),
+        )
+        pipeline.add_stage(
+            "returns",
+            lambda df, events: engine.apply_returns(
+                df, ReturnsFeed.returns(engine.line_keys(df, ReturnsFeed.INPUT_COLUMNS), events)
+            ),
+            deps=[lines, "return_events"],
+            reads=["returns"],
+        )
+        lines = "returns"
+
+    # ==================== VALIDATE LINES ====================
+    validated = lines
+    pipeline.add_stage(
+        "quarantine",
+        lambda df: LineValidator.validate(engine.line_keys(df, LineValidator.INPUT_COLUMNS)),
+        deps=[lines],
+        reads=["validate"],
+    )
+    pipeline.add_stage(
+        "validate",
+        lambda df, quarantined: engine.drop_lines(df, quarantined) if quarantined.any() else df,
+        deps=[lines, "quarantine"],
+    )
+    lines = "validate"
+
+    # ==================== SPLIT BY PERIOD ====================
+    # The period being reported; run_periods sets it for each period in turn
+    pipeline.add_stage("period", lambda: Config.DEFAULT_RETURN_PERIOD)
+    if period_split:
+        pipeline.add_stage(
+            "periods",
+            lambda df: PeriodSplitter.assign(engine.line_keys(df, PeriodSplitter.INPUT_COLUMNS), period_split),
+            deps=[lines],
+            reads=["periods"],
+        )
+        pipeline.add_stage(
+            "period_lines",
+            lambda df, periods, period: engine.select_lines(df, periods == period),
+            deps=[lines, "periods", "period"],
+        )
+        lines = "period_lines"
+
+    pipeline.add_stage("ledger", engine.ledger, deps=[lines], checkpoint=engine.checkpoint_lines)
 
     # ==================== WORK WITH LV DATA ====================
-    dr_lv_fee, import_ioss, returned_ioss = LowValueProcessor.process_low_value_data(
-        low_value_df
+    pipeline.add_stage(
+        "lv_ioss",
+        lambda ledger: engine.lv_ioss(ledger[0]),
+        deps=["ledger"],
+        outputs=["IOSS_SUM.xlsx"],
+        reads=["low_value"],
+        checkpoint=True,
     )
 
     # ==================== WORK WITH HV DATA ====================
-    nl_values, ie_values = HighValueProcessor.process_high_value_data(
-        high_value_df, duty_dict
+    pipeline.add_stage("duty", load_duty_dict, checkpoint=True)
+    pipeline.add_stage(
+        "duty_check",
+        lambda df, quarantined, duty_dict: LineValidator.check_duty_rates(
+            engine.line_keys(df, LineValidator.DUTY_INPUT_COLUMNS), quarantined, duty_dict
+        ),
+        deps=[validated, "quarantine", "duty"],
+        reads=["duty_check"],
+    )
+    pipeline.add_stage(
+        "hv_split",
+        lambda ledger: engine.split_declaration(ledger[1]),
+        deps=["ledger"],
+        reads=["high_value"],
+    )
+    pipeline.add_stage(
+        "hv_nl_oss",
+        lambda hv_split: engine.hv_nl_oss(hv_split[1]),
+        deps=["hv_split"],
+        outputs=["OSS_VAT_PER_COUNTRY.xlsx"],
+        checkpoint=True,
+    )
+    pipeline.add_stage(
+        "hv_nl_rgr",
+        lambda hv_split, duty_dict, duty_check: engine.hv_nl_rgr(hv_split[1], duty_dict),
+        deps=["hv_split", "duty", "duty_check"],
+        outputs=["HV_EU_REFUNDS.xlsx"],
+        checkpoint=True,
+    )
+    pipeline.add_stage(
+        "hv_ie_rgr",
+        lambda hv_split, duty_dict, duty_check: engine.hv_ie_rgr(hv_split[0], duty_dict),
+        deps=["hv_split", "duty", "duty_check"],
+        outputs=["HV_IE_REFUNDS.xlsx"],
+        checkpoint=True,
     )
 
-    (
-        vat_that_was_paid_by_broker_in_nl,
-        vat_to_return_from_nl,
-        hv_vat_per_country,
-        nl_combined_refunds,
-    ) = nl_values
-    ie_combined_refunds = ie_values[0]
+    pipeline.add_stage(
+        "rgr_documents",
+        lambda ledger, duty_dict, duty_check, period: RgrDocumentGenerator.generate(
+            engine.hv_returned_lines(ledger[1]), duty_dict, period
+        ),
+        deps=["ledger", "duty", "duty_check", "period"],
+        outputs=["RGR_DOCUMENTS.zip"],
+        reads=["high_value", "rgr_documents"],
+        optional=True,
+    )
+
+    # ==================== LINE LEVEL LEDGER ====================
+    pipeline.add_stage(
+        "line_ledger",
+        lambda ledger, duty_dict: LineLedger.build(
+            engine.to_pandas(ledger[0]), engine.to_pandas(ledger[1]), duty_dict
+        ),
+        deps=["ledger", "duty"],
+        reads=["low_value", "high_value", "line_ledger"],
+    )
+    pipeline.add_stage(
+        "lineage",
+        LineLedger.store_lineage,
+        deps=["line_ledger"],
+        outputs=[LineLedger.LINEAGE_NAME],
+        optional=not Config.LINEAGE_OUTPUT,
+    )
+    if Config.LOOKUP_INDEX_PATH:
+        pipeline.add_stage(
+            "lookup_index",
+            lambda line_ledger, period: export_lookup_index(line_ledger, file_name, period),
+            deps=["line_ledger", "period"],
+            outputs=[Path(Config.LOOKUP_INDEX_PATH).name],
+        )
+
+    # ==================== RECONCILE BROKER STATEMENT ====================
+    if broker_statement:
+        pipeline.add_stage(
+            "broker_statement",
+            lambda: BrokerStatement.read_statement(
+                broker_statement, Path(broker_statement).suffix.lstrip(".").lower()
+            ),
+        )
+        pipeline.add_stage(
+            "broker_reconciliation",
+            BrokerStatement.reconciliation,
+            deps=["line_ledger", "broker_statement"],
+            outputs=[BrokerStatement.VARIANCES_NAME, BrokerStatement.REPORT_NAME],
+        )
 
     # ==================== WORK WITH FORM DATA ====================
+    pipeline.add_stage(
+        "summary",
+        summarise,
+        deps=["lv_ioss", "hv_nl_oss", "hv_nl_rgr", "hv_ie_rgr"],
+        outputs=["INFORMATION.xlsx"],
+    )
 
-    form = {
-        # stats only
-        "VAT_PAID_DURING_IMPORT_TO_NL": vat_that_was_paid_by_broker_in_nl,
-        # VAT form
-        "VAT_TO_RETURN_FROM_NL_FOR_IMPORT": vat_to_return_from_nl,
-        "IMPORT_IOSS": import_ioss,
-        "RETURN_IOSS": returned_ioss,
-        "LV DR FEE": dr_lv_fee,
-        # OSS VAT form
-        "OSS_HV_VAT_DF": hv_vat_per_country,
-        # Combined refunds
-        "IE_REFUNDS": ie_combined_refunds,
-        "NL_REFUNDS": nl_combined_refunds,
-    }
+    return pipeline
+
+
+def run_periods(pipeline: Pipeline, engine, output_dir: str, outputs=None) -> dict:
+    """
+    Run the report stages once per period over the single load, with one
+    output folder per period (e.g. <output_dir>/Q4_2025/).
 
-    generate_summary_table(form)
+    Returns:
+        Stage results per period label
+    """
+    pipeline.select(outputs)
+    periods = pipeline.compute("periods")
+
+    # Whole-file stages (e.g. the duty rate check) report once, to the run's own folder
+    for name in pipeline.active:
+        if "period_lines" not in pipeline.upstream([name]):
+            pipeline.compute(name)
+
+    data_dir = Config.DATA_DIR
+    results = {}
+    try:
+        for period in periods.categories:
+            Config.DATA_DIR = f"{output_dir}{PeriodSplitter.folder_name(period)}/"
+            Path(Config.DATA_DIR).mkdir(exist_ok=True, parents=True)
+
+            pipeline.set_result("period", period)
+            results[period] = pipeline.run(outputs)
+            print(f"✅ {period}: {(periods == period).sum()} lines, results saved to: {Config.DATA_DIR}")
+    finally:
+        Config.DATA_DIR = data_dir
+        if "period_lines" in pipeline.results:
+            engine.release_lines(pipeline.results["period_lines"])
+    return results
+
+
+def checkpoint_store(
+        file_name: str,
+        backend: str,
+        stages,
+        outputs=None,
+        returns_file=None,
+        period_split=None,
+        broker_statement=None,
+):
+    """
+    Checkpoint store of a run, keyed by its inputs and options (None when disabled).
+    The duty tariff is only part of the key when the selected stages read it.
+    """
+    if not Config.CHECKPOINT_DIR:
+        return None
+    tariff = Config.DEFAULT_DUTY_EXCEL_PATH if "duty" in stages else None
+    inputs = [file_fingerprint(f) for f in (file_name, returns_file, tariff, broker_statement)]
+    return CheckpointStore(
+        Config.CHECKPOINT_DIR, (inputs, backend, sorted(outputs) if outputs else None, period_split)
+    )
+
+
+def report_results(results, report_stages, period_split=None):
+    """The report stages' results of a run, as kept in the result cache."""
+    if period_split:
+        return {period: report_results(r, report_stages) for period, r in results.items()}
+    return CachedResults({stage: results[stage] for stage in report_stages if stage in results})
+
+
+def process_data(
+        file_name: str,
+        data_type: str,
+        output_folder,
+        backend: str = "pandas",
+        outputs=None,
+        returns_file=None,
+        period_split=None,
+        broker_statement=None,
+):
+    """
+    Process VAT and duty data from a given file.
+
+    Args:
+        file_name: Name or path of the file to process (e.g., "JUL-SEP DATA.csv" or "OCT DATA.xlsx")
+        data_type: Type of the data file - "csv", "xlsx" or "parquet"
+        output_folder: Name of the folder where results should be saved, relative to the parent
+            directory unless absolute
+        backend: Execution backend - "pandas" (default), "polars" (lazy, multi-threaded)
+            or "duckdb" (embedded SQL, spills to disk for very large quarters)
+        outputs: Report files to produce (e.g. ["IOSS_SUM.xlsx"]); None produces FILING_REPORTS
+            and the reports of the options given (broker statement, lookup index).
+            RGR_DOCUMENTS.zip and LINEAGE.parquet are only produced when requested.
+            Only the stages upstream of the requested reports are executed.
+        returns_file: Optional WMS return event feed (csv/xlsx/parquet). When given, returned
+            quantities come from the feed instead of the extract's "Line Item Quantity Returned",
+            and unmatched / over-returned events are written to RETURNS_EXCEPTIONS.xlsx.
+        period_split: Optional "month" or "quarter". The file is loaded once and every
+            period's reports (by Entry Date, else EU Export Date) go to their own
+            subfolder of the output folder.
+        broker_statement: Optional broker NL import VAT statement (csv/xlsx/parquet) with
+            MRN, VAT Paid and optionally Duty Paid per MRN. Matched, missing and mismatched
+            MRNs are written to BROKER_RECONCILIATION.parquet / BROKER_VARIANCES.xlsx.
+
+    With Config.RESULT_CACHE_DIR set, runs are served from the result cache when the
+    input, returns feed and duty tariff bytes, rate tables, options and code are unchanged.
+
+    With Config.CHECKPOINT_DIR set, expensive stage results are checkpointed until the
+    run completes, so rerunning a failed run with the same inputs and settings resumes
+    from the last stage that finished.
+
+    Returns:
+        Dictionary containing all processed data, keyed by stage name
+        (with period_split: keyed by period label, then stage name). When the
+        reports came from the result cache, only the report stages' results
+        (e.g. "summary", "lv_ioss") are present; other stages raise KeyError.
+    """
+    # Validate data type
+    if data_type not in ["csv", "xlsx", "parquet"]:
+        raise ValueError(f"Invalid data_type: {data_type}. Must be 'csv', 'xlsx' or 'parquet'")
+
+    output_dir = output_directory(output_folder)
+
+    # Create output directory if it doesn't exist
+    Path(output_dir).mkdir(exist_ok=True, parents=True)
+
+    Config.DATA_DIR = output_dir
+
+    engine = get_backend(backend)
+    pipeline = build_pipeline(file_name, data_type, engine, returns_file, period_split, None, broker_statement)
+    stages = pipeline.select(outputs)
+
+    cache = result_cache()
+    if cache:
+        # The duty tariff is only an input of runs that read it
+        tariff = Config.DEFAULT_DUTY_EXCEL_PATH if "duty" in stages else None
+        cache_key = cache.run_key(
+            [file_name, returns_file, tariff, broker_statement],
+            (sorted(outputs) if outputs else None, period_split),
+        )
+        cached = cache.materialize(cache_key, output_dir)
+        if cached is not None:
+            print(f"✅ DONE! Cached results copied to: {output_dir}")
+            return cached
+        before = snapshot(output_dir)
+
+    checkpoints = checkpoint_store(file_name, backend, stages, outputs, returns_file, period_split, broker_statement)
+    pipeline.checkpoints = checkpoints
+
+    # Reports are written in the background; leaving the block waits for all of them
+    with ReportWriter():
+        if period_split:
+            results = run_periods(pipeline, engine, output_dir, outputs)
+        else:
+            results = pipeline.run(outputs)
+
+    # Only a successful full run marks its lines as processed
+    if "dedup_check" in pipeline.active and (not outputs or set(FILING_REPORTS) <= set(outputs)):
+        register_lines(pipeline.compute("dedup_check")[1], dedup_source(file_name, period_split))
+
+    if checkpoints:
+        checkpoints.clear()
+    if cache:
+        cache.store(cache_key, output_dir, before, report_results(results, pipeline.output_stages(outputs), period_split))
 
     print(f"✅ DONE! Results saved to: {output_dir}")
+    return results
+
+
+def preview_data(
+        file_name: str,
+        data_type: str,
+        output_folder,
+        sample_size=None,
+        seed=None,
+        confidence=None,
+) -> pd.DataFrame:
+    """
+    Estimate the INFORMATION.xlsx figures from a stratified sample of consignments,
+    with confidence intervals, without running the report stages (see preview.py).
+
+    Args:
+        file_name, data_type, output_folder: as for process_data
+        sample_size: consignments to sample (default Config.PREVIEW_SAMPLE_SIZE)
+        seed: random seed; the same seed and file give the same estimates
+        confidence: confidence level of the intervals (default Config.PREVIEW_CONFIDENCE)
+
+    Returns:
+        The estimates (also saved as PREVIEW.xlsx)
+    """
+    if data_type not in ["csv", "xlsx", "parquet"]:
+        raise ValueError(f"Invalid data_type: {data_type}. Must be 'csv', 'xlsx' or 'parquet'")
+
+    output_dir = output_directory(output_folder)
+    Path(output_dir).mkdir(exist_ok=True, parents=True)
+    Config.DATA_DIR = output_dir
+
+    engine = get_backend("pandas")
+    usecols = ReadPlanner.plan(file_name, data_type, ["low_value", "high_value", "line_ledger"])
+    lines = engine.clean(engine.read(file_name, data_type, usecols))
+
+    estimates = PreviewEstimator.preview(lines, load_duty_dict(), sample_size, seed, confidence)
+    PreviewEstimator.store_preview(estimates)
+
+    print(estimates.to_string(index=False, float_format="{:,.2f}".format))
+    print(f"✅ DONE! Preview saved to: {output_dir}")
+    return estimates
 
 
 def main():
-    """Default execution with hardcoded values."""
+    """Command line entry point; defaults to the OCT data set."""
+    parser = argparse.ArgumentParser(description="Process ProCarrier VAT and duty data.")
+    parser.add_argument("file_name", nargs="?", default="../OCT DATA.xlsx")
+    parser.add_argument("--type", dest="data_type", choices=["csv", "xlsx", "parquet"],
+                        help="Input file type (default: taken from the file extension)")
+    parser.add_argument("--output-folder", default="./OCT_RESULTS")
+    parser.add_argument("--backend", default="pandas", choices=["pandas", "polars", "duckdb"])
+    parser.add_argument("--outputs", nargs="+", metavar="REPORT", choices=REPORTS,
+                        help="Only produce these reports (and their upstream stages)")
+    parser.add_argument("--returns-file", help="WMS return event feed to take returned quantities from")
+    parser.add_argument("--broker-statement", help="Broker NL import VAT statement to reconcile per MRN")
+    parser.add_argument("--dedup-index", help="Cross-file dedup index directory (default: Config.DEDUP_INDEX_DIR)")
+    parser.add_argument("--dedup-mode", choices=["flag", "drop"],
+                        help="Report duplicate lines only (flag) or also remove them (drop)")
+    parser.add_argument("--validation-mode", choices=["report", "quarantine"],
+                        help="Only report invalid lines, or also quarantine their consignments")
+    parser.add_argument("--split-periods", choices=["month", "quarter"],
+                        help="Load once and write each period's reports to its own subfolder")
+    parser.add_argument("--checkpoint-dir", help="Checkpoint directory (default: Config.CHECKPOINT_DIR)")
+    parser.add_argument("--no-checkpoints", action="store_true", help="Do not checkpoint stage results")
+    parser.add_argument("--cache-dir", help="Result cache directory (default: Config.RESULT_CACHE_DIR)")
+    parser.add_argument("--no-cache", action="store_true", help="Always recompute (skip the result cache)")
+    parser.add_argument("--preview", action="store_true",
+                        help="Only estimate the summary figures from a stratified sample")
+    parser.add_argument("--sample-size", type=int, help="Consignments to sample in --preview mode")
+    parser.add_argument("--seed", type=int, help="Random seed for --preview mode")
+    parser.add_argument("--lookup-index", help="Append the line ledger to this lookup index (see lookup_index.py)")
+    args = parser.parse_args()
+
+    if args.dedup_index:
+        Config.DEDUP_INDEX_DIR = args.dedup_index
+    if args.dedup_mode:
+        Config.DEDUP_MODE = args.dedup_mode
+    if args.validation_mode:
+        Config.VALIDATION_MODE = args.validation_mode
+    if args.checkpoint_dir:
+        Config.CHECKPOINT_DIR = args.checkpoint_dir
+    if args.no_checkpoints:
+        Config.CHECKPOINT_DIR = None
+    if args.cache_dir:
+        Config.RESULT_CACHE_DIR = args.cache_dir
+    if args.no_cache:
+        Config.RESULT_CACHE_DIR = None
+    if args.lookup_index:
+        Config.LOOKUP_INDEX_PATH = args.lookup_index
+
+    data_type = args.data_type or DataLayer.data_type(args.file_name)
+    if args.preview:
+        preview_data(args.file_name, data_type, args.output_folder, args.sample_size, args.seed)
+        return
+
     process_data(
-        file_name="../OCT DATA.xlsx",
-        data_type="xlsx",
-        output_folder="./OCT_RESULTS",
+        file_name=args.file_name,
+        data_type=data_type,
+        output_folder=args.output_folder,
+        backend=args.backend,
+        outputs=args.outputs,
+        returns_file=args.returns_file,
+        broker_statement=args.broker_statement,
+        period_split=args.split_periods,
     )
 
 
@@ -0,0 +1,402 @@
+"""Map/reduce over file shards with mergeable partial aggregates.
+
+A huge quarter can be split into shards (row ranges, in file order) and
+processed on several nodes. There are two kinds of partials.
+
+ConsignmentPartial (map output, one per shard) holds:
+
+- per MRN: line value and import duty sums, and the order key and
+  destination of the MRN's first line and of its first non-NL line;
+- per (MRN, destination): line and returned-line counts, returned value,
+  returned duty and RGR VAT base.
+
+An MRN's LV/HV class depends on its value across every shard, so nothing
+is classified on the map side. Merging ConsignmentPartials sums the figures
+and keeps the first line with the lowest order key (shard, line).
+partition() splits a partial by MRN hash, so each reducer receives whole
+consignments.
+
+FigurePartial (reduce output) is built once a partial holds complete
+consignments. It holds, per destination country, every sum the reports are
+built from: LV / OSS sales, LV / OSS returns, NL and IE RGR refunds, NL duty
+refunds, and the broker VAT base behind the summary figures. Merging
+FigurePartials is plain addition. reports() applies the rate tables and
+writes IOSS_SUM, OSS_VAT_PER_COUNTRY, HV_EU_REFUNDS, HV_IE_REFUNDS and
+INFORMATION with the same functions as a single-node run. Every consignment
+is classified with its full value, so the figures equal the single-node
+run's, up to the order of floating point additions.
+
+Out of scope: line-level outputs (RGR documents, lineage), the returns feed,
+dedup and quarantine, which need the lines themselves.
+
+Usage:
+    python map_reduce.py "../JUL-SEP DATA.csv" --split 8 --workers 4 --output-folder Q3_RESULTS
+    python map_reduce.py shard-*.parquet --type parquet --workers 4
+"""
+
+import argparse
+import os
+import pickle
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from config import Config
+from data_layer import DataLayer
+from duty_processor import DutyProcessor
+from hv_processes import HighValueProcessor
+from lv_processes import LowValueProcessor
+from main import load_duty_dict, output_directory, summarise
+from read_planner import ReadPlanner
+
+# Order key of a line: shard << SHARD_SHIFT | position in the shard
+SHARD_SHIFT = 32
+NO_LINE = np.iinfo(np.int64).max
+
+LINE_SUMS = ["Lines", "Returned Lines", "Returned Value", "Returned Duty", "RGR Base"]
+
+FIGURES = [
+    "LV Consignments", "LV Consignment Value", "LV Returned Lines", "LV Returned Value",
+    "OSS Consignments", "OSS Consignment Value", "OSS Returned Lines", "OSS Returned Value",
+    "NL Returned Lines", "NL Returned Value", "NL Returned Duty", "NL RGR Base",
+    "IE Returned Lines", "IE Returned Value", "IE RGR Base", "IE Invalid Lines",
+    "Broker Base", "Broker Base To Return",
+]
+
+
+def _first_lines(frame: pd.DataFrame, order: str, country: str) -> pd.DataFrame:
+    """Order key and destination of each MRN's earliest line (destination may be missing)."""
+    first = frame.sort_values(order, kind="stable")
+    return first.loc[~first.index.duplicated(), [order, country]]
+
+
+class ConsignmentPartial:
+    """Per-MRN and per-(MRN, destination) sums of one or more shards."""
+
+    def __init__(self, consignments: pd.DataFrame, destinations: pd.DataFrame):
+        self.consignments = consignments
+        self.destinations = destinations
+
+    @staticmethod
+    def from_lines(df: pd.DataFrame, shard: int, duty_dict: Dict[str, float]) -> "ConsignmentPartial":
+        """Map: the partial of one shard's raw lines."""
+        df = DataLayer.clean_data(df)
+        order = (np.int64(shard) << SHARD_SHIFT) + np.arange(len(df), dtype=np.int64)
+        df = df.assign(Order=order)
+        df = df[df["MRN"].notna()]
+
+        value = df["Line Item Quantity Imported"] * df["Line Item Unit Price"]
+        duty_rate = DutyProcessor.duty_rates(df["HS CODE"], duty_dict)
+        returned = df["Line Item Quantity Returned"] > 0
+        returned_value = (df["Line Item Quantity Returned"] * df["Line Item Unit Price"]).where(returned, 0)
+        returned_duty = returned_value * duty_rate
+
+        lines = pd.DataFrame({
+            "Country": df["Consignee Country"],
+            "Order": df["Order"],
+            "Value": value,
+            "Duty": value * duty_rate,
+            "Lines": 1,
+            "Returned Lines": returned.astype(int),
+            "Returned Value": returned_value,
+            "Returned Duty": returned_duty,
+            "RGR Base": returned_value + returned_duty,
+        }).set_index(df["MRN"].rename("MRN"))
+
+        non_nl = lines[lines["Country"] != "NL"].rename(columns={"Order": "Non-NL Order", "Country": "Non-NL Country"})
+        consignments = (
+            lines.groupby(level="MRN", sort=False)[["Value", "Duty"]].sum()
+            .join(_first_lines(lines, "Order", "Country"))
+            .join(_first_lines(non_nl, "Non-NL Order", "Non-NL Country"))
+        )
+        consignments["Non-NL Order"] = consignments["Non-NL Order"].fillna(NO_LINE).astype(np.int64)
+
+        destinations = lines.groupby([lines.index, "Country"], sort=False, dropna=False)[LINE_SUMS].sum()
+        destinations.index.names = ["MRN", "Country"]
+        return ConsignmentPartial(consignments, destinations)
+
+    @staticmethod
+    def merge(partials: Iterable["ConsignmentPartial"]) -> "ConsignmentPartial":
+        """Combine partials of any shards (associative, order-independent)."""
+        partials = list(partials)
+        frame = pd.concat([partial.consignments for partial in partials])
+        consignments = (
+            frame.groupby(level="MRN", sort=False)[["Value", "Duty"]].sum()
+            .join(_first_lines(frame, "Order", "Country"))
+            .join(_first_lines(frame, "Non-NL Order", "Non-NL Country"))
+        )
+        destinations = pd.concat([partial.destinations for partial in partials]).groupby(
+            level=["MRN", "Country"], sort=False, dropna=False
+        ).sum()
+        return ConsignmentPartial(consignments, destinations)
+
+    def partition(self, count: int) -> List["ConsignmentPartial"]:
+        """Split by MRN hash into count partials, each holding whole consignments."""
+        def buckets(index):
+            mrns = pd.Series(index.get_level_values("MRN").astype(str))
+            return (pd.util.hash_pandas_object(mrns, index=False).to_numpy() % count).astype(int)
+
+        consignment_buckets, destination_buckets = buckets(self.consignments.index), buckets(self.destinations.index)
+        return [
+            ConsignmentPartial(
+                self.consignments[consignment_buckets == bucket], self.destinations[destination_buckets == bucket]
+            )
+            for bucket in range(count)
+        ]
+
+    def figures(self, threshold: Optional[float] = None) -> "FigurePartial":
+        """Reduce: classify the (complete) consignments and sum every figure per destination."""
+        threshold = Config.CONSIGNMENT_THRESHOLD if threshold is None else threshold
+        consignments = self.consignments
+        hv = consignments["Value"] > threshold
+        declared_in_ie = consignments.index.astype(str).str[2:4].str.upper() == "IE"
+        hv_nl, hv_ie = hv & ~declared_in_ie, hv & declared_in_ie
+
+        def by_country(values: pd.Series, countries: pd.Series) -> pd.Series:
+            return values.groupby(countries.to_numpy(), dropna=False).sum()
+
+        oss = hv_nl & (consignments["Non-NL Order"] != NO_LINE)
+        broker_base = consignments["Value"] + consignments["Duty"]
+        to_return = hv_nl & (consignments["Country"] != "NL")
+        figures = {
+            "LV Consignments": by_country((~hv).astype(int)[~hv], consignments["Country"][~hv]),
+            "LV Consignment Value": by_country(consignments["Value"][~hv], consignments["Country"][~hv]),
+            "OSS Consignments": by_country(oss.astype(int)[oss], consignments["Non-NL Country"][oss]),
+            "OSS Consignment Value": by_country(consignments["Value"][oss], consignments["Non-NL Country"][oss]),
+            "Broker Base": by_country(broker_base[hv_nl], consignments["Country"][hv_nl]),
+            "Broker Base To Return": by_country(broker_base[to_return], consignments["Country"][to_return]),
+        }
+
+        destinations = self.destinations
+        mrns = destinations.index.get_level_values("MRN")
+        countries = destinations.index.get_level_values("Country").to_series(index=destinations.index)
+        line_hv = hv.reindex(mrns).to_numpy()
+        line_nl, line_ie = hv_nl.reindex(mrns).to_numpy(), hv_ie.reindex(mrns).to_numpy()
+        line_oss = line_nl & (countries != "NL").to_numpy()
+        # IE imports must be domestic (IE→IE only); the others are left out of the IE figures
+        invalid_ie = line_ie & (countries != "IE").to_numpy()
+        line_ie = line_ie & ~invalid_ie
+
+        for prefix, mask in [("LV", ~line_hv), ("OSS", line_oss), ("NL", line_nl), ("IE", line_ie)]:
+            figures[f"{prefix} Returned Lines"] = by_country(destinations["Returned Lines"][mask], countries[mask])
+            figures[f"{prefix} Returned Value"] = by_country(destinations["Returned Value"][mask], countries[mask])
+        figures["NL Returned Duty"] = by_country(destinations["Returned Duty"][line_nl], countries[line_nl])
+        figures["NL RGR Base"] = by_country(destinations["RGR Base"][line_nl], countries[line_nl])
+        figures["IE RGR Base"] = by_country(destinations["RGR Base"][line_ie], countries[line_ie])
+        figures["IE Invalid Lines"] = by_country(destinations["Lines"][invalid_ie], countries[invalid_ie])
+
+        return FigurePartial(pd.DataFrame(figures).reindex(columns=FIGURES).fillna(0))
+
+    # ==================== EXCHANGE ====================
+
+    def save(self, path: str) -> None:
+        """Write the partial for another node (atomic rename)."""
+        partial = Path(f"{path}.tmp")
+        with open(partial, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        partial.replace(path)
+
+    @staticmethod
+    def load(path: str) -> "ConsignmentPartial":
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+
+class FigurePartial:
+    """Per-destination report sums of whole consignments; merged by addition."""
+
+    def __init__(self, figures: pd.DataFrame):
+        self.figures = figures
+
+    @staticmethod
+    def merge(partials: Iterable["FigurePartial"]) -> "FigurePartial":
+        frame = pd.concat([partial.figures for partial in partials])
+        return FigurePartial(frame.groupby(level=0, dropna=False).sum().reindex(columns=FIGURES))
+
+    def _per_country(self, count: str, columns: Dict[str, pd.Series], rated: bool = True) -> pd.DataFrame:
+        """Report rows of the countries with count > 0 (and a VAT rate, when rated)."""
+        figures = self.figures
+        rate = pd.Series(figures.index.map(Config.VAT_RATES), index=figures.index, dtype=float)
+        keep = (figures[count] > 0) & figures.index.notna()
+        if rated:
+            keep &= rate.notna()
+
+        frame = pd.DataFrame({"Country": figures.index, "VAT Rate": rate}, index=figures.index)
+        for name, values in columns.items():
+            frame[name] = values
+        frame = frame[keep].sort_values("Country").reset_index(drop=True)
+        return frame if rated else frame.drop(columns="VAT Rate")
+
+    def reports(self) -> Dict[str, object]:
+        """Write the aggregate reports to Config.DATA_DIR and return the stage results."""
+        figures = self.figures
+        rate = pd.Series(figures.index.map(Config.VAT_RATES), index=figures.index, dtype=float)
+        nl_rate, ie_rate = Config.VAT_RATES["NL"], Config.VAT_RATES["IE"]
+
+        # ==================== LV (IOSS) ====================
+        lv_vat = self._per_country("LV Consignments", {
+            "Total Consignment Value": figures["LV Consignment Value"],
+            "Total VAT to Pay": figures["LV Consignment Value"] * rate,
+        })
+        lv_returns = self._per_country("LV Returned Lines", {
+            "Total Returned Value": figures["LV Returned Value"],
+            "Total VAT Refund": figures["LV Returned Value"] * rate,
+        })
+        combined_lv = LowValueProcessor.create_combined_vat_per_country(lv_vat, lv_returns)
+        LowValueProcessor.store_lv_data(combined_lv)
+        lv_results = (
+            LowValueProcessor.calculate_fee_lv(combined_lv),
+            combined_lv["Total VAT to Pay"].sum(),
+            combined_lv["Total VAT Refund"].sum(),
+        )
+
+        # ==================== HV DECLARED IN NL ====================
+        oss_vat = self._per_country("OSS Consignments", {
+            "Total Consignment Value": figures["OSS Consignment Value"],
+            "Total VAT to Pay": figures["OSS Consignment Value"] * rate,
+        })
+        oss_returns = self._per_country("OSS Returned Lines", {
+            "Total Returned Value": figures["OSS Returned Value"],
+            "Total VAT Refund": figures["OSS Returned Value"] * rate,
+        })
+        combined_oss = HighValueProcessor.create_combined_oss_vat_per_country(oss_vat, oss_returns)
+        HighValueProcessor.store_oss_data(combined_oss)
+
+        nl_rgr = self._per_country("NL Returned Lines", {
+            "Total Returned Value": figures["NL Returned Value"],
+            "Total VAT Refund": figures["NL RGR Base"] * nl_rate,
+        })
+        nl_duty = self._per_country("NL Returned Lines", {
+            "Total Returned Value": figures["NL Returned Value"],
+            "Total Duty Returned": figures["NL Returned Duty"],
+        }, rated=False)
+        nl_duty = nl_duty[~nl_duty["Country"].isin(Config.DUTY_EXCLUDED_COUNTRIES)]
+        combined_refunds = HighValueProcessor.duty_vat_hv_merge(nl_rgr, nl_duty)
+        HighValueProcessor.store_nl_refunds_data(combined_refunds)
+        nl_rgr_results = (
+            figures["Broker Base"].sum() * nl_rate,
+            figures["Broker Base To Return"].sum() * nl_rate,
+            combined_refunds,
+        )
+
+        # ==================== HV DECLARED IN IE ====================
+        invalid = figures.index[figures["IE Invalid Lines"] > 0]
+        if len(invalid):
+            HighValueProcessor.warn_outside_ie(invalid)
+        ie_refunds = self._per_country("IE Returned Lines", {
+            "Total Returned Value": figures["IE Returned Value"],
+            "Total VAT Refund": figures["IE RGR Base"] * ie_rate,
+        })
+        ie_refunds["Total Refund"] = ie_refunds["Total VAT Refund"]
+        HighValueProcessor.store_ie_hv_data(ie_refunds)
+
+        return {
+            "lv_ioss": lv_results,
+            "hv_nl_oss": combined_oss,
+            "hv_nl_rgr": nl_rgr_results,
+            "hv_ie_rgr": ie_refunds,
+            "summary": summarise(lv_results, combined_oss, nl_rgr_results, ie_refunds),
+        }
+
+
+# ==================== DRIVER ====================
+
+def map_shard(task) -> List[ConsignmentPartial]:
+    """Map task: read one shard and return its partial, split into reducer partitions."""
+    shard, file_name, data_type, duty_dict, partitions = task
+    df = DataLayer.read_input(file_name, data_type, ReadPlanner.required_columns())
+    return ConsignmentPartial.from_lines(df, shard, duty_dict).partition(partitions)
+
+
+def reduce_partition(task) -> FigurePartial:
+    """Reduce task: merge one partition's consignment partials into its figures."""
+    partials, threshold = task
+    return ConsignmentPartial.merge(partials).figures(threshold)
+
+
+def split_file(file_name: str, data_type: str, shards: int, directory: str) -> List[str]:
+    """Split an input file into row-range parquet shards (for local runs and tests)."""
+    df = DataLayer.read_input(file_name, data_type, ReadPlanner.required_columns())
+    paths = []
+    for shard, rows in enumerate(np.array_split(np.arange(len(df)), shards)):
+        path = Path(directory) / f"shard-{shard:04d}.parquet"
+        df.iloc[rows].to_parquet(path, index=False)
+        paths.append(str(path))
+    return paths
+
+
+def map_reduce(
+        shard_files: List[str],
+        data_type: str,
+        output_folder,
+        workers: Optional[int] = None,
+        partitions: Optional[int] = None,
+) -> dict:
+    """
+    Compute the aggregate reports of the shards, in order, on worker processes
+    standing in for nodes.
+
+    Args:
+        shard_files: the shards in file order (the order decides each MRN's first line)
+        data_type: "csv", "xlsx" or "parquet"
+        output_folder: as for main.process_data
+        workers: processes (default Config.MAP_REDUCE_WORKERS, then CPU count)
+        partitions: reducers, each merging the consignments of one MRN hash bucket (default: workers)
+
+    Returns:
+        The lv_ioss, hv_nl_oss, hv_nl_rgr, hv_ie_rgr and summary stage results
+    """
+    if data_type not in ["csv", "xlsx", "parquet"]:
+        raise ValueError(f"Invalid data_type: {data_type}. Must be 'csv', 'xlsx' or 'parquet'")
+
+    output_dir = output_directory(output_folder)
+    Path(output_dir).mkdir(exist_ok=True, parents=True)
+    Config.DATA_DIR = output_dir
+
+    duty_dict = load_duty_dict()
+    workers = workers or Config.MAP_REDUCE_WORKERS or os.cpu_count() or 1
+    partitions = partitions or workers
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        mapped = list(executor.map(
+            map_shard, [(shard, f, data_type, duty_dict, partitions) for shard, f in enumerate(shard_files)]
+        ))
+        figures = list(executor.map(
+            reduce_partition,
+            [([partials[bucket] for partials in mapped], Config.CONSIGNMENT_THRESHOLD) for bucket in range(partitions)],
+        ))
+
+    results = FigurePartial.merge(figures).reports()
+    print(f"✅ DONE! {len(shard_files)} shards, {partitions} reducers. Results saved to: {output_dir}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aggregate reports over file shards with map/reduce.")
+    parser.add_argument("shard_files", nargs="+", help="Shards in file order (or one file with --split)")
+    parser.add_argument("--type", dest="data_type", choices=["csv", "xlsx", "parquet"],
+                        help="Input file type (default: taken from the file extension)")
+    parser.add_argument("--output-folder", default="./MAP_REDUCE_RESULTS")
+    parser.add_argument("--workers", type=int, help="Worker processes standing in for nodes")
+    parser.add_argument("--partitions", type=int, help="Reducers (MRN hash buckets)")
+    parser.add_argument("--split", type=int, metavar="N", help="Split the single input file into N shards first")
+    args = parser.parse_args()
+
+    data_type = args.data_type or DataLayer.data_type(args.shard_files[0])
+    if not args.split:
+        map_reduce(args.shard_files, data_type, args.output_folder, args.workers, args.partitions)
+        return
+
+    if len(args.shard_files) != 1:
+        raise ValueError("--split takes exactly one input file")
+    with tempfile.TemporaryDirectory(prefix="shards-") as directory:
+        shards = split_file(args.shard_files[0], data_type, args.split, directory)
+        map_reduce(shards, "parquet", args.output_folder, args.workers, args.partitions)
+
+
+if __name__ == "__main__":
+    main()
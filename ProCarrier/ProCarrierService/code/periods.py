@@ -0,0 +1,72 @@
+"""Reporting periods: bucket lines into months or quarters by date.
+
+A line belongs to the period of its Entry Date, or of its EU Export Date when
+the Entry Date is missing or unreadable. Lines with neither date go to
+UNDATED. Dates repeat heavily across lines, so only the distinct values are
+parsed.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Period frequency and label format per granularity, e.g. "OCT 2025" / "Q4 2025"
+GRANULARITIES = {
+    "month": ("M", "%b %Y"),
+    "quarter": ("Q", "Q%q %Y"),
+}
+
+
+def _parse_dates(series: pd.Series) -> pd.Series:
+    """Dates of a column (NaT where unreadable), parsing each distinct value once."""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    codes, uniques = pd.factorize(series)
+    text = pd.Series(uniques, dtype=str)
+    # Time-only values (e.g. "21:43.0" from a mis-formatted export) would parse as today
+    dates = pd.to_datetime(text.where(text.str.contains(r"\d{4}")), errors="coerce", format="mixed")
+    dates = np.append(dates.to_numpy(dtype="datetime64[ns]"), np.datetime64("NaT"))  # code -1 -> NaT
+    return pd.Series(dates[codes], index=series.index)
+
+
+class PeriodSplitter:
+    """Assigns every line to a reporting period."""
+
+    # Raw input columns the period assignment reads
+    INPUT_COLUMNS = ['Entry Date', 'EU Export Date']
+
+    UNDATED = "UNDATED"
+
+    @staticmethod
+    def assign(dates: pd.DataFrame, granularity: str) -> pd.Categorical:
+        """
+        Period label per line.
+
+        Args:
+            dates: the run's lines with INPUT_COLUMNS, in line order
+            granularity: "month" or "quarter"
+
+        Returns:
+            Categorical of labels whose categories are the periods in
+            chronological order (UNDATED last)
+        """
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Invalid granularity: {granularity}. Must be one of {list(GRANULARITIES)}")
+        freq, label_format = GRANULARITIES[granularity]
+
+        line_dates = _parse_dates(dates["Entry Date"]).fillna(_parse_dates(dates["EU Export Date"]))
+        codes, periods = pd.factorize(line_dates.dt.to_period(freq), sort=True)
+        categories = [period.strftime(label_format).upper() for period in periods]
+
+        undated = codes < 0
+        if undated.any():
+            print(f"⚠️ WARNING: {undated.sum()} lines have no readable Entry Date or EU Export Date; "
+                  f"reported under {PeriodSplitter.UNDATED}")
+            codes = np.where(undated, len(categories), codes)
+            categories.append(PeriodSplitter.UNDATED)
+
+        return pd.Categorical.from_codes(codes, categories=categories)
+
+    @staticmethod
+    def folder_name(period: str) -> str:
+        """Output folder of a period, e.g. Q4_2025."""
+        return period.replace(" ", "_")
@@ -0,0 +1,196 @@
+"""Lazy stage graph with memoized intermediate results."""
+
+import contextvars
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+
+class Pipeline:
+    """
+    Declared dependency graph of stages.
+
+    Each stage names the stages whose results it consumes, the report files
+    it writes and the ReadPlanner stages whose input columns it reads.
+    Running the pipeline for a set of report files executes only the
+    upstream subgraph of the stages that write them, and every stage result
+    is memoized so it is computed at most once per Pipeline. Reports of
+    stages declared with optional=True are only produced when requested.
+
+    With a checkpoint store (checkpoints.CheckpointStore), stages declared
+    with checkpoint=True persist their results, and a stage restored from a
+    checkpoint does not need its dependencies to be computed at all.
+
+    With workers > 1, independent stages run concurrently on a thread pool:
+    each stage starts as soon as its dependencies are done.
+    """
+
+    def __init__(self, checkpoints=None, workers: int = 1):
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        self.results: Dict[str, Any] = {}
+        self.active: List[str] = []
+        self.checkpoints = checkpoints
+        self.workers = workers
+
+    def add_stage(
+            self,
+            name: str,
+            func: Callable,
+            deps: Iterable[str] = (),
+            outputs: Iterable[str] = (),
+            reads: Iterable[str] = (),
+            checkpoint: bool = False,
+            optional: bool = False,
+    ) -> None:
+        """Register a stage; func is called with the results of deps in order."""
+        if name in self.stages:
+            raise ValueError(f"Stage {name} is already defined")
+        for dep in deps:
+            if dep not in self.stages:
+                raise ValueError(f"Stage {name} depends on undefined stage {dep}")
+        self.stages[name] = {
+            "func": func,
+            "deps": list(deps),
+            "outputs": list(outputs),
+            "reads": list(reads),
+            "checkpoint": checkpoint,
+            "optional": optional,
+        }
+
+    @property
+    def outputs(self) -> Dict[str, str]:
+        """Report file name -> stage that writes it."""
+        return {
+            output: name
+            for name, stage in self.stages.items()
+            for output in stage["outputs"]
+        }
+
+    @property
+    def default_outputs(self) -> List[str]:
+        """Reports produced when none are requested: those of the non-optional stages."""
+        return [output for output, name in self.outputs.items() if not self.stages[name]["optional"]]
+
+    def output_stages(self, outputs: Optional[Iterable[str]] = None) -> List[str]:
+        """Stages writing the requested reports (default_outputs when None)."""
+        available = self.outputs
+        if outputs is None:
+            outputs = self.default_outputs
+
+        unknown = [output for output in outputs if output not in available]
+        if unknown:
+            raise ValueError(f"Unknown outputs: {unknown}. Must be one of {list(available)}")
+
+        stages = []
+        for output in outputs:
+            if available[output] not in stages:
+                stages.append(available[output])
+        return stages
+
+    def upstream(self, targets: Iterable[str]) -> List[str]:
+        """Targets and everything they depend on, in execution order."""
+        order = []
+
+        def visit(name):
+            if name in order:
+                return
+            for dep in self.stages[name]["deps"]:
+                visit(dep)
+            order.append(name)
+
+        for target in targets:
+            visit(target)
+        return order
+
+    def reads(self, stages: Optional[Iterable[str]] = None) -> List[str]:
+        """ReadPlanner stages read by the given (default: active) stages."""
+        reads = []
+        for name in (self.active if stages is None else stages):
+            for read in self.stages[name]["reads"]:
+                if read not in reads:
+                    reads.append(read)
+        return reads
+
+    def downstream(self, name: str) -> List[str]:
+        """The stage and every stage that depends on it, directly or not."""
+        stages = [name]
+        for other, stage in self.stages.items():
+            if other not in stages and any(dep in stages for dep in stage["deps"]):
+                stages.append(other)
+        return stages
+
+    def invalidate(self, name: str) -> None:
+        """Forget the memoized results of a stage and everything downstream of it."""
+        for stage in self.downstream(name):
+            self.results.pop(stage, None)
+
+    def set_result(self, name: str, result: Any) -> None:
+        """Use result as a stage's result, forgetting everything downstream of it."""
+        self.invalidate(name)
+        self.results[name] = result
+
+    def select(self, outputs: Optional[Iterable[str]] = None) -> List[str]:
+        """Mark the stages needed for the requested report files as active."""
+        self.active = self.upstream(self.output_stages(outputs))
+        return self.active
+
+    def compute(self, name: str) -> Any:
+        """Return the memoized result of a stage, computing it if needed."""
+        if name not in self.results:
+            stage = self.stages[name]
+            checkpoint = self.checkpoints if stage["checkpoint"] else None
+            if checkpoint and checkpoint.has(name, stage["outputs"]):
+                self.results[name] = checkpoint.load(name)
+            else:
+                args = [self.compute(dep) for dep in stage["deps"]]
+                self.results[name] = stage["func"](*args)
+                if checkpoint:
+                    checkpoint.save(name, self.results[name])
+        return self.results[name]
+
+    def pending(self, targets: Iterable[str]) -> Dict[str, List[str]]:
+        """
+        Stages still to compute for the targets, in execution order, with the
+        dependencies each waits for (none for a stage restored from a checkpoint).
+        """
+        pending = {}
+
+        def visit(name):
+            if name in pending or name in self.results:
+                return
+            stage = self.stages[name]
+            restorable = stage["checkpoint"] and self.checkpoints and self.checkpoints.has(name, stage["outputs"])
+            deps = [] if restorable else stage["deps"]
+            for dep in deps:
+                visit(dep)
+            pending[name] = [dep for dep in deps if dep not in self.results]
+
+        for target in targets:
+            visit(target)
+        return pending
+
+    def run_concurrent(self, targets: Iterable[str]) -> None:
+        """Compute the targets on a thread pool, starting each stage once its dependencies are done."""
+        pending = self.pending(targets)
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="stage") as executor:
+            while pending or running:
+                for name, deps in list(pending.items()):
+                    if all(dep in self.results for dep in deps):
+                        # Each stage runs in a copy of the caller's context (run settings, report writer)
+                        running[executor.submit(contextvars.copy_context().run, self.compute, name)] = name
+                        del pending[name]
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    del running[future]
+                    future.result()  # re-raise a failed stage
+
+    def run(self, outputs: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """Compute only the stages needed for the requested report files."""
+        self.select(outputs)
+        if self.workers > 1:
+            self.run_concurrent(self.output_stages(outputs))
+        else:
+            for name in self.output_stages(outputs):
+                self.compute(name)
+        return {name: self.results[name] for name in self.active if name in self.results}
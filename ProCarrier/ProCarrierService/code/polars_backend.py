@@ -0,0 +1,357 @@
+"""Lazy, multi-threaded Polars implementation of the ProCarrier pipeline.
+
+Mirrors DataLayer, LowValueProcessor and HighValueProcessor stage by stage.
+Reading and cleaning run as one lazy Polars plan (the IC/CH exclusion runs
+inside the scan) that is collected once; the per-MRN ledger is computed
+once over the cleaned lines. Every report stage and line_keys then runs
+over these in-memory frames instead of re-scanning the file, and each
+report collects its aggregations in parallel with pl.collect_all.
+The small per-country tables are handed to the existing pandas helpers for
+merging and storing, so the written reports are laid out exactly the same.
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import polars as pl
+
+from arrow_csv import ArrowCsvReader, NA_VALUES
+from config import Config
+from data_layer import DataLayer
+from duty_processor import DutyProcessor
+from lv_processes import LowValueProcessor
+from hv_processes import HighValueProcessor
+from read_planner import ReadPlanner
+from returns_feed import KEY_COLUMNS
+from xlsx_reader import XlsxReader
+from backends import Backend
+
+
+def _not_in(column: str, values: List[str]) -> pl.Expr:
+    """Null-safe `~isin`, matching pandas where missing values are kept."""
+    return ~pl.col(column).is_in(values).fill_null(False)
+
+
+def _per_mrn_sum(column: str) -> pl.Expr:
+    """groupby('MRN').transform('sum'); rows without an MRN stay null."""
+    return (
+        pl.when(pl.col("MRN").is_not_null())
+        .then(pl.col(column).sum().over("MRN"))
+        .otherwise(None)
+    )
+
+
+def _map(column: pl.Expr, mapping: Dict[str, float]) -> pl.Expr:
+    """Series.map(dict) for string keys; unmapped keys become null."""
+    return column.replace_strict(mapping, default=None, return_dtype=pl.Float64)
+
+
+def _unique_consignments(lf: pl.LazyFrame) -> pl.LazyFrame:
+    """drop_duplicates(subset=['MRN']) keeping the first line of each MRN."""
+    return lf.unique(subset=["MRN"], keep="first", maintain_order=True)
+
+
+def _key(column: str) -> pl.Expr:
+    """returns_feed._key: IDs as strings so 1, 1.0 and "1" match."""
+    return pl.col(column).cast(pl.String).str.strip_chars().str.replace(r"\.0$", "")
+
+
+def _group_sum(lf: pl.LazyFrame, keys: List[str], sums: Dict[str, pl.Expr]) -> pl.LazyFrame:
+    """pandas-style groupby().agg(sum): null keys dropped, keys sorted."""
+    return (
+        lf.drop_nulls(subset=keys)
+        .group_by(keys)
+        .agg([expr.sum().alias(name) for name, expr in sums.items()])
+        .sort(keys)
+        .rename({"Consignee Country": "Country"})
+    )
+
+
+class PolarsBackend(Backend):
+    """Polars execution backend; same stage interface as backends.PandasBackend."""
+
+    name = "polars"
+
+    # ==================== LOADING ====================
+
+    @staticmethod
+    def read(file_name: str, data_type: str, usecols: Optional[List[str]] = None) -> pl.LazyFrame:
+        usecols = usecols or ReadPlanner.required_columns()
+        if data_type == "csv" and ArrowCsvReader.compression(file_name):
+            # scan_csv cannot stream compressed files; parse them with Arrow instead
+            lf = pl.from_arrow(ArrowCsvReader.read_table(file_name, usecols)).lazy()
+        elif data_type == "csv":
+            lf = pl.scan_csv(file_name, null_values=NA_VALUES, infer_schema_length=None)
+        elif data_type == "parquet":
+            lf = pl.scan_parquet(file_name)
+        else:
+            lf = pl.from_pandas(XlsxReader.read(file_name, usecols)).lazy()
+        return lf.select(usecols)
+
+    @staticmethod
+    def clean(lf: pl.LazyFrame) -> pl.LazyFrame:
+        # Collected once, so later stages do not re-scan the input file
+        return PolarsBackend.clean_data(lf).collect().lazy()
+
+    @staticmethod
+    def ledger(lf: pl.LazyFrame) -> Tuple[pl.LazyFrame, pl.LazyFrame]:
+        # Collected once, so the report stages do not recompute the per-MRN window
+        lf = PolarsBackend.add_calculated_fields(lf).collect().lazy()
+        PolarsBackend.warn_missing_vat_rates(lf)
+        return PolarsBackend.separate_data(lf, Config.CONSIGNMENT_THRESHOLD)
+
+    @staticmethod
+    def line_keys(lf: pl.LazyFrame, columns: List[str]) -> pd.DataFrame:
+        return lf.select(columns).collect().to_pandas()
+
+    @staticmethod
+    def to_pandas(lf: pl.LazyFrame) -> pd.DataFrame:
+        return lf.collect().to_pandas()
+
+    @staticmethod
+    def drop_lines(lf: pl.LazyFrame, mask) -> pl.LazyFrame:
+        rows = np.flatnonzero(mask)
+        return lf.with_row_index("_row").filter(~pl.col("_row").is_in(rows)).drop("_row")
+
+    @staticmethod
+    def select_lines(lf: pl.LazyFrame, mask) -> pl.LazyFrame:
+        rows = np.flatnonzero(mask)
+        return lf.with_row_index("_row").filter(pl.col("_row").is_in(rows)).drop("_row")
+
+    @staticmethod
+    def apply_returns(lf: pl.LazyFrame, returned: pd.DataFrame) -> pl.LazyFrame:
+        """
+        Hash-join the returns feed quantities onto the lines (lines keep their
+        order); a repeated (Parcel ID, Line Item ID) gets them on its first line only.
+        """
+        returned_lf = pl.from_pandas(returned).lazy().select(
+            pl.col(KEY_COLUMNS).cast(pl.String),
+            pl.col("Line Item Quantity Returned").cast(pl.Float64).alias("_returned"),
+        )
+        return (
+            lf.with_columns(_key("Parcel ID").alias("_parcel"), _key("Line Item ID").alias("_line"))
+            .join(returned_lf, left_on=["_parcel", "_line"], right_on=KEY_COLUMNS,
+                  how="left", maintain_order="left")
+            .with_columns(
+                pl.when(pl.struct("_parcel", "_line").is_first_distinct())
+                .then(pl.col("_returned").fill_null(0))
+                .otherwise(0.0)
+                .alias("Line Item Quantity Returned")
+            )
+            .drop("_parcel", "_line", "_returned")
+        )
+
+    @staticmethod
+    def clean_data(lf: pl.LazyFrame) -> pl.LazyFrame:
+        lf = lf.filter(_not_in("Consignee Country", DataLayer.EXCLUDED_COUNTRIES))
+
+        # Copy Parcel ID where MRN is missing
+        missing_mrn = pl.col("MRN").is_null() | pl.col("MRN").is_in(DataLayer.MRN_NA_VALUES).fill_null(False)
+        return lf.with_columns(
+            pl.when(missing_mrn)
+            .then(pl.col("Parcel ID").cast(pl.String))
+            .otherwise(pl.col("MRN").cast(pl.String))
+            .alias("MRN")
+        )
+
+    @staticmethod
+    def add_calculated_fields(lf: pl.LazyFrame) -> pl.LazyFrame:
+        lf = lf.with_columns(
+            (pl.col("Line Item Quantity Imported") * pl.col("Line Item Unit Price"))
+            .alias("Line Item Total Value"),
+            _map(pl.col("Consignee Country"), Config.VAT_RATES).alias("VAT Rate"),
+        )
+        return lf.with_columns(_per_mrn_sum("Line Item Total Value").alias("Consignment Value"))
+
+    @staticmethod
+    def warn_missing_vat_rates(lf: pl.LazyFrame) -> None:
+        # Only the country column is scanned for this check
+        missing = (
+            lf.select("Consignee Country", "VAT Rate")
+            .filter(pl.col("VAT Rate").is_null())
+            .select(pl.col("Consignee Country").unique(maintain_order=True))
+            .collect()
+            .to_series()
+            .to_list()
+        )
+        if missing:
+            print(f"⚠️ WARNING: Missing VAT rates for countries: {missing}")
+
+    @staticmethod
+    def separate_data(lf: pl.LazyFrame, threshold: int) -> Tuple[pl.LazyFrame, pl.LazyFrame]:
+        low_value_lf = lf.filter(pl.col("Consignment Value") <= threshold)
+        high_value_lf = lf.filter(pl.col("Consignment Value") > threshold)
+        return low_value_lf, high_value_lf
+
+    # ==================== SHARED AGGREGATIONS ====================
+
+    @staticmethod
+    def calculate_vat_per_country(lf: pl.LazyFrame) -> pl.LazyFrame:
+        """Total consignment value and VAT to pay per country (one line per MRN)."""
+        return _group_sum(
+            _unique_consignments(lf),
+            ["Consignee Country", "VAT Rate"],
+            {
+                "Total Consignment Value": pl.col("Consignment Value"),
+                "Total VAT to Pay": pl.col("Consignment Value") * pl.col("VAT Rate"),
+            },
+        )
+
+    @staticmethod
+    def calculate_return_vat_per_country(lf: pl.LazyFrame) -> pl.LazyFrame:
+        """VAT refunds for returned items per country, at the destination rate."""
+        returned_value = pl.col("Line Item Quantity Returned") * pl.col("Line Item Unit Price")
+        return _group_sum(
+            lf.filter(pl.col("Line Item Quantity Returned") > 0),
+            ["Consignee Country", "VAT Rate"],
+            {
+                "Total Returned Value": returned_value,
+                "Total VAT Refund": returned_value * pl.col("VAT Rate"),
+            },
+        )
+
+    # ==================== LOW VALUE ====================
+
+    @staticmethod
+    def lv_ioss(low_value_lf: pl.LazyFrame):
+        lf = low_value_lf.select(Config.low_value_columns)
+
+        vat_per_country, return_vat_per_country = pl.collect_all([
+            PolarsBackend.calculate_vat_per_country(lf),
+            PolarsBackend.calculate_return_vat_per_country(lf),
+        ])
+
+        combined_vat_per_country = LowValueProcessor.create_combined_vat_per_country(
+            vat_per_country.to_pandas(), return_vat_per_country.to_pandas()
+        )
+        LowValueProcessor.store_lv_data(combined_vat_per_country)
+
+        dr_lv_fee = LowValueProcessor.calculate_fee_lv(combined_vat_per_country)
+        import_ioss = combined_vat_per_country["Total VAT to Pay"].sum()
+        return_ioss = combined_vat_per_country["Total VAT Refund"].sum()
+
+        return dr_lv_fee, import_ioss, return_ioss
+
+    # ==================== HIGH VALUE ====================
+
+    @staticmethod
+    def duty_paid(lf: pl.LazyFrame, duty_dict: Dict[str, float]) -> pl.LazyFrame:
+        # tariff_lookup.normalize_codes: digits only, without the ".0" of float codes
+        goods_code = (
+            pl.col("HS CODE").cast(pl.String).str.replace(r"\.0$", "").str.replace_all(r"\D", "")
+            .str.slice(0, DutyProcessor.GOODS_CODE_LENGTH)
+        )
+        lf = lf.with_columns(
+            _map(goods_code, duty_dict).alias("Duty Rate"),
+            (pl.col("Line Item Quantity Imported") * pl.col("Line Item Unit Price")).alias("Item Value"),
+        )
+        return lf.with_columns((pl.col("Item Value") * pl.col("Duty Rate")).alias("Duty"))
+
+    @staticmethod
+    def calculate_broker_vat(lf: pl.LazyFrame, exclude_nl_destination: bool) -> pl.LazyFrame:
+        """(consignment value + consignment duty) × NL VAT, summed over MRNs."""
+        unique_consignments = _unique_consignments(
+            lf.with_columns(_per_mrn_sum("Duty").alias("Total Consignment Duty"))
+        )
+        if exclude_nl_destination:
+            unique_consignments = unique_consignments.filter(
+                pl.col("Consignee Country").ne_missing("NL")
+            )
+        return unique_consignments.select(
+            ((pl.col("Consignment Value") + pl.col("Total Consignment Duty"))
+             * Config.VAT_RATES["NL"]).sum().alias("VAT Amount")
+        )
+
+    @staticmethod
+    def calculate_rgr_vat_return(lf: pl.LazyFrame, vat_rate: float) -> pl.LazyFrame:
+        """RGR VAT refunds with returned duty included in the VAT base."""
+        returned_value = pl.col("Line Item Quantity Returned") * pl.col("Line Item Unit Price")
+        returned_duty = returned_value * pl.col("Duty Rate")
+        return _group_sum(
+            lf.filter(pl.col("Line Item Quantity Returned") > 0),
+            ["Consignee Country", "VAT Rate"],
+            {
+                "Total Returned Value": returned_value,
+                "Total VAT Refund": (returned_value + returned_duty) * vat_rate,
+            },
+        )
+
+    @staticmethod
+    def calculate_duty_for_returned_items(lf: pl.LazyFrame) -> pl.LazyFrame:
+        returned_value = pl.col("Line Item Quantity Returned") * pl.col("Line Item Unit Price")
+        returned_lf = lf.filter(
+            (pl.col("Line Item Quantity Returned") > 0)
+            & _not_in("Consignee Country", Config.DUTY_EXCLUDED_COUNTRIES)
+        )
+        return _group_sum(
+            returned_lf,
+            ["Consignee Country"],
+            {
+                "Total Returned Value": returned_value,
+                "Total Duty Returned": returned_value * pl.col("Duty Rate"),
+            },
+        )
+
+    @staticmethod
+    def split_declaration(high_value_lf: pl.LazyFrame) -> Tuple[pl.LazyFrame, pl.LazyFrame]:
+        lf = high_value_lf.select(Config.high_value_columns)
+        decl_country = pl.col("MRN").str.slice(2, 2).str.to_uppercase()
+        return lf.filter(decl_country == "IE"), lf.filter(decl_country.ne_missing("IE"))
+
+    # ==================== HV DECLARED IN NL ==============================
+
+    @staticmethod
+    def hv_nl_oss(hv_declared_in_NL: pl.LazyFrame) -> pd.DataFrame:
+        oss_lf = hv_declared_in_NL.filter(pl.col("Consignee Country").ne_missing("NL"))
+        oss_vat, oss_return_vat = pl.collect_all([
+            PolarsBackend.calculate_vat_per_country(oss_lf),
+            PolarsBackend.calculate_return_vat_per_country(oss_lf),
+        ])
+
+        combined_vat_per_country = HighValueProcessor.create_combined_oss_vat_per_country(
+            oss_vat.to_pandas(), oss_return_vat.to_pandas()
+        )
+        HighValueProcessor.store_oss_data(combined_vat_per_country)
+        return combined_vat_per_country
+
+    @staticmethod
+    def hv_nl_rgr(hv_declared_in_NL: pl.LazyFrame, duty_dict: Dict[str, float]):
+        lf = PolarsBackend.duty_paid(hv_declared_in_NL, duty_dict)
+        broker_paid, to_return_from_nl, nl_rgr, nl_duty = pl.collect_all([
+            PolarsBackend.calculate_broker_vat(lf, exclude_nl_destination=False),
+            PolarsBackend.calculate_broker_vat(lf, exclude_nl_destination=True),
+            PolarsBackend.calculate_rgr_vat_return(lf, Config.VAT_RATES["NL"]),
+            PolarsBackend.calculate_duty_for_returned_items(lf),
+        ])
+
+        combined_refunds = HighValueProcessor.duty_vat_hv_merge(
+            nl_rgr.to_pandas(), nl_duty.to_pandas()
+        )
+        HighValueProcessor.store_nl_refunds_data(combined_refunds)
+        return broker_paid["VAT Amount"][0], to_return_from_nl["VAT Amount"][0], combined_refunds
+
+    # ==================== HV DECLARED IN IE ==============================
+
+    @staticmethod
+    def hv_ie_rgr(hv_declared_in_IE: pl.LazyFrame, duty_dict: Dict[str, float]) -> pd.DataFrame:
+        lf = PolarsBackend.duty_paid(hv_declared_in_IE, duty_dict)
+        # IE imports must be domestic (IE→IE only); validation reports the others
+        outside_ie = pl.col("Consignee Country").ne_missing("IE")
+        non_ie_dest, ie_rgr = pl.collect_all([
+            lf.filter(outside_ie).select(pl.col("Consignee Country").unique(maintain_order=True)),
+            PolarsBackend.calculate_rgr_vat_return(lf.filter(~outside_ie), Config.VAT_RATES["IE"]),
+        ])
+        if non_ie_dest.height:
+            HighValueProcessor.warn_outside_ie(non_ie_dest.to_series().to_list())
+
+        return_rgr = ie_rgr.to_pandas()
+        return_rgr["Total Refund"] = return_rgr["Total VAT Refund"]
+        HighValueProcessor.store_ie_hv_data(return_rgr)
+        return return_rgr
+
+    @staticmethod
+    def hv_returned_lines(high_value_lf: pl.LazyFrame) -> pd.DataFrame:
+        """HV ledger lines with returns; only this small subset is converted to pandas."""
+        return high_value_lf.filter(pl.col("Line Item Quantity Returned") > 0).collect().to_pandas()
+
@@ -0,0 +1,198 @@
+"""Fast preview: estimate the summary figures from a stratified sample of consignments.
+
+Consignments (MRNs) are stratified by destination country, LV/HV class and
+declaration country. A sample of Config.PREVIEW_SAMPLE_SIZE MRNs is drawn,
+allocated to the strata in proportion to their size, with at least two per
+stratum. Only the sampled MRNs go through the ledger calculations. Every
+INFORMATION.xlsx figure is a sum over consignments, so each is estimated
+with the stratified expansion estimator, sum_h N_h * mean_h. The confidence
+interval is est +/- z * sqrt(sum_h N_h^2 (1 - n_h/N_h) s_h^2 / n_h). With a
+sample at least as large as the file, the figures equal a full run and the
+intervals have zero width. The same seed and file always draw the same
+sample.
+"""
+
+from pathlib import Path
+from statistics import NormalDist
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from config import Config
+from data_layer import DataLayer
+from line_ledger import LineLedger
+
+# Per-consignment amounts the figures are built from (line ledger sums)
+AMOUNTS = [
+    "LV Import VAT", "LV Return VAT", "LV DR Fee", "Broker VAT", "Claimable Broker VAT",
+    "OSS VAT", "OSS Return VAT", "NL VAT Refund", "NL Duty Refund", "IE VAT Refund",
+]
+
+# Summary figure -> formula over AMOUNTS, as in main.generate_summary_table
+FIGURES = {
+    "TOTAL IOSS VAT": lambda a: a["LV Import VAT"],
+    "RETURNED IOSS VAT": lambda a: a["LV Return VAT"],
+    "NET IOSS VAT": lambda a: a["LV Import VAT"] - a["LV Return VAT"],
+    "AMOUNT BROKER PAID": lambda a: a["Broker VAT"],
+    "AMOUNT THAT CAN BE CLAIMED BACK": lambda a: a["Claimable Broker VAT"],
+    "OSS import VAT paid": lambda a: a["OSS VAT"],
+    "OSS return VAT": lambda a: a["OSS Return VAT"],
+    "NET OSS VAT": lambda a: a["OSS VAT"] - a["OSS Return VAT"],
+    "Total VAT Refund From HV": lambda a: a["NL VAT Refund"] + a["IE VAT Refund"],
+    "Total Duty Returned": lambda a: a["NL Duty Refund"],
+    "Total Refunds": lambda a: a["NL Duty Refund"] + a["NL VAT Refund"] + a["IE VAT Refund"],
+    "Duty Refunds Commission": lambda a: PreviewEstimator.dr_fee(a),
+    "Amount to invoice Pro Carrier:": lambda a: (
+            a["LV Import VAT"] - a["LV Return VAT"] + a["OSS VAT"] - a["OSS Return VAT"]
+            + PreviewEstimator.dr_fee(a)
+    ),
+    "Amount to be paid to Pro Carrier:": lambda a: (
+            a["NL Duty Refund"] + a["IE VAT Refund"] + a["NL VAT Refund"] + a["Claimable Broker VAT"]
+    ),
+}
+
+
+class PreviewEstimator:
+    """Stratified sampling and expansion estimates of the summary figures."""
+
+    STRATA = ["Consignee Country", "Class", "Declared In"]
+
+    REPORT_NAME = "PREVIEW.xlsx"
+
+    @staticmethod
+    def dr_fee(amounts: pd.DataFrame) -> pd.Series:
+        return (
+                (amounts["NL Duty Refund"] + amounts["NL VAT Refund"]) * 0.2
+                + amounts["IE VAT Refund"] * 0.3
+                + amounts["LV DR Fee"]
+        )
+
+    @staticmethod
+    def consignments(df: pd.DataFrame) -> pd.DataFrame:
+        """One row per MRN with its stratum (country of its first line, class, declaration country)."""
+        value = df["Line Item Quantity Imported"] * df["Line Item Unit Price"]
+        consignments = df[["MRN", "Consignee Country"]].assign(Value=value).groupby(
+            "MRN", sort=False
+        ).agg({"Consignee Country": "first", "Value": "sum"})
+
+        hv = consignments["Value"] > Config.CONSIGNMENT_THRESHOLD
+        consignments["Class"] = np.where(hv, "HV", "LV")
+        declared_in = np.where(consignments.index.astype(str).str[2:4].str.upper() == "IE", "IE", "NL")
+        consignments["Declared In"] = np.where(hv, declared_in, "-")
+        consignments["Consignee Country"] = consignments["Consignee Country"].fillna("-")
+        return consignments.drop(columns="Value")
+
+    @staticmethod
+    def sample(consignments: pd.DataFrame, sample_size: int, seed: int) -> pd.DataFrame:
+        """
+        Draw a stratified sample of MRNs.
+
+        Returns:
+            The sampled consignments with their stratum size (N) and sample size (n)
+        """
+        strata = consignments.groupby(PreviewEstimator.STRATA, sort=True).ngroup().to_numpy()
+        sizes = np.bincount(strata)
+        allocation = np.minimum(sizes, np.maximum(2, np.round(sample_size * sizes / sizes.sum()))).astype(int)
+
+        # Random rank within each stratum; keep the first n_h
+        rng = np.random.default_rng(seed)
+        order = np.lexsort((rng.random(len(strata)), strata))
+        starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        rank = np.empty(len(strata), dtype=int)
+        rank[order] = np.arange(len(strata)) - starts[strata[order]]
+
+        selected = rank < allocation[strata]
+        return consignments[selected].assign(
+            Stratum=strata[selected], N=sizes[strata[selected]], n=allocation[strata[selected]]
+        )
+
+    @staticmethod
+    def amounts(ledger: pd.DataFrame, consignments: pd.DataFrame) -> pd.DataFrame:
+        """Per-MRN AMOUNTS from the sampled lines' line ledger."""
+        lv, hv = ledger["Class"] == "LV", ledger["Class"] == "HV"
+        nl, ie = hv & (ledger["Declared In"] == "NL"), hv & (ledger["Declared In"] == "IE")
+        claimable = nl & ledger["MRN"].map(consignments["Consignee Country"]).ne("NL")
+        commission = ledger["Consignee Country"].map(Config.COMMISSION_RATES).fillna(0)
+
+        lines = pd.DataFrame({
+            "MRN": ledger["MRN"],
+            "LV Import VAT": ledger["Import VAT"].where(lv, 0),
+            "LV Return VAT": ledger["Return VAT Refund"].where(lv, 0),
+            "LV DR Fee": (ledger["Return VAT Refund"] * commission).where(lv, 0),
+            "Broker VAT": ledger["Import VAT"].where(nl, 0),
+            "Claimable Broker VAT": ledger["Import VAT"].where(claimable, 0),
+            "OSS VAT": ledger["OSS VAT"],
+            "OSS Return VAT": ledger["OSS Return VAT"],
+            "NL VAT Refund": ledger["Return VAT Refund"].where(nl, 0),
+            "NL Duty Refund": ledger["Duty Refund"],
+            "IE VAT Refund": ledger["Return VAT Refund"].where(ie, 0),
+        })
+        return lines.groupby("MRN", sort=False)[AMOUNTS].sum().reindex(consignments.index).fillna(0)
+
+    @staticmethod
+    def estimate(sample: pd.DataFrame, amounts: pd.DataFrame, confidence: float) -> pd.DataFrame:
+        """Stratified expansion estimate and confidence interval of every summary figure."""
+        values = pd.DataFrame({figure: formula(amounts) for figure, formula in FIGURES.items()})
+        grouped = values.groupby(sample["Stratum"].to_numpy())
+        strata = sample.groupby("Stratum")[["N", "n"]].first()
+
+        means = grouped.mean()
+        variances = grouped.var(ddof=1).fillna(0)
+        N, n = strata["N"].to_numpy()[:, None], strata["n"].to_numpy()[:, None]
+
+        total = (means * N).sum()
+        standard_error = np.sqrt((variances * N ** 2 * (1 - n / N) / n).sum())
+        z = NormalDist().inv_cdf(0.5 + confidence / 2)
+
+        return pd.DataFrame({
+            "Section": list(FIGURES),
+            "Estimate": total.to_numpy(),
+            "Lower": (total - z * standard_error).to_numpy(),
+            "Upper": (total + z * standard_error).to_numpy(),
+            "Standard Error": standard_error.to_numpy(),
+        })
+
+    @staticmethod
+    def preview(
+            lines: pd.DataFrame,
+            duty_dict: Dict[str, float],
+            sample_size: Optional[int] = None,
+            seed: Optional[int] = None,
+            confidence: Optional[float] = None,
+    ) -> pd.DataFrame:
+        """
+        Estimate the summary figures from a sample of the cleaned input lines.
+
+        Args:
+            lines: cleaned input lines (DataLayer.clean_data output)
+            duty_dict: max duty rate per 4-digit goods code
+            sample_size: MRNs to sample (default Config.PREVIEW_SAMPLE_SIZE)
+            seed: random seed (default Config.PREVIEW_SEED)
+            confidence: confidence level of the intervals (default Config.PREVIEW_CONFIDENCE)
+
+        Returns:
+            One row per summary figure with Estimate, Lower, Upper and Standard Error
+        """
+        sample_size = sample_size or Config.PREVIEW_SAMPLE_SIZE
+        seed = Config.PREVIEW_SEED if seed is None else seed
+        confidence = confidence or Config.PREVIEW_CONFIDENCE
+
+        consignments = PreviewEstimator.consignments(lines)
+        sample = PreviewEstimator.sample(consignments, sample_size, seed)
+
+        low_value_df, high_value_df = DataLayer.build_ledger(lines[lines["MRN"].isin(sample.index)].copy())
+        ledger = LineLedger.build(low_value_df, high_value_df, duty_dict)
+        estimates = PreviewEstimator.estimate(sample, PreviewEstimator.amounts(ledger, sample), confidence)
+
+        print(f"🔎 Preview from {len(sample)} of {len(consignments)} consignments "
+              f"({sample['Stratum'].nunique()} strata, seed {seed}, {confidence:.0%} intervals)")
+        return estimates
+
+    @staticmethod
+    def store_preview(estimates: pd.DataFrame) -> None:
+        """Save the preview estimates to Excel."""
+        data_dir = Path(Config.DATA_DIR)
+        data_dir.mkdir(exist_ok=True)
+
+        estimates.to_excel(data_dir / PreviewEstimator.REPORT_NAME, index=False, engine="openpyxl")
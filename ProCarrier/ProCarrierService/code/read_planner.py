@@ -0,0 +1,92 @@
+"""Read planning: which input columns each stage needs."""
+
+from typing import Dict, Iterable, List
+
+
+from arrow_csv import ArrowCsvReader
+from data_layer import DataLayer
+from xlsx_reader import XlsxReader
+from lv_processes import LowValueProcessor
+from hv_processes import HighValueProcessor
+from rgr_documents import RgrDocumentGenerator
+from returns_feed import ReturnsFeed
+from dedup_index import DedupIndex
+from line_ledger import LineLedger
+from periods import PeriodSplitter
+from validation import LineValidator
+
+
+class ReadPlanner:
+    """Derives the input column set from the stages that will run."""
+
+    # Columns each stage reads; calculated columns are resolved by "load"
+    STAGE_INPUTS: Dict[str, List[str]] = {
+        "load": DataLayer.INPUT_COLUMNS,
+        "low_value": LowValueProcessor.INPUT_COLUMNS,
+        "high_value": HighValueProcessor.INPUT_COLUMNS,
+        "rgr_documents": RgrDocumentGenerator.DOCUMENT_COLUMNS,
+        "returns": ReturnsFeed.INPUT_COLUMNS,
+        "dedup": DedupIndex.KEY_COLUMNS,
+        "line_ledger": LineLedger.INPUT_COLUMNS,
+        "periods": PeriodSplitter.INPUT_COLUMNS,
+        "validate": LineValidator.INPUT_COLUMNS,
+        "duty_check": LineValidator.DUTY_INPUT_COLUMNS,
+    }
+
+    DEFAULT_STAGES = ("load", "low_value", "high_value")
+
+    @staticmethod
+    def stage_columns(stage: str) -> List[str]:
+        """Raw input columns a single stage reads from the file."""
+        if stage not in ReadPlanner.STAGE_INPUTS:
+            raise ValueError(f"Unknown stage: {stage}. Must be one of {list(ReadPlanner.STAGE_INPUTS)}")
+        return [
+            column for column in ReadPlanner.STAGE_INPUTS[stage]
+            if column not in DataLayer.CALCULATED_COLUMNS
+        ]
+
+    @staticmethod
+    def required_columns(stages: Iterable[str] = DEFAULT_STAGES) -> List[str]:
+        """Union of raw input columns for the given stages (load always runs)."""
+        columns = []
+        for stage in ["load", *stages]:
+            for column in ReadPlanner.stage_columns(stage):
+                if column not in columns:
+                    columns.append(column)
+        return columns
+
+    @staticmethod
+    def read_header(file_name: str, data_type: str) -> List[str]:
+        """Read only the column names of an input file."""
+        if data_type == "csv":
+            return ArrowCsvReader.read_header(file_name)
+        if data_type == "parquet":
+            import pyarrow.parquet as pq
+
+            return pq.read_schema(file_name).names
+
+        return XlsxReader.read_header(file_name)
+
+    @staticmethod
+    def plan(file_name: str, data_type: str, stages: Iterable[str] = DEFAULT_STAGES) -> List[str]:
+        """
+        Check the input header against every stage that will run and return
+        the columns to pass as `usecols`.
+
+        Raises:
+            ValueError: if any stage's input column is missing from the file
+        """
+        stages = list(stages)
+        header = ReadPlanner.read_header(file_name, data_type)
+
+        missing = {}
+        for stage in ["load", *stages]:
+            stage_missing = [c for c in ReadPlanner.stage_columns(stage) if c not in header]
+            if stage_missing:
+                missing[stage] = stage_missing
+
+        if missing:
+            details = "; ".join(f"{stage}: {columns}" for stage, columns in missing.items())
+            raise ValueError(f"Input file {file_name} is missing required columns ({details})")
+
+        return ReadPlanner.required_columns(stages)
@@ -0,0 +1,77 @@
+"""Background report writing.
+
+Report stages hand their workbooks to write_excel. Inside a ReportWriter
+context, the write is queued to background threads and the stage carries on
+computing. The queue is bounded (Config.REPORT_WRITE_QUEUE pending
+workbooks), so a slow disk applies backpressure instead of buffering every
+report in memory. Leaving the context is the barrier: it waits for every
+write and re-raises the first failure. Outside a context, writes are
+synchronous as before.
+
+Every workbook is written to a temporary name and then renamed, so an
+interrupted run never leaves a truncated report behind.
+"""
+
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+
+from config import Config
+
+# The active writer of the current run context (None -> synchronous writes)
+_writer: contextvars.ContextVar = contextvars.ContextVar("report_writer", default=None)
+
+
+def _write_excel(df: pd.DataFrame, path: Path) -> None:
+    partial = path.with_name(f".partial-{path.name}")
+    df.to_excel(partial, index=False, engine="openpyxl")
+    partial.replace(path)
+
+
+def write_excel(df: pd.DataFrame, path) -> None:
+    """Write a report workbook, in the background when a ReportWriter is active."""
+    writer = _writer.get()
+    if writer is None:
+        _write_excel(df, Path(path))
+    else:
+        writer.submit(df, Path(path))
+
+
+class ReportWriter:
+    """Bounded queue of report writes served by background threads."""
+
+    def __init__(self, workers: Optional[int] = None, max_pending: Optional[int] = None):
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers or Config.REPORT_WRITE_WORKERS, thread_name_prefix="report-writer"
+        )
+        self.slots = threading.BoundedSemaphore(max_pending or Config.REPORT_WRITE_QUEUE)
+        self.futures = []
+        self.token = None
+
+    def submit(self, df: pd.DataFrame, path: Path) -> None:
+        # Blocks while the queue is full; the copy keeps later in-place edits out of the report
+        self.slots.acquire()
+        future = self.executor.submit(_write_excel, df.copy(), path)
+        future.add_done_callback(lambda _: self.slots.release())
+        self.futures.append(future)
+
+    def wait(self) -> None:
+        """Block until every queued report is written; re-raise the first failure."""
+        for future in self.futures:
+            future.result()
+
+    def __enter__(self) -> "ReportWriter":
+        self.token = _writer.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        _writer.reset(self.token)
+        try:
+            if exc_type is None:
+                self.wait()
+        finally:
+            self.executor.shutdown(wait=True)
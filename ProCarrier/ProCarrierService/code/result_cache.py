@@ -0,0 +1,266 @@
+"""Content-addressed cache of whole-run results.
+
+A run is keyed by the SHA-256 of everything its reports depend on: the bytes
+of the input file, the returns feed and the duty tariff, every Config
+setting except UNKEYED_SETTINGS (rate tables, thresholds, validation mode,
+readers, ...), the run options and the code version. After a run,
+every file it wrote to the output folder is stored once under the hash of
+its content (objects/ab/abcd...). An entry (entries/<key>.json) maps the
+relative report paths to those hashes. The results of the report stages
+(summary figures, report tables) are pickled as one more object. A rerun
+with the same key copies the reports into the requested output folder and
+returns those results without computing anything.
+
+Entries not used for Config.RESULT_CACHE_MAX_AGE_DAYS are evicted, then the
+least recently used ones until the cache fits in
+Config.RESULT_CACHE_MAX_BYTES. Objects no entry refers to are removed.
+
+Usage:
+    python result_cache.py ../.result_cache --stats
+    python result_cache.py ../.result_cache --evict
+    python result_cache.py ../.result_cache --clear
+"""
+
+import argparse
+import hashlib
+import json
+import pickle
+import shutil
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+from config import Config
+from checkpoints import code_version, config_fingerprint
+
+# Config settings the reports do not depend on: the output folder, inputs keyed
+# by their content instead of their path, and performance / service plumbing.
+# Every other setting is part of the key.
+UNKEYED_SETTINGS = [
+    "DATA_DIR", "DEFAULT_DUTY_EXCEL_PATH", "RGR_TEMPLATE_PATH",
+    "CSV_BLOCK_BYTES", "XLSX_BATCH_ROWS", "XLSX_WORKERS", "SQL_MEMORY_LIMIT", "SQL_TEMP_DIR",
+    "RGR_WORKERS", "SCENARIO_WORKERS", "MAP_REDUCE_WORKERS",
+    "PIPELINE_WORKERS", "REPORT_WRITE_WORKERS", "REPORT_WRITE_QUEUE",
+    "WATCH_INBOX", "WATCH_OUTBOX", "WATCH_POLL_SECONDS", "WATCH_SETTLE_SECONDS",
+    "HTTP_HOST", "HTTP_PORT", "HTTP_WORKERS", "HTTP_MAX_UPLOAD_BYTES",
+    "CHECKPOINT_DIR", "RESULT_CACHE_DIR", "RESULT_CACHE_MAX_BYTES", "RESULT_CACHE_MAX_AGE_DAYS",
+]
+
+
+def snapshot(directory: str) -> Dict[str, tuple]:
+    """(size, mtime) of every file under a directory, to tell which files a run wrote."""
+    return {
+        path.relative_to(directory).as_posix(): (path.stat().st_size, path.stat().st_mtime_ns)
+        for path in Path(directory).rglob("*") if path.is_file()
+    }
+
+
+def file_digest(file_name: str) -> str:
+    """SHA-256 of a file's bytes."""
+    with open(file_name, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def _digests(entry: Dict[str, Any]) -> List[str]:
+    """Objects an entry refers to: its report files and its pickled results."""
+    return [*entry["files"].values(), entry["results"]]
+
+
+class CachedResults(dict):
+    """Report stage results of a cached run; other stages are not kept."""
+
+    def __missing__(self, stage):
+        raise KeyError(
+            f"Stage {stage!r} is not kept in the result cache (cached: {sorted(self)}). "
+            f"Set Config.RESULT_CACHE_DIR = None (--no-cache) to compute it."
+        )
+
+
+class ResultCache:
+    """Report files of earlier runs, stored once per distinct content."""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.objects = self.path / "objects"
+        self.entries = self.path / "entries"
+
+    @staticmethod
+    def run_key(input_files, options: Any) -> str:
+        """Cache key of a run from its input files (missing ones skipped), settings and options."""
+        parts = {
+            "inputs": [file_digest(f) if f else None for f in input_files],
+            "settings": config_fingerprint(exclude=UNKEYED_SETTINGS),
+            "template": file_digest(Config.RGR_TEMPLATE_PATH) if Config.RGR_TEMPLATE_PATH else None,
+            "options": options,
+            "code": code_version(),
+        }
+        return hashlib.sha256(repr(parts).encode("utf-8")).hexdigest()
+
+    # ==================== ENTRIES ====================
+
+    def _entry_file(self, key: str) -> Path:
+        return self.entries / f"{key}.json"
+
+    def _object_file(self, digest: str) -> Path:
+        return self.objects / digest[:2] / digest
+
+    def _read_entry(self, entry_file: Path) -> Dict[str, Any]:
+        return json.loads(entry_file.read_text(encoding="utf-8"))
+
+    def _write_entry(self, entry: Dict[str, Any]) -> None:
+        self.entries.mkdir(parents=True, exist_ok=True)
+        entry_file = self._entry_file(entry["key"])
+        partial = entry_file.with_suffix(".tmp")
+        partial.write_text(json.dumps(entry, indent=2), encoding="utf-8")
+        partial.replace(entry_file)
+
+    def materialize(self, key: str, output_dir: str) -> Optional[Any]:
+        """Copy a cached run's reports into output_dir and return its results; None on a cache miss."""
+        entry_file = self._entry_file(key)
+        if not entry_file.exists():
+            return None
+        entry = self._read_entry(entry_file)
+        if "results" not in entry or not all(self._object_file(digest).exists() for digest in _digests(entry)):
+            return None
+        with open(self._object_file(entry["results"]), "rb") as f:
+            results = pickle.load(f)
+
+        for name, digest in entry["files"].items():
+            target = Path(output_dir) / name
+            target.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(self._object_file(digest), target)
+
+        entry["last_used"] = time.time()
+        entry["hits"] += 1
+        self._write_entry(entry)
+        return results
+
+    def _store_object(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        object_file = self._object_file(digest)
+        if not object_file.exists():
+            object_file.parent.mkdir(parents=True, exist_ok=True)
+            object_file.write_bytes(data)
+        return digest
+
+    def store(self, key: str, output_dir: str, before: Dict[str, tuple], results: Any) -> None:
+        """
+        Add the files a run wrote to output_dir (new or changed since the
+        `before` snapshot) and its report stage results under its key.
+        """
+        files = {}
+        for name, stat in sorted(snapshot(output_dir).items()):
+            if before.get(name) == stat:
+                continue
+            path = Path(output_dir) / name
+            digest = file_digest(path)
+            object_file = self._object_file(digest)
+            if not object_file.exists():
+                object_file.parent.mkdir(parents=True, exist_ok=True)
+                shutil.copyfile(path, object_file)
+            files[name] = digest
+
+        results_digest = self._store_object(pickle.dumps(results, protocol=pickle.HIGHEST_PROTOCOL))
+
+        now = time.time()
+        self._write_entry({
+            "key": key, "created": now, "last_used": now, "hits": 0, "files": files, "results": results_digest,
+        })
+        self.evict()
+
+    # ==================== EVICTION ====================
+
+    def _object_sizes(self) -> Dict[str, int]:
+        return {path.name: path.stat().st_size for path in self.objects.glob("*/*")}
+
+    def evict(self) -> int:
+        """Drop entries by age, then least recently used beyond the size limit; returns entries removed."""
+        entries = sorted(
+            (self._read_entry(entry_file) for entry_file in self.entries.glob("*.json")),
+            key=lambda entry: entry["last_used"],
+            reverse=True,
+        )
+        sizes = self._object_sizes()
+        max_age = Config.RESULT_CACHE_MAX_AGE_DAYS * 86400
+        now = time.time()
+
+        kept, removed, referenced, total = [], 0, set(), 0
+        for entry in entries:
+            new_objects = set(_digests(entry)) - referenced
+            entry_bytes = sum(sizes.get(digest, 0) for digest in new_objects)
+            if now - entry["last_used"] > max_age or (kept and total + entry_bytes > Config.RESULT_CACHE_MAX_BYTES):
+                self._entry_file(entry["key"]).unlink()
+                removed += 1
+                continue
+            kept.append(entry)
+            referenced |= new_objects
+            total += entry_bytes
+
+        for digest in set(sizes) - referenced:
+            self._object_file(digest).unlink()
+        return removed
+
+    def size(self) -> int:
+        """Bytes stored."""
+        return sum(self._object_sizes().values())
+
+    def stats(self) -> pd.DataFrame:
+        """One row per entry: files, bytes, hits and ages."""
+        sizes = self._object_sizes()
+        now = time.time()
+        rows = [
+            {
+                "key": entry["key"][:16],
+                "files": len(entry["files"]),
+                "bytes": sum(sizes.get(digest, 0) for digest in _digests(entry)),
+                "hits": entry["hits"],
+                "age_days": round((now - entry["created"]) / 86400, 1),
+                "idle_days": round((now - entry["last_used"]) / 86400, 1),
+            }
+            for entry in map(self._read_entry, self.entries.glob("*.json"))
+        ]
+        return pd.DataFrame(rows, columns=["key", "files", "bytes", "hits", "age_days", "idle_days"])
+
+    def clear(self) -> None:
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+def result_cache() -> Optional[ResultCache]:
+    """
+    The configured cache, or None when disabled. Runs that update the dedup
+    or lookup index are never served from the cache, because their results
+    depend on those indexes' history.
+    """
+    if not Config.RESULT_CACHE_DIR or Config.DEDUP_INDEX_DIR or Config.LOOKUP_INDEX_PATH:
+        return None
+    return ResultCache(Config.RESULT_CACHE_DIR)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or trim the run result cache.")
+    parser.add_argument("cache_dir", nargs="?", help="Cache directory (default: Config.RESULT_CACHE_DIR)")
+    parser.add_argument("--stats", action="store_true", help="List the cached runs")
+    parser.add_argument("--evict", action="store_true", help="Apply the age and size limits now")
+    parser.add_argument("--clear", action="store_true", help="Remove the whole cache")
+    args = parser.parse_args()
+
+    cache = ResultCache(args.cache_dir or Config.RESULT_CACHE_DIR)
+    if args.clear:
+        cache.clear()
+        print(f"Cleared {cache.path}")
+        return
+    if args.evict:
+        print(f"Evicted {cache.evict()} entries")
+
+    stats = cache.stats()
+    total = cache.size()
+    if args.stats and len(stats):
+        print(stats.sort_values("idle_days").to_string(index=False))
+    print(f"{len(stats)} cached runs, {total / 1e6:.1f} MB stored "
+          f"(limit {Config.RESULT_CACHE_MAX_BYTES / 1e6:.0f} MB, {Config.RESULT_CACHE_MAX_AGE_DAYS} days)")
+
+
+if __name__ == "__main__":
+    main()
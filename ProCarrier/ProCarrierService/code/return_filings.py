@@ -0,0 +1,226 @@
+"""Bulk OSS / IOSS return filings from the combined country tables.
+
+Each filing is one client's return for one period under one scheme. Its
+lines are the combined per-country table of that run:
+LowValueProcessor.create_combined_vat_per_country (IOSS, saved as
+IOSS_SUM.xlsx) or HighValueProcessor.create_combined_oss_vat_per_country
+(OSS, saved as OSS_VAT_PER_COUNTRY.xlsx). A filing has one supply per
+member state of consumption and VAT rate, with:
+
+- the taxable amount and VAT of the period's sales;
+- the returned taxable amount and VAT, as negative amounts;
+- the net VAT due.
+
+The tables carry VAT amounts and rates, so a taxable amount is its VAT
+amount divided by the rate.
+
+Filings are written as they are produced, to one CSV and/or XML file per
+scheme. Only one filing's table is in memory at a time, so a batch of many
+clients x periods never builds whole documents.
+
+Batch layout read by run_folders: <root>/<client>/<period folder>/, i.e.
+process_data(..., period_split=...) output folders, one per client.
+
+Usage:
+    python return_filings.py ../CLIENT_RESULTS --output-folder ../FILINGS --formats csv xml
+"""
+
+import argparse
+import csv
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Tuple
+from xml.sax.saxutils import XMLGenerator
+
+import pandas as pd
+
+from config import Config
+
+# Scheme -> combined country table report of a run
+SCHEME_REPORTS = {
+    "IOSS": "IOSS_SUM.xlsx",
+    "OSS": "OSS_VAT_PER_COUNTRY.xlsx",
+}
+
+SUPPLY_COLUMNS = [
+    "Member State", "VAT Rate", "Taxable Amount", "VAT Amount",
+    "Returned Taxable Amount", "Returned VAT Amount", "Net VAT Amount",
+]
+
+CSV_COLUMNS = ["Scheme", "Client", "Period", *SUPPLY_COLUMNS]
+
+XML_NAMESPACE = "urn:procarrier:vat-returns:1"
+
+# (scheme, client, period, combined country table)
+Filing = Tuple[str, str, str, pd.DataFrame]
+
+
+def _money(value: float) -> str:
+    return f"{value:.2f}"
+
+
+def _taxable(vat: float, rate: float) -> float:
+    return vat / rate if rate > 0 else 0.0
+
+
+class _CsvFilings:
+    """Appends filings to a CSV file, one row per supply."""
+
+    def __init__(self, path: Path):
+        self.file = open(path, "w", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(CSV_COLUMNS)
+
+    def add(self, scheme: str, client: str, period: str, supplies: List[dict]) -> None:
+        self.writer.writerows([scheme, client, period, *supply.values()] for supply in supplies)
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class _XmlFilings:
+    """Appends filings to an XML document, one <VATReturn> element each."""
+
+    def __init__(self, path: Path, scheme: str):
+        self.file = open(path, "w", encoding="utf-8")
+        self.xml = XMLGenerator(self.file, encoding="utf-8", short_empty_elements=True)
+        self.xml.startDocument()
+        self.xml.startElement("VATReturns", {"xmlns": XML_NAMESPACE, "scheme": scheme})
+
+    def element(self, name: str, text: str) -> None:
+        self.xml.startElement(name, {})
+        self.xml.characters(text)
+        self.xml.endElement(name)
+
+    def add(self, scheme: str, client: str, period: str, supplies: List[dict]) -> None:
+        self.xml.startElement("VATReturn", {})
+        self.element("Client", client)
+        self.element("Period", period)
+        self.xml.startElement("Supplies", {})
+        for supply in supplies:
+            self.xml.startElement("Supply", {})
+            for column, value in supply.items():
+                self.element(column.replace(" ", ""), value)
+            self.xml.endElement("Supply")
+        self.xml.endElement("Supplies")
+        net = sum(float(supply["Net VAT Amount"]) for supply in supplies)
+        self.element("TotalNetVATAmount", _money(net))
+        self.xml.endElement("VATReturn")
+
+    def close(self) -> None:
+        self.xml.endElement("VATReturns")
+        self.xml.endDocument()
+        self.file.close()
+
+
+WRITERS = {
+    "csv": lambda path, scheme: _CsvFilings(path),
+    "xml": _XmlFilings,
+}
+
+
+class ReturnFilingExporter:
+    """Streams OSS / IOSS return filings into bulk-upload files."""
+
+    @staticmethod
+    def supplies(combined_vat_per_country: pd.DataFrame) -> List[dict]:
+        """One supply per member state of consumption and VAT rate, amounts as 2-decimal strings."""
+        table = combined_vat_per_country
+        table = table[(table["VAT Rate"] > 0) | (table["NET VAT"] != 0)]
+        if (table["VAT Rate"] <= 0).any():
+            unrated = sorted(table.loc[table["VAT Rate"] <= 0, "Country"].astype(str))
+            print(f"⚠️ WARNING: no VAT rate for {unrated}, their taxable amounts are left at 0")
+
+        table = table.sort_values(["Country", "VAT Rate"])
+        rows = zip(
+            table["Country"].astype(str).tolist(),
+            table["VAT Rate"].tolist(),
+            table["Total VAT to Pay"].tolist(),
+            table["Total VAT Refund"].tolist(),
+            table["NET VAT"].tolist(),
+        )
+        return [
+            dict(zip(SUPPLY_COLUMNS, [
+                country, f"{rate * 100:.2f}",
+                _money(_taxable(vat, rate)), _money(vat),
+                _money(0 - _taxable(refund, rate)), _money(0 - refund),
+                _money(net),
+            ]))
+            for country, rate, vat, refund, net in rows
+        ]
+
+    @staticmethod
+    def export(filings: Iterable[Filing], output_dir: str, formats: Iterable[str] = ("csv", "xml")) -> Dict[str, int]:
+        """
+        Write every filing to <SCHEME>_RETURNS.<format> in output_dir.
+
+        Args:
+            filings: (scheme, client, period, combined country table) in any
+                order; a generator keeps only one table in memory
+            output_dir: folder of the bulk-upload files
+            formats: any of "csv", "xml"
+
+        Returns:
+            Number of filings written per scheme
+        """
+        formats = list(formats)
+        invalid = [f for f in formats if f not in WRITERS]
+        if invalid:
+            raise ValueError(f"Invalid formats: {invalid}. Must be any of {list(WRITERS)}")
+        Path(output_dir).mkdir(exist_ok=True, parents=True)
+
+        writers, counts = {}, {}
+        try:
+            for scheme, client, period, table in filings:
+                if scheme not in SCHEME_REPORTS:
+                    raise ValueError(f"Invalid scheme: {scheme}. Must be one of {list(SCHEME_REPORTS)}")
+                if scheme not in writers:
+                    writers[scheme] = [
+                        WRITERS[f](Path(output_dir) / f"{scheme}_RETURNS.{f}", scheme) for f in formats
+                    ]
+                    counts[scheme] = 0
+
+                supplies = ReturnFilingExporter.supplies(table)
+                for writer in writers[scheme]:
+                    writer.add(scheme, client, period, supplies)
+                counts[scheme] += 1
+        finally:
+            for scheme_writers in writers.values():
+                for writer in scheme_writers:
+                    writer.close()
+
+        print(f"📄 Return filings: {counts}, saved to: {output_dir}")
+        return counts
+
+    @staticmethod
+    def run_folders(root: str, schemes: Iterable[str] = tuple(SCHEME_REPORTS)) -> Iterator[Filing]:
+        """
+        Filings of every <root>/<client>/<period folder>/ holding the scheme
+        reports, reading each table only when its filing is written. A run
+        folder directly under a client (no period split) files under
+        Config.DEFAULT_RETURN_PERIOD.
+        """
+        for client_dir in sorted(p for p in Path(root).iterdir() if p.is_dir()):
+            run_dirs = [client_dir, *sorted(p for p in client_dir.iterdir() if p.is_dir())]
+            for run_dir in run_dirs:
+                period = Config.DEFAULT_RETURN_PERIOD if run_dir == client_dir else run_dir.name.replace("_", " ")
+                for scheme in schemes:
+                    report = run_dir / SCHEME_REPORTS[scheme]
+                    if report.exists():
+                        yield scheme, client_dir.name, period, pd.read_excel(report)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export OSS / IOSS return filings for many clients and periods.")
+    parser.add_argument("root", help="Folder with one results folder per client")
+    parser.add_argument("--output-folder", default="../FILINGS")
+    parser.add_argument("--formats", nargs="+", default=["csv", "xml"], choices=list(WRITERS))
+    parser.add_argument("--schemes", nargs="+", default=list(SCHEME_REPORTS), choices=list(SCHEME_REPORTS))
+    args = parser.parse_args()
+
+    ReturnFilingExporter.export(
+        ReturnFilingExporter.run_folders(args.root, args.schemes), args.output_folder, args.formats
+    )
+
+
+if __name__ == "__main__":
+    main()
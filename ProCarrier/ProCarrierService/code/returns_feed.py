@@ -0,0 +1,213 @@
+"""Returns feed: match WMS return events to imported lines.
+
+The WMS emits returns as a separate event stream, often weeks after import.
+Each event names a parcel (by Parcel ID or courier tracking number) and
+optionally a line (Line Item ID) and a quantity. This module joins the
+events to the import lines in bulk and produces the
+"Line Item Quantity Returned" the VAT and duty calculations read:
+
+- IDs are factorised to integer codes, and the lines are keyed by
+  (Parcel ID, Line Item ID). Events are matched with one vectorised hash
+  lookup (pandas Index.get_indexer) and summed per line with np.bincount.
+- An event without a Line Item ID returns the whole parcel.
+- An event without a quantity returns the whole imported quantity of its
+  line.
+- Partial returns from several events on one line are summed.
+- Totals above the imported quantity are capped and reported as
+  over-returns.
+- Events matching no parcel or line are reported as unmatched.
+"""
+
+from pathlib import Path
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config import Config
+
+KEY_COLUMNS = ["Parcel ID", "Line Item ID"]
+
+EXCEPTION_COLUMNS = [
+    "Issue", "Parcel ID", "Line Item ID", "Courier Tracking #",
+    "Quantity Imported", "Quantity Returned",
+]
+
+
+def _key(series: pd.Series) -> pd.Series:
+    """Normalise an ID column to strings so 1, 1.0 and "1" match."""
+    return series.astype("string").str.strip().str.replace(r"\.0$", "", regex=True)
+
+
+def _factorize(*columns: pd.Series) -> Tuple[List[np.ndarray], np.ndarray]:
+    """
+    Shared integer codes for ID columns after _key normalisation (-1 = missing).
+    Only the distinct values are normalised, so this stays fast on millions of rows.
+    """
+    values = pd.concat([pd.Series(column, dtype=object) for column in columns], ignore_index=True)
+    codes, uniques = pd.factorize(values)
+    unique_codes, keys = pd.factorize(_key(pd.Series(uniques, dtype=object)))
+    codes = np.where(codes < 0, -1, unique_codes[codes])
+
+    splits = np.cumsum([len(column) for column in columns])[:-1]
+    return np.split(codes, splits), np.asarray(keys, dtype=object)
+
+
+def _labels(codes: np.ndarray, keys: np.ndarray) -> np.ndarray:
+    """Key strings for codes (None where missing)."""
+    labels = np.empty(len(codes), dtype=object)
+    labels[codes >= 0] = keys[codes[codes >= 0]]
+    return labels
+
+
+class ReturnsFeed:
+    """Joins a return event stream to the imported lines."""
+
+    # Raw input columns needed to match events to import lines
+    INPUT_COLUMNS = ['Parcel ID', 'Line Item ID', 'Courier Tracking #', 'Line Item Quantity Imported']
+
+    # Columns of the return event feed (any may be missing except one parcel key)
+    EVENT_COLUMNS = ['Parcel ID', 'Line Item ID', 'Courier Tracking #', 'Quantity Returned']
+
+    EXCEPTIONS_NAME = "RETURNS_EXCEPTIONS.xlsx"
+
+    @staticmethod
+    def read_events(file_name: str, data_type: str) -> pd.DataFrame:
+        """Read a return event file (csv, xlsx or parquet)."""
+        if data_type == "csv":
+            events = pd.read_csv(file_name, dtype=str)
+        elif data_type == "parquet":
+            events = pd.read_parquet(file_name)
+        elif data_type == "xlsx":
+            events = pd.read_excel(file_name, dtype=str)
+        else:
+            raise ValueError(f"Invalid data_type: {data_type}. Must be 'csv', 'xlsx' or 'parquet'")
+
+        if "Parcel ID" not in events and "Courier Tracking #" not in events:
+            raise ValueError(
+                f"Returns feed {file_name} needs a 'Parcel ID' or 'Courier Tracking #' column"
+            )
+        return events.reindex(columns=ReturnsFeed.EVENT_COLUMNS)
+
+    @staticmethod
+    def match(lines: pd.DataFrame, events: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Match return events to import lines.
+
+        Args:
+            lines: import lines with ReturnsFeed.INPUT_COLUMNS
+            events: return events with ReturnsFeed.EVENT_COLUMNS
+
+        Returns:
+            (returned quantity table, see ReturnsFeed.returns;
+             exceptions DataFrame with EXCEPTION_COLUMNS)
+        """
+        (line_parcel, event_parcel), parcel_keys = _factorize(lines["Parcel ID"], events["Parcel ID"])
+        (line_item, event_item), item_keys = _factorize(lines["Line Item ID"], events["Line Item ID"])
+        (line_tracking, event_tracking), tracking_keys = _factorize(
+            lines["Courier Tracking #"], events["Courier Tracking #"]
+        )
+        imported = pd.to_numeric(lines["Line Item Quantity Imported"], errors="coerce").fillna(0).to_numpy()
+        quantity = pd.to_numeric(events["Quantity Returned"], errors="coerce").to_numpy(dtype=float)
+
+        # Hash index over import lines: (parcel, line item) -> first line position
+        width = len(item_keys) + 1
+        line_index = pd.Index(line_parcel * width + line_item + 1)
+        first_line = ~line_index.duplicated()
+        line_index = line_index[first_line]
+        line_parcel, line_item, imported = line_parcel[first_line], line_item[first_line], imported[first_line]
+        line_tracking = line_tracking[first_line]
+
+        # Resolve tracking numbers to parcels where the event has no Parcel ID
+        # (code + 1 indexes these lookup arrays; slot 0 stands for a missing key)
+        parcel_by_tracking = np.full(len(tracking_keys) + 1, -1)
+        parcel_by_tracking[line_tracking[::-1] + 1] = line_parcel[::-1]
+        parcel_by_tracking[0] = -1
+        event_parcel = np.where(event_parcel < 0, parcel_by_tracking[event_tracking + 1], event_parcel)
+
+        imported_parcels = np.zeros(len(parcel_keys) + 1, dtype=bool)
+        imported_parcels[line_parcel + 1] = True
+        imported_parcels[0] = False
+        known_parcel = imported_parcels[event_parcel + 1]
+
+        # Line-level events: one hash lookup per event
+        line_event = known_parcel & (event_item >= 0)
+        positions = np.full(len(events), -1)
+        positions[line_event] = line_index.get_indexer(event_parcel[line_event] * width + event_item[line_event] + 1)
+        matched = positions >= 0
+        event_quantity = np.where(np.isnan(quantity), imported[positions], quantity)[matched]
+        requested = np.bincount(positions[matched], weights=event_quantity, minlength=len(line_index))
+
+        # Parcel-level events return every line of the parcel in full
+        returned_parcels = np.zeros(len(parcel_keys) + 1, dtype=bool)
+        returned_parcels[event_parcel[known_parcel & (event_item < 0)] + 1] = True
+        returned_parcels[0] = False
+        requested += np.where(returned_parcels[line_parcel + 1], imported, 0)
+
+        returned = np.minimum(requested, imported)
+        over = requested > imported
+        has_returns = returned > 0
+
+        returned_table = pd.DataFrame({
+            "Parcel ID": _labels(line_parcel[has_returns], parcel_keys),
+            "Line Item ID": _labels(line_item[has_returns], item_keys),
+            "Line Item Quantity Returned": returned[has_returns],
+        })
+
+        unmatched = events.assign(Issue=np.where(known_parcel, "Unmatched line", "Unmatched parcel"))
+        over_returned = pd.DataFrame({
+            "Issue": "Over-return (capped at imported quantity)",
+            "Parcel ID": _labels(line_parcel[over], parcel_keys),
+            "Line Item ID": _labels(line_item[over], item_keys),
+            "Quantity Imported": imported[over],
+            "Quantity Returned": requested[over],
+        })
+        frames = [unmatched[~known_parcel | (line_event & ~matched)], over_returned]
+        exceptions = pd.concat(
+            [frame.reindex(columns=EXCEPTION_COLUMNS) for frame in frames if len(frame)]
+            or [pd.DataFrame(columns=EXCEPTION_COLUMNS)],
+            ignore_index=True,
+        )
+
+        return returned_table, exceptions
+
+    @staticmethod
+    def returned_quantities(lines: pd.DataFrame, returned: pd.DataFrame) -> np.ndarray:
+        """
+        Returned quantity for every line (0 where the feed has none), in line
+        order. A (Parcel ID, Line Item ID) repeated in the lines gets the
+        quantity on its first occurrence only, as in ReturnsFeed.match.
+        """
+        (line_parcel, returned_parcel), _ = _factorize(lines["Parcel ID"], returned["Parcel ID"])
+        (line_item, returned_item), item_keys = _factorize(lines["Line Item ID"], returned["Line Item ID"])
+
+        width = len(item_keys) + 1
+        line_keys = pd.Index(line_parcel * width + line_item + 1)
+        positions = pd.Index(returned_parcel * width + returned_item + 1).get_indexer(line_keys)
+        quantities = returned["Line Item Quantity Returned"].to_numpy(dtype=float)
+        return np.where((positions >= 0) & ~line_keys.duplicated(), quantities[positions], 0)
+
+    @staticmethod
+    def store_exceptions(exceptions: pd.DataFrame) -> None:
+        """Save unmatched and over-returned events to Excel."""
+        data_dir = Path(Config.DATA_DIR)
+        data_dir.mkdir(exist_ok=True)
+
+        exceptions.to_excel(data_dir / ReturnsFeed.EXCEPTIONS_NAME, index=False, engine="openpyxl")
+
+        if len(exceptions):
+            counts = exceptions["Issue"].value_counts().to_dict()
+            print(f"⚠️ WARNING: Returns feed exceptions: {counts}")
+
+    @staticmethod
+    def returns(lines: pd.DataFrame, events: pd.DataFrame) -> pd.DataFrame:
+        """
+        Match events and store the exceptions report.
+
+        Returns:
+            DataFrame of Parcel ID, Line Item ID (normalised strings) and
+            Line Item Quantity Returned, one row per line with returns
+        """
+        returned, exceptions = ReturnsFeed.match(lines, events)
+        ReturnsFeed.store_exceptions(exceptions)
+        return returned
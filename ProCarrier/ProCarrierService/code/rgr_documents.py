@@ -0,0 +1,249 @@
+"""Per-parcel RGR refund documents.
+
+Every returned HV parcel gets its own filing document, rendered from a
+template that each worker process loads once and caches. Parcels are handed
+to a process pool in chunks, and rendered documents are streamed into
+RGR_DOCUMENTS.zip as the chunks complete. RGR_INDEX.csv lists one row per
+document. Its totals reconcile with HV_EU_REFUNDS.xlsx / HV_IE_REFUNDS.xlsx.
+"""
+
+import itertools
+import os
+import re
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from string import Template
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from config import Config
+from hv_processes import HighValueProcessor
+
+DEFAULT_TEMPLATE = """RGR REFUND REQUEST - RETURNED GOODS
+====================================
+
+Declared in:      $declared_in
+MRN:              $mrn
+Parcel ID:        $parcel_id
+Entry Date:       $entry_date
+Consignee:        $consignee_name ($consignee_country)
+Tracking number:  $tracking_number
+Return period:    $return_period
+
+Returned lines (line id | HS code | description | qty x unit price | value | duty | VAT):
+$lines
+
+Total returned value:  $returned_value
+Total duty returned:   $duty_returned
+VAT rate:              $vat_rate
+Total VAT refund:      $vat_refund
+Total refund:          $total_refund
+"""
+
+# One line per returned item (str.format fields are the line record columns)
+LINE_FORMAT = (
+    "  {Line Item ID} | {HS CODE} | {Line Item Name} | {Line Item Quantity Returned} x "
+    "{Line Item Unit Price:.2f} | {Returned Item Value:.2f} | {Duty Returned:.2f} | {VAT Refund:.2f}"
+).format_map
+
+# Parcels rendered per worker task
+CHUNK_SIZE = 500
+
+INDEX_COLUMNS = [
+    "Document", "Declared In", "MRN", "Parcel ID", "Consignee Country", "Lines",
+    "Total Returned Value", "Total Duty Returned", "Total VAT Refund", "Total Refund",
+]
+
+
+@lru_cache(maxsize=None)
+def _load_template(template_path: Optional[str]) -> Template:
+    """Parse the document template once per process."""
+    if template_path is None:
+        return Template(DEFAULT_TEMPLATE)
+    return Template(Path(template_path).read_text(encoding="utf-8"))
+
+
+def _records(df: pd.DataFrame) -> List[dict]:
+    """DataFrame.to_dict("records") without per-value boxing (much faster on large frames)."""
+    columns = list(df.columns)
+    return [dict(zip(columns, row)) for row in zip(*(df[c].tolist() for c in columns))]
+
+
+def _money(value: float) -> str:
+    return f"{value:.2f}"
+
+
+def _render_chunk(task: Tuple[Optional[str], str, List[dict]]) -> List[Tuple[str, bytes]]:
+    """Render one chunk of parcels; runs inside a worker process."""
+    template_path, return_period, parcels = task
+    template = _load_template(template_path)
+
+    documents = []
+    for parcel in parcels:
+        document = template.safe_substitute(
+            declared_in=parcel["Declared In"],
+            mrn=parcel["MRN"],
+            parcel_id=parcel["Parcel ID"],
+            entry_date=parcel["Entry Date"],
+            consignee_name=parcel["Consignee Name"],
+            consignee_country=parcel["Consignee Country"],
+            tracking_number=parcel["Courier Tracking #"],
+            return_period=return_period,
+            lines="\n".join(map(LINE_FORMAT, parcel["lines"])),
+            returned_value=_money(parcel["Total Returned Value"]),
+            duty_returned=_money(parcel["Total Duty Returned"]),
+            vat_rate=f"{parcel['VAT Rate']:.0%}",
+            vat_refund=_money(parcel["Total VAT Refund"]),
+            total_refund=_money(parcel["Total Refund"]),
+        )
+        documents.append((parcel["Document"], document.encode("utf-8")))
+    return documents
+
+
+class RgrDocumentGenerator:
+    """Generates one RGR filing document per returned HV parcel."""
+
+    # Raw input columns the documents show (besides the HV calculation columns)
+    DOCUMENT_COLUMNS = [
+        'Parcel ID', 'Line Item ID', 'Line Item Name', 'HS CODE', 'Line Item Quantity Returned',
+        'Line Item Unit Price', 'MRN', 'Entry Date', 'Consignee Name', 'Consignee Country',
+        'Courier Tracking #',
+    ]
+
+    ARCHIVE_NAME = "RGR_DOCUMENTS.zip"
+    INDEX_NAME = "RGR_INDEX.csv"
+
+    @staticmethod
+    def returned_lines(hv_returned: pd.DataFrame, duty_dict: Dict[str, float]) -> pd.DataFrame:
+        """
+        Per-line RGR figures for every returned HV line, using the same VAT and
+        duty rules as the HV_EU_REFUNDS / HV_IE_REFUNDS reports.
+        """
+        hv_declared_in_IE, hv_declared_in_NL = HighValueProcessor.separate_by_declaration_country(
+            hv_returned.copy()
+        )
+
+        parts = []
+        for declared_in, df in [("NL", hv_declared_in_NL), ("IE", hv_declared_in_IE)]:
+            df = HighValueProcessor.duty_paid(df, duty_dict)
+            lines = HighValueProcessor.rgr_returned_lines(df, Config.VAT_RATES[declared_in])
+            lines["Declared In"] = declared_in
+            lines["VAT Rate"] = Config.VAT_RATES[declared_in]
+
+            # Duty is only refunded on NL declarations, and never for excluded countries
+            if declared_in == "NL":
+                duty_refundable = ~lines["Consignee Country"].isin(Config.DUTY_EXCLUDED_COUNTRIES)
+                lines["Duty Returned"] = lines["Returned Duty"].where(duty_refundable, 0)
+            else:
+                lines["Duty Returned"] = 0.0
+            parts.append(lines)
+
+        lines = pd.concat(parts, ignore_index=True)
+        lines[["Duty Returned", "VAT Refund"]] = lines[["Duty Returned", "VAT Refund"]].fillna(0)
+        lines["Parcel ID"] = lines["Parcel ID"].astype(str)
+        return lines.sort_values(["Declared In", "MRN", "Parcel ID"], kind="stable")
+
+    @staticmethod
+    def document_name(declared_in: str, mrn: str, parcel_id: str, extension: str) -> str:
+        """Archive path of a parcel's document, e.g. NL/RGR_<MRN>_<Parcel ID>.txt."""
+        stem = re.sub(r"[^\w.-]", "_", f"RGR_{mrn}_{parcel_id}")
+        return f"{declared_in}/{stem}{extension}"
+
+    @staticmethod
+    def build_index(lines: pd.DataFrame, extension: str) -> pd.DataFrame:
+        """One row per parcel document with its refund totals."""
+        index = (
+            lines.groupby(["Declared In", "MRN", "Parcel ID"], sort=False)
+            .agg(**{
+                "Consignee Country": ("Consignee Country", "first"),
+                "Lines": ("Returned Item Value", "size"),
+                "Total Returned Value": ("Returned Item Value", "sum"),
+                "Total Duty Returned": ("Duty Returned", "sum"),
+                "Total VAT Refund": ("VAT Refund", "sum"),
+            })
+            .reset_index()
+        )
+        index["Total Refund"] = index["Total Duty Returned"] + index["Total VAT Refund"]
+        index["Document"] = [
+            RgrDocumentGenerator.document_name(declared_in, mrn, parcel_id, extension)
+            for declared_in, mrn, parcel_id in zip(index["Declared In"], index["MRN"], index["Parcel ID"])
+        ]
+        return index[INDEX_COLUMNS]
+
+    @staticmethod
+    def parcels(lines: pd.DataFrame, index: pd.DataFrame) -> List[dict]:
+        """Plain per-parcel records (header fields, totals and lines) for the workers."""
+        header_columns = ["Entry Date", "Consignee Name", "Courier Tracking #", "VAT Rate"]
+        line_columns = [
+            "Line Item ID", "HS CODE", "Line Item Name", "Line Item Quantity Returned",
+            "Line Item Unit Price", "Returned Item Value", "Duty Returned", "VAT Refund",
+        ]
+        text_columns = ["Entry Date", "Consignee Name", "Courier Tracking #", *line_columns[:4]]
+        lines = lines[["Declared In", "MRN", "Parcel ID", *header_columns, *line_columns]].copy()
+        lines[text_columns] = lines[text_columns].astype(object).where(lines[text_columns].notna(), "")
+
+        records = _records(lines)
+        grouped = itertools.groupby(records, key=lambda r: (r["Declared In"], r["MRN"], r["Parcel ID"]))
+
+        parcels = []
+        for row, (_, parcel_lines) in zip(_records(index), grouped):
+            parcel_lines = list(parcel_lines)
+            row.update({column: parcel_lines[0][column] for column in header_columns})
+            row["lines"] = parcel_lines
+            parcels.append(row)
+        return parcels
+
+    @staticmethod
+    def generate(
+            hv_returned: pd.DataFrame,
+            duty_dict: Dict[str, float],
+            return_period: str,
+            workers: Optional[int] = None,
+    ) -> pd.DataFrame:
+        """
+        Render and archive an RGR document for every returned HV parcel.
+
+        Args:
+            hv_returned: HV ledger lines with returns, including DOCUMENT_COLUMNS
+            duty_dict: max duty rate per 4-digit goods code
+            return_period: filing period shown on the documents (e.g. "Q3 2024")
+            workers: worker processes (default Config.RGR_WORKERS, then CPU count)
+
+        Returns:
+            The document index (also saved as RGR_INDEX.csv)
+        """
+        template_path = Config.RGR_TEMPLATE_PATH
+        extension = Path(template_path).suffix if template_path else ".txt"
+        workers = workers or Config.RGR_WORKERS or os.cpu_count() or 1
+
+        lines = RgrDocumentGenerator.returned_lines(hv_returned, duty_dict)
+        index = RgrDocumentGenerator.build_index(lines, extension)
+        parcels = RgrDocumentGenerator.parcels(lines, index)
+        tasks = [
+            (template_path, return_period, parcels[start:start + CHUNK_SIZE])
+            for start in range(0, len(parcels), CHUNK_SIZE)
+        ]
+
+        data_dir = Path(Config.DATA_DIR)
+        data_dir.mkdir(exist_ok=True)
+
+        with zipfile.ZipFile(data_dir / RgrDocumentGenerator.ARCHIVE_NAME, "w", zipfile.ZIP_DEFLATED) as archive:
+            if workers == 1 or len(tasks) <= 1:
+                RgrDocumentGenerator.write_chunks(archive, map(_render_chunk, tasks))
+            else:
+                with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+                    RgrDocumentGenerator.write_chunks(archive, executor.map(_render_chunk, tasks))
+
+        index.to_csv(data_dir / RgrDocumentGenerator.INDEX_NAME, index=False)
+        print(f"📄 {len(index)} RGR documents written to {data_dir / RgrDocumentGenerator.ARCHIVE_NAME}")
+        return index
+
+    @staticmethod
+    def write_chunks(archive: zipfile.ZipFile, chunks) -> None:
+        """Stream rendered documents into the archive as each chunk completes."""
+        for documents in chunks:
+            for name, content in documents:
+                archive.writestr(name, content)
@@ -0,0 +1,320 @@
+"""What-if scenario engine for commissions, the LV/HV threshold and rates.
+
+The consignment ledger is loaded once and reduced to one record per MRN
+(consignment value, destination, declaration country, import duty and the
+returned value / returned duty of its lines). Records are sorted by
+consignment value inside each (destination, declaration country) group and
+prefix sums are taken, so the LV side of any threshold T is the prefix up to
+searchsorted(values, T) and the HV side is the remainder. A whole grid of
+scenarios is then evaluated with a handful of array operations per group,
+producing the generate_summary_table figures for every scenario.
+
+Assumes one destination per MRN (the first line's country is used, as in the
+per-country VAT calculations). HV commissions follow generate_summary_table:
+NL-declared refunds at the NL commission rate, IE refunds at the IE rate.
+
+Large grids can be split over Config.SCENARIO_WORKERS processes. The parent
+builds the sorted values and prefix sums once and places them in shared
+memory (shared_ledger.py); each worker attaches to them and only runs
+searchsorted on the views, so its memory does not grow with the data.
+"""
+
+import itertools
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config import Config
+from data_layer import DataLayer
+from duty_processor import DutyProcessor
+from read_planner import ReadPlanner
+from shared_ledger import SharedLedger
+
+# Per-MRN quantities accumulated in the prefix sums
+METRICS = [
+    "Consignment Value",   # V: consignment value
+    "Duty",                # D: import duty of all lines
+    "Returned Value",      # R: returned value of all lines
+    "Returned Value With Duty Rate",  # Rd: returned value of lines with a duty rate
+    "Returned Duty",       # RD: duty on returned value
+    "Invalid IE",          # IE-declared consignments shipped outside IE
+]
+
+
+class ScenarioEngine:
+    """Evaluates grids of what-if scenarios against one loaded ledger."""
+
+    def __init__(self, consignments: Optional[pd.DataFrame] = None, groups: Optional[List[Dict[str, Any]]] = None):
+        """
+        Args:
+            consignments: one row per MRN with "Country", "Declared In" and
+                the METRICS columns (see build_consignments)
+            groups: instead of consignments, groups already built by
+                group_views (workers attached to a shared prefix table)
+        """
+        self.countries = sorted(Config.VAT_RATES)
+        if groups is None:
+            table, bounds = ScenarioEngine.prefix_table(consignments)
+            groups = ScenarioEngine.group_views({column: table[column].to_numpy() for column in table}, bounds)
+        self.groups = groups
+
+    @staticmethod
+    def prefix_table(consignments: pd.DataFrame) -> Tuple[pd.DataFrame, List[Dict[str, Any]]]:
+        """
+        Sorted consignment values and METRICS prefix sums of every
+        (destination, declaration country) group, stacked into one frame.
+
+        "Value" holds the sorted consignment values. Each group's rows start
+        with a zero row (value -inf), so its prefix sums are its rows and its
+        sorted values the rows after the first.
+
+        Returns:
+            The table and each group's country, declaration country and row range
+        """
+        values, prefixes, bounds, start = [], [], [], 0
+        for (country, declared_in), group in consignments.groupby(
+                ["Country", "Declared In"], dropna=False, sort=True
+        ):
+            group = group.sort_values("Consignment Value", kind="stable")
+            prefix = np.zeros((len(group) + 1, len(METRICS)))
+            prefix[1:] = np.cumsum(group[METRICS].to_numpy(dtype=float), axis=0)
+            values.append(np.concatenate([[-np.inf], group["Consignment Value"].to_numpy(dtype=float)]))
+            prefixes.append(prefix)
+            bounds.append({
+                "country": None if pd.isna(country) else country,
+                "declared_in": declared_in,
+                "start": start,
+                "stop": start + len(prefix),
+            })
+            start += len(prefix)
+
+        table = pd.DataFrame(
+            np.concatenate(prefixes) if prefixes else np.zeros((0, len(METRICS))), columns=METRICS
+        )
+        table.insert(0, "Value", np.concatenate(values) if values else np.zeros(0))
+        return table, bounds
+
+    @staticmethod
+    def group_views(columns, bounds: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Each group's sorted values and per-metric prefix sums as views of the
+        prefix table columns (a dict of arrays or a SharedLedger).
+        """
+        return [
+            {
+                "country": bound["country"],
+                "declared_in": bound["declared_in"],
+                "values": columns["Value"][bound["start"] + 1:bound["stop"]],
+                "prefix": [columns[metric][bound["start"]:bound["stop"]] for metric in METRICS],
+            }
+            for bound in bounds
+        ]
+
+    # ==================== LOADING ====================
+
+    @staticmethod
+    def build_consignments(df: pd.DataFrame, duty_dict: Dict[str, float]) -> pd.DataFrame:
+        """Reduce cleaned, calculated lines to one record per MRN."""
+        df = df[df["MRN"].notna() & df["Consignment Value"].notna()].copy()
+
+        duty_rate = DutyProcessor.duty_rates(df["HS CODE"], duty_dict)
+        returned = df["Line Item Quantity Returned"].where(df["Line Item Quantity Returned"] > 0, 0)
+        returned_value = (returned * df["Line Item Unit Price"]).fillna(0)
+
+        df["Duty"] = (df["Line Item Total Value"] * duty_rate).fillna(0)
+        df["Returned Value"] = returned_value
+        df["Returned Value With Duty Rate"] = returned_value.where(duty_rate.notna(), 0)
+        df["Returned Duty"] = (returned_value * duty_rate).fillna(0)
+        df["Declared In"] = np.where(df["MRN"].astype(str).str[2:4].str.upper() == "IE", "IE", "NL")
+
+        consignments = df.groupby("MRN", sort=False).agg(**{
+            "Country": ("Consignee Country", "first"),
+            "Declared In": ("Declared In", "first"),
+            "Consignment Value": ("Consignment Value", "first"),
+            "Duty": ("Duty", "sum"),
+            "Returned Value": ("Returned Value", "sum"),
+            "Returned Value With Duty Rate": ("Returned Value With Duty Rate", "sum"),
+            "Returned Duty": ("Returned Duty", "sum"),
+        })
+        consignments["Invalid IE"] = (
+            (consignments["Declared In"] == "IE") & (consignments["Country"] != "IE")
+        ).astype(float)
+        return consignments.reset_index()
+
+    @staticmethod
+    def load_consignments(file_name: str, data_type: str, duty_dict: Dict[str, float]) -> pd.DataFrame:
+        """Load and clean the consignment file once and reduce it to one record per MRN."""
+        df = DataLayer.read_input(file_name, data_type, ReadPlanner.required_columns())
+        df = DataLayer.add_calculated_fields(DataLayer.clean_data(df))
+        return ScenarioEngine.build_consignments(df, duty_dict)
+
+    @staticmethod
+    def from_file(file_name: str, data_type: str, duty_dict: Dict[str, float]) -> "ScenarioEngine":
+        """Load and clean the consignment file once."""
+        return ScenarioEngine(ScenarioEngine.load_consignments(file_name, data_type, duty_dict))
+
+    # ==================== SCENARIOS ====================
+
+    @staticmethod
+    def grid(
+            thresholds: Optional[Iterable[float]] = None,
+            commission_rates: Optional[Dict[str, Iterable[float]]] = None,
+            vat_rates: Optional[Dict[str, Iterable[float]]] = None,
+            duty_scales: Optional[Iterable[float]] = None,
+    ) -> pd.DataFrame:
+        """
+        Cartesian product of scenario parameters. Anything not given stays at
+        its Config value.
+
+        Example:
+            ScenarioEngine.grid(thresholds=[135, 150], commission_rates={"IE": [0.25, 0.3]})
+        """
+        if thresholds is None:
+            thresholds = [Config.CONSIGNMENT_THRESHOLD]
+        if duty_scales is None:
+            duty_scales = [1.0]
+
+        axes = {"Threshold": list(thresholds)}
+        for country, rates in (commission_rates or {}).items():
+            axes[f"Commission {country}"] = list(rates)
+        for country, rates in (vat_rates or {}).items():
+            axes[f"VAT {country}"] = list(rates)
+        axes["Duty Scale"] = list(duty_scales)
+
+        return pd.DataFrame(list(itertools.product(*axes.values())), columns=list(axes))
+
+    def _rates(self, scenarios: pd.DataFrame, prefix: str, defaults: Dict[str, float]) -> Dict[str, np.ndarray]:
+        """Per-country rate arrays over scenarios, defaulting to Config."""
+        n = len(scenarios)
+        rates = {}
+        for country in self.countries:
+            column = f"{prefix} {country}"
+            if column in scenarios:
+                rates[country] = scenarios[column].to_numpy(dtype=float)
+            else:
+                rates[country] = np.full(n, defaults[country])
+        return rates
+
+    def evaluate(self, scenarios: pd.DataFrame) -> pd.DataFrame:
+        """
+        Evaluate every scenario row and return it with its summary figures.
+
+        Scenario columns: "Threshold", "Duty Scale", "Commission <CC>" and
+        "VAT <CC>" (any missing column falls back to Config).
+        """
+        n = len(scenarios)
+        thresholds = (
+            scenarios["Threshold"].to_numpy(dtype=float) if "Threshold" in scenarios
+            else np.full(n, float(Config.CONSIGNMENT_THRESHOLD))
+        )
+        duty_scale = (
+            scenarios["Duty Scale"].to_numpy(dtype=float) if "Duty Scale" in scenarios
+            else np.ones(n)
+        )
+        vat = self._rates(scenarios, "VAT", Config.VAT_RATES)
+        commission = self._rates(scenarios, "Commission", Config.COMMISSION_RATES)
+        zeros = np.zeros(n)
+
+        totals = {name: zeros.copy() for name in [
+            "ioss_sales", "ioss_returns", "lv_fee", "oss_import", "oss_return",
+            "broker_paid", "to_return", "nl_vat", "nl_duty", "ie_vat", "invalid_ie",
+        ]}
+
+        for group in self.groups:
+            country, declared_in, prefix = group["country"], group["declared_in"], group["prefix"]
+            split = np.searchsorted(group["values"], thresholds, side="right")
+            lv = np.array([metric[split] for metric in prefix])
+            hv = np.array([metric[-1:] for metric in prefix]) - lv
+            V, D, R, Rd, RD, invalid_ie = range(len(METRICS))
+
+            has_vat = country in vat
+            vat_c = vat[country] if has_vat else zeros
+            commission_c = commission[country] if country in commission else zeros
+
+            # ==================== LV (IOSS) ====================
+            totals["ioss_sales"] += vat_c * lv[V]
+            totals["ioss_returns"] += vat_c * lv[R]
+            totals["lv_fee"] += commission_c * vat_c * lv[R]
+
+            # ==================== HV ====================
+            if declared_in == "IE":
+                totals["invalid_ie"] += hv[invalid_ie]
+                if has_vat:
+                    totals["ie_vat"] += vat["IE"] * (hv[Rd] + duty_scale * hv[RD])
+                continue
+
+            broker = (hv[V] + duty_scale * hv[D]) * vat["NL"]
+            totals["broker_paid"] += broker
+            if country != "NL":
+                totals["to_return"] += broker
+                totals["oss_import"] += vat_c * hv[V]
+                totals["oss_return"] += vat_c * hv[R]
+            if has_vat:
+                totals["nl_vat"] += vat["NL"] * (hv[Rd] + duty_scale * hv[RD])
+            if country is not None and country not in Config.DUTY_EXCLUDED_COUNTRIES:
+                totals["nl_duty"] += duty_scale * hv[RD]
+
+        net_ioss = totals["ioss_sales"] - totals["ioss_returns"]
+        net_oss = totals["oss_import"] - totals["oss_return"]
+        hv_vat_refunds = totals["ie_vat"] + totals["nl_vat"]
+        total_refunds = totals["nl_duty"] + hv_vat_refunds
+        dr_fee = (
+            (totals["nl_duty"] + totals["nl_vat"]) * commission["NL"]
+            + totals["ie_vat"] * commission["IE"]
+            + totals["lv_fee"]
+        )
+
+        figures = pd.DataFrame({
+            "TOTAL IOSS VAT": totals["ioss_sales"],
+            "RETURNED IOSS VAT": totals["ioss_returns"],
+            "NET IOSS VAT": net_ioss,
+            "AMOUNT BROKER PAID": totals["broker_paid"],
+            "AMOUNT THAT CAN BE CLAIMED BACK": totals["to_return"],
+            "OSS import VAT paid": totals["oss_import"],
+            "OSS return VAT": totals["oss_return"],
+            "NET OSS VAT": net_oss,
+            "Total VAT Refund From HV": hv_vat_refunds,
+            "Total Duty Returned": totals["nl_duty"],
+            "Total Refunds": total_refunds,
+            "Duty Refunds Commission": dr_fee,
+            "Amount to invoice Pro Carrier:": net_ioss + net_oss + dr_fee,
+            "Amount to be paid to Pro Carrier:": total_refunds + totals["to_return"],
+            "Invalid IE Destinations": totals["invalid_ie"].astype(int),
+        }, index=scenarios.index)
+
+        return pd.concat([scenarios, figures], axis=1)
+
+
+def _evaluate_shared(ledger: SharedLedger, task) -> pd.DataFrame:
+    """Worker: evaluate a slice of the grid against the shared prefix table."""
+    bounds, scenarios = task
+    return ScenarioEngine(groups=ScenarioEngine.group_views(ledger, bounds)).evaluate(scenarios)
+
+
+def run_scenarios(
+        file_name: str,
+        data_type: str,
+        duty_dict: Dict[str, float],
+        scenarios: pd.DataFrame,
+        output_file: Optional[str] = None,
+        workers: Optional[int] = None,
+) -> pd.DataFrame:
+    """
+    Load the ledger once, evaluate the scenario grid and optionally save it.
+    With workers > 1 (default Config.SCENARIO_WORKERS), the grid is split over
+    worker processes that share the prefix table built here.
+    """
+    consignments = ScenarioEngine.load_consignments(file_name, data_type, duty_dict)
+    workers = min(workers or Config.SCENARIO_WORKERS, len(scenarios))
+    if workers > 1:
+        table, bounds = ScenarioEngine.prefix_table(consignments)
+        with SharedLedger.create(table) as ledger:
+            chunks = [scenarios.iloc[rows] for rows in np.array_split(np.arange(len(scenarios)), workers)]
+            results = pd.concat(ledger.map(_evaluate_shared, zip(itertools.repeat(bounds), chunks), workers))
+    else:
+        results = ScenarioEngine(consignments).evaluate(scenarios)
+    if output_file:
+        results.to_excel(output_file, index=False, engine="openpyxl")
+    return results
+
@@ -0,0 +1,152 @@
+"""Shared-memory ledger for multi-process workers.
+
+SharedLedger copies the columns of a DataLayer frame into one
+multiprocessing.shared_memory block. The frame can be cleaned lines with
+calculated fields, or a table derived from them such as
+ScenarioEngine.prefix_table. Numeric columns are stored as float64 /
+int64 / bool arrays. Text columns (MRN, Consignee Country, HS CODE, ...) are
+factorized to int32 codes (-1 for missing), and their labels are kept
+alongside. Workers receive only the picklable handle and attach zero-copy.
+Their arrays are read-only views of the same pages, so fanning out to N
+workers does not hold N copies of the ledger. Only the labels of the text
+columns travel with the handle.
+
+The process that creates a ledger owns the block. Use it as a context
+manager, or call unlink() once the workers are done.
+
+Example:
+    with SharedLedger.create(df, ["Consignee Country", "Line Item Total Value"]) as ledger:
+        totals = ledger.map(country_total, countries, workers=4)
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Byte alignment of every column in the block
+ALIGNMENT = 64
+
+# Ledgers attached by this (worker) process, by block name
+_attached: Dict[str, "SharedLedger"] = {}
+
+
+def _run_task(func_and_handle, task):
+    func, handle = func_and_handle
+    if handle["name"] not in _attached:
+        _attached[handle["name"]] = SharedLedger.attach(handle)
+    return func(_attached[handle["name"]], task)
+
+
+class SharedLedger:
+    """Columns of one frame in a shared memory block."""
+
+    def __init__(self, shm: shared_memory.SharedMemory, handle: Dict[str, Any], owner: bool):
+        self.shm = shm
+        self.handle = handle
+        self.owner = owner
+        self.arrays = {
+            column: np.ndarray((handle["length"],), dtype=np.dtype(dtype), buffer=shm.buf, offset=offset)
+            for column, (dtype, offset) in handle["layout"].items()
+        }
+        if not owner:
+            for array in self.arrays.values():
+                array.flags.writeable = False
+
+    @staticmethod
+    def create(df: pd.DataFrame, columns: Optional[Iterable[str]] = None) -> "SharedLedger":
+        """Copy the columns (default: all) of a frame into a new shared memory block."""
+        columns = list(df.columns if columns is None else columns)
+        arrays, labels = {}, {}
+        for column in columns:
+            series = df[column]
+            if pd.api.types.is_bool_dtype(series) and not series.isna().any():
+                arrays[column] = series.to_numpy(dtype=bool)
+            elif pd.api.types.is_integer_dtype(series) and not series.isna().any():
+                arrays[column] = series.to_numpy(dtype=np.int64)
+            elif pd.api.types.is_numeric_dtype(series):
+                arrays[column] = series.to_numpy(dtype=np.float64, na_value=np.nan)
+            else:
+                codes, uniques = pd.factorize(series)
+                arrays[column] = codes.astype(np.int32)
+                labels[column] = list(uniques)
+
+        layout, offset = {}, 0
+        for column, array in arrays.items():
+            layout[column] = (array.dtype.str, offset)
+            offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+
+        shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        handle = {"name": shm.name, "length": len(df), "layout": layout, "labels": labels}
+        ledger = SharedLedger(shm, handle, owner=True)
+        for column, array in arrays.items():
+            ledger.arrays[column][:] = array
+        return ledger
+
+    @staticmethod
+    def attach(handle: Dict[str, Any]) -> "SharedLedger":
+        """Read-only, zero-copy view of a ledger created by another process."""
+        return SharedLedger(shared_memory.SharedMemory(name=handle["name"]), handle, owner=False)
+
+    # ==================== READING ====================
+
+    def __len__(self) -> int:
+        return self.handle["length"]
+
+    def __getitem__(self, column: str) -> np.ndarray:
+        """The column's array (codes for text columns)."""
+        return self.arrays[column]
+
+    def labels(self, column: str) -> List[Any]:
+        """Labels of a text column's codes."""
+        return self.handle["labels"][column]
+
+    def frame(self, columns: Optional[Iterable[str]] = None) -> pd.DataFrame:
+        """
+        The columns as a DataFrame: numeric columns are views of the block,
+        text columns are decoded from their codes.
+        """
+        data = {}
+        for column in (self.arrays if columns is None else columns):
+            if column in self.handle["labels"]:
+                labels = np.append(np.asarray(self.labels(column), dtype=object), np.nan)
+                data[column] = labels[self.arrays[column]]
+            else:
+                data[column] = self.arrays[column]
+        return pd.DataFrame(data, copy=False)
+
+    # ==================== WORKERS ====================
+
+    def map(self, func: Callable[["SharedLedger", Any], Any], tasks: Iterable[Any], workers: int) -> List[Any]:
+        """
+        Run func(ledger, task) for every task on worker processes. Each worker
+        attaches to the block once; only the handle and the tasks are pickled.
+        func must be a module-level function.
+        """
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(_run_task, repeat((func, self.handle)), tasks))
+
+    # ==================== LIFETIME ====================
+
+    def close(self) -> None:
+        """Detach from the block (views handed out earlier keep it mapped)."""
+        self.arrays = {}
+        try:
+            self.shm.close()
+        except BufferError:
+            pass
+
+    def unlink(self) -> None:
+        """Close and free the block (owner only)."""
+        self.close()
+        if self.owner:
+            self.shm.unlink()
+
+    def __enter__(self) -> "SharedLedger":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.unlink()
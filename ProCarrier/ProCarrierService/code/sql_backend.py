@@ -0,0 +1,406 @@
+"""Embedded SQL (DuckDB) implementation of the ProCarrier aggregations.
+
+Every per-country sum the pandas processors compute is expressed as a query
+against a local in-process DuckDB database. CSV and Parquet inputs are read
+directly by the engine, and all joins and group-bys spill to
+Config.SQL_TEMP_DIR once Config.SQL_MEMORY_LIMIT is reached, so memory stays
+bounded regardless of the size of the quarter. No server is needed.
+
+Stages pass around `(connection, view_name)` handles instead of DataFrames;
+the aggregation functions return the same DataFrames as their pandas
+counterparts in LowValueProcessor / HighValueProcessor.
+"""
+
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import duckdb
+import pandas as pd
+
+from arrow_csv import NA_VALUES
+from config import Config
+from data_layer import DataLayer
+from duty_processor import DutyProcessor
+from lv_processes import LowValueProcessor
+from hv_processes import HighValueProcessor
+from read_planner import ReadPlanner
+from xlsx_reader import XlsxReader
+from backends import Backend
+
+Relation = Tuple[duckdb.DuckDBPyConnection, str]
+
+# Schema holding the lines chosen by select_lines
+SELECTION_SCHEMA = "selection"
+
+
+def _sql_list(values) -> str:
+    return ", ".join("'" + str(v).replace("'", "''") + "'" for v in values)
+
+
+def _not_in(column: str, values) -> str:
+    """Null-safe NOT IN, matching pandas where missing values are kept."""
+    return f'("{column}" IS NULL OR "{column}" NOT IN ({_sql_list(values)}))'
+
+
+def _first_line_per_mrn(view: str) -> str:
+    """drop_duplicates(subset=['MRN']) keeping the first line of each MRN."""
+    return f"""
+        SELECT * FROM {view}
+        WHERE line_no IN (SELECT MIN(line_no) FROM {view} GROUP BY "MRN")
+    """
+
+
+def _key(table: str, column: str) -> str:
+    """returns_feed._key: IDs as strings so 1, 1.0 and '1' match."""
+    return f"""regexp_replace(trim(CAST({table}."{column}" AS VARCHAR)), '\\.0$', '')"""
+
+
+def _query(relation: Relation, sql: str) -> pd.DataFrame:
+    con, _ = relation
+    return con.execute(sql).df()
+
+
+class SqlBackend(Backend):
+    """DuckDB execution backend; same stage interface as backends.PandasBackend."""
+
+    name = "duckdb"
+
+    # Stages share one DuckDB connection, which must not be used from several threads at once
+    thread_safe = False
+
+    # ==================== LOADING ====================
+
+    @staticmethod
+    def connect() -> duckdb.DuckDBPyConnection:
+        temp_dir = Path(Config.SQL_TEMP_DIR or tempfile.gettempdir()) / "procarrier_duckdb"
+        temp_dir.mkdir(parents=True, exist_ok=True)
+        return duckdb.connect(config={
+            "memory_limit": Config.SQL_MEMORY_LIMIT,
+            "temp_directory": str(temp_dir),
+        })
+
+    @staticmethod
+    def source(con: duckdb.DuckDBPyConnection, file_name: str, data_type: str, usecols: List[str]) -> str:
+        """Return a FROM clause reading the raw input file."""
+        path = _sql_list([file_name])
+        if data_type == "csv":
+            return (
+                f"read_csv({path}, header = true, sample_size = -1, "
+                f"nullstr = [{_sql_list(NA_VALUES)}])"
+            )
+        if data_type == "parquet":
+            return f"read_parquet({path})"
+        con.register("raw_excel", XlsxReader.read(file_name, usecols))
+        return "raw_excel"
+
+    @staticmethod
+    def read(file_name: str, data_type: str, usecols: Optional[List[str]] = None) -> Relation:
+        usecols = usecols or ReadPlanner.required_columns()
+        con = SqlBackend.connect()
+        source = SqlBackend.source(con, file_name, data_type, usecols)
+        columns = ", ".join(f'"{c}"' for c in usecols)
+        con.execute(f"CREATE VIEW raw AS SELECT {columns} FROM {source}")
+        return con, "raw"
+
+    @staticmethod
+    def clean(raw: Relation) -> Relation:
+        """Exclude IC/CH and copy Parcel ID where MRN is missing."""
+        con, view = raw
+        columns = [row[0] for row in con.execute(f"DESCRIBE {view}").fetchall()]
+        projected = "".join(f', "{c}"' for c in columns if c not in ("Parcel ID", "MRN"))
+        mrn_missing = f'"MRN" IS NULL OR CAST("MRN" AS VARCHAR) IN ({_sql_list(DataLayer.MRN_NA_VALUES)})'
+        con.execute(f"""
+            CREATE TABLE lines AS
+            SELECT
+                "Parcel ID",
+                CASE WHEN {mrn_missing} THEN CAST("Parcel ID" AS VARCHAR)
+                     ELSE CAST("MRN" AS VARCHAR) END AS "MRN"{projected}
+            FROM {view}
+            WHERE {_not_in("Consignee Country", DataLayer.EXCLUDED_COUNTRIES)}
+        """)
+        return con, "lines"
+
+    @staticmethod
+    def line_keys(lines: Relation, columns: List[str]) -> pd.DataFrame:
+        _, view = lines
+        columns = ", ".join(f'"{c}"' for c in columns)
+        return _query(lines, f"SELECT {columns} FROM {view} ORDER BY rowid")
+
+    @staticmethod
+    def to_pandas(relation: Relation) -> pd.DataFrame:
+        _, view = relation
+        return _query(relation, f"SELECT * EXCLUDE (line_no) FROM {view} ORDER BY line_no")
+
+    @staticmethod
+    def drop_lines(lines: Relation, mask) -> Relation:
+        con, view = lines
+        rowids = con.execute(f"SELECT rowid FROM {view} ORDER BY rowid").fetchnumpy()["rowid"]
+        con.register("dropped_rows", pd.DataFrame({"rowid": rowids[mask]}))
+        con.execute(f"DELETE FROM {view} WHERE rowid IN (SELECT rowid FROM dropped_rows)")
+        return lines
+
+    @staticmethod
+    def select_lines(lines: Relation, mask) -> Relation:
+        """
+        Copy the selected lines into the selection schema and make it the
+        default, so the ledger and aggregation views are rebuilt over them
+        while the input lines stay intact for later selections. The previous
+        selection's schema is dropped first.
+        """
+        SqlBackend.release_lines(lines)
+        con, view = lines
+        rowids = con.execute(f"SELECT rowid FROM main.{view} ORDER BY rowid").fetchnumpy()["rowid"]
+        con.register("selected_rows", pd.DataFrame({"rowid": rowids[mask]}))
+        con.execute(f"CREATE SCHEMA {SELECTION_SCHEMA}")
+        con.execute(f"""
+            CREATE TABLE {SELECTION_SCHEMA}.{view} AS
+            SELECT * FROM main.{view} WHERE rowid IN (SELECT rowid FROM selected_rows) ORDER BY rowid
+        """)
+        con.execute(f"USE {SELECTION_SCHEMA}")
+        return con, view
+
+    @staticmethod
+    def release_lines(lines: Relation) -> None:
+        """Drop the selection schema (and the views built in it) and go back to the main schema."""
+        con, _ = lines
+        con.execute("USE main")
+        con.execute(f"DROP SCHEMA IF EXISTS {SELECTION_SCHEMA} CASCADE")
+
+    @staticmethod
+    def apply_returns(lines: Relation, returned: pd.DataFrame) -> Relation:
+        """
+        Replace returned quantities in the lines table with those from the
+        returns feed; a repeated (Parcel ID, Line Item ID) gets them on its first line only.
+        """
+        con, view = lines
+        con.register("returned_df", returned)
+        con.execute('CREATE TABLE returned AS SELECT * FROM returned_df')
+        con.execute(f'ALTER TABLE {view} ALTER "Line Item Quantity Returned" TYPE DOUBLE')
+        con.execute(f'UPDATE {view} SET "Line Item Quantity Returned" = 0')
+        con.execute(f"""
+            UPDATE {view} SET "Line Item Quantity Returned" = r."Line Item Quantity Returned"
+            FROM returned r
+            WHERE r."Parcel ID" = {_key(view, "Parcel ID")} AND r."Line Item ID" = {_key(view, "Line Item ID")}
+              AND {view}.rowid IN (
+                  SELECT MIN(rowid) FROM {view}
+                  GROUP BY {_key(view, "Parcel ID")}, {_key(view, "Line Item ID")}
+              )
+        """)
+        return lines
+
+    @staticmethod
+    def ledger(lines: Relation) -> Tuple[Relation, Relation]:
+        con, _ = lines
+        con.execute('CREATE TABLE vat_rates ("Consignee Country" VARCHAR, "VAT Rate" DOUBLE)')
+        con.executemany("INSERT INTO vat_rates VALUES (?, ?)", list(Config.VAT_RATES.items()))
+
+        # Calculated fields: line total, consignment value per MRN, VAT rate
+        con.execute("""
+            CREATE VIEW ledger AS
+            WITH consignments AS (
+                SELECT "MRN",
+                       SUM("Line Item Quantity Imported" * "Line Item Unit Price") AS "Consignment Value"
+                FROM lines WHERE "MRN" IS NOT NULL GROUP BY "MRN"
+            )
+            SELECT l.rowid AS line_no, l.*,
+                   l."Line Item Quantity Imported" * l."Line Item Unit Price" AS "Line Item Total Value",
+                   c."Consignment Value",
+                   r."VAT Rate"
+            FROM lines l
+            LEFT JOIN consignments c ON l."MRN" = c."MRN"
+            LEFT JOIN vat_rates r ON l."Consignee Country" = r."Consignee Country"
+        """)
+
+        missing = con.execute(
+            'SELECT DISTINCT "Consignee Country" FROM ledger WHERE "VAT Rate" IS NULL'
+        ).fetchall()
+        if missing:
+            print(f"⚠️ WARNING: Missing VAT rates for countries: {[row[0] for row in missing]}")
+
+        threshold = Config.CONSIGNMENT_THRESHOLD
+        con.execute(f'CREATE VIEW low_value AS SELECT * FROM ledger WHERE "Consignment Value" <= {threshold}')
+        con.execute(f'CREATE VIEW high_value AS SELECT * FROM ledger WHERE "Consignment Value" > {threshold}')
+        return (con, "low_value"), (con, "high_value")
+
+    # ==================== AGGREGATIONS ====================
+
+    @staticmethod
+    def calculate_vat_per_country(relation: Relation) -> pd.DataFrame:
+        """Total VAT to pay per country (one line per MRN)."""
+        return _query(relation, f"""
+            SELECT "Consignee Country" AS "Country", "VAT Rate",
+                   SUM("Consignment Value") AS "Total Consignment Value",
+                   SUM("Consignment Value" * "VAT Rate") AS "Total VAT to Pay"
+            FROM ({_first_line_per_mrn(relation[1])})
+            WHERE "Consignee Country" IS NOT NULL AND "VAT Rate" IS NOT NULL
+            GROUP BY 1, 2 ORDER BY 1, 2
+        """).fillna(0)
+
+    @staticmethod
+    def calculate_return_vat_per_country(relation: Relation) -> pd.DataFrame:
+        """VAT refunds for returned items per country."""
+        return _query(relation, f"""
+            SELECT "Consignee Country" AS "Country", "VAT Rate",
+                   SUM("Line Item Quantity Returned" * "Line Item Unit Price") AS "Total Returned Value",
+                   SUM("Line Item Quantity Returned" * "Line Item Unit Price" * "VAT Rate") AS "Total VAT Refund"
+            FROM {relation[1]}
+            WHERE "Line Item Quantity Returned" > 0
+              AND "Consignee Country" IS NOT NULL AND "VAT Rate" IS NOT NULL
+            GROUP BY 1, 2 ORDER BY 1, 2
+        """).fillna(0)
+
+    @staticmethod
+    def calculate_rgr_vat_return(relation: Relation, vat_rate: float) -> pd.DataFrame:
+        """RGR VAT refunds per country, with returned duty included in the VAT base."""
+        return _query(relation, f"""
+            SELECT "Consignee Country" AS "Country", "VAT Rate",
+                   SUM(returned_value) AS "Total Returned Value",
+                   SUM((returned_value + returned_value * "Duty Rate") * {vat_rate}) AS "Total VAT Refund"
+            FROM (
+                SELECT *, "Line Item Quantity Returned" * "Line Item Unit Price" AS returned_value
+                FROM {relation[1]}
+                WHERE "Line Item Quantity Returned" > 0
+            )
+            WHERE "Consignee Country" IS NOT NULL AND "VAT Rate" IS NOT NULL
+            GROUP BY 1, 2 ORDER BY 1, 2
+        """).fillna(0)
+
+    @staticmethod
+    def calculate_duty_for_returned_items(relation: Relation) -> pd.DataFrame:
+        """Duty refunds for returned items per country (duty-excluded countries skipped)."""
+        return _query(relation, f"""
+            SELECT "Consignee Country" AS "Country",
+                   SUM(returned_value) AS "Total Returned Value",
+                   SUM(returned_value * "Duty Rate") AS "Total Duty Returned"
+            FROM (
+                SELECT *, "Line Item Quantity Returned" * "Line Item Unit Price" AS returned_value
+                FROM {relation[1]}
+                WHERE "Line Item Quantity Returned" > 0
+                  AND {_not_in("Consignee Country", Config.DUTY_EXCLUDED_COUNTRIES)}
+            )
+            WHERE "Consignee Country" IS NOT NULL
+            GROUP BY 1 ORDER BY 1
+        """).fillna(0)
+
+    @staticmethod
+    def calculate_broker_vat(relation: Relation, exclude_nl_destination: bool) -> float:
+        """(consignment value + consignment duty) × NL VAT, summed over MRNs."""
+        destination_filter = (
+            "WHERE \"Consignee Country\" IS DISTINCT FROM 'NL'" if exclude_nl_destination else ""
+        )
+        view = relation[1]
+        result = _query(relation, f"""
+            WITH duty AS (
+                SELECT "MRN", COALESCE(SUM("Duty"), 0) AS "Total Consignment Duty"
+                FROM {view} WHERE "MRN" IS NOT NULL GROUP BY "MRN"
+            )
+            SELECT COALESCE(SUM(("Consignment Value" + d."Total Consignment Duty") * {Config.VAT_RATES["NL"]}), 0)
+            FROM ({_first_line_per_mrn(view)}) f
+            LEFT JOIN duty d ON f."MRN" = d."MRN"
+            {destination_filter}
+        """)
+        return float(result.iloc[0, 0])
+
+    # ==================== LOW VALUE ====================
+
+    @staticmethod
+    def lv_ioss(low_value: Relation):
+        vat_per_country = SqlBackend.calculate_vat_per_country(low_value)
+        return_vat_per_country = SqlBackend.calculate_return_vat_per_country(low_value)
+
+        combined_vat_per_country = LowValueProcessor.create_combined_vat_per_country(
+            vat_per_country, return_vat_per_country
+        )
+        LowValueProcessor.store_lv_data(combined_vat_per_country)
+
+        dr_lv_fee = LowValueProcessor.calculate_fee_lv(combined_vat_per_country)
+        import_ioss = combined_vat_per_country["Total VAT to Pay"].sum()
+        return_ioss = combined_vat_per_country["Total VAT Refund"].sum()
+
+        return dr_lv_fee, import_ioss, return_ioss
+
+    # ==================== HIGH VALUE ====================
+
+    @staticmethod
+    def duty_paid(relation: Relation, duty_dict: Dict[str, float]) -> Relation:
+        con, view = relation
+        con.execute('CREATE OR REPLACE TABLE duty_rates ("Goods Code" VARCHAR, "Duty Rate" DOUBLE)')
+        if duty_dict:
+            con.executemany("INSERT INTO duty_rates VALUES (?, ?)", list(duty_dict.items()))
+        # tariff_lookup.normalize_codes: digits only, without the ".0" of float codes
+        goods_code = """regexp_replace(regexp_replace(CAST(v."HS CODE" AS VARCHAR), '\\.0$', ''), '\\D', '', 'g')"""
+        con.execute(f"""
+            CREATE OR REPLACE VIEW {view}_duty AS
+            SELECT v.*, d."Duty Rate",
+                   v."Line Item Quantity Imported" * v."Line Item Unit Price" AS "Item Value",
+                   v."Line Item Quantity Imported" * v."Line Item Unit Price" * d."Duty Rate" AS "Duty"
+            FROM {view} v
+            LEFT JOIN duty_rates d ON substr({goods_code}, 1, {DutyProcessor.GOODS_CODE_LENGTH}) = d."Goods Code"
+        """)
+        return con, f"{view}_duty"
+
+    @staticmethod
+    def split_declaration(high_value: Relation) -> Tuple[Relation, Relation]:
+        con, view = high_value
+        decl_country = 'upper(substr("MRN", 3, 2))'
+        con.execute(f"CREATE OR REPLACE VIEW hv_ie AS SELECT * FROM {view} WHERE {decl_country} = 'IE'")
+        con.execute(f"CREATE OR REPLACE VIEW hv_nl AS SELECT * FROM {view} WHERE {decl_country} IS DISTINCT FROM 'IE'")
+        return (con, "hv_ie"), (con, "hv_nl")
+
+    # ==================== HV DECLARED IN NL ==============================
+
+    @staticmethod
+    def hv_nl_oss(hv_declared_in_NL: Relation) -> pd.DataFrame:
+        con, view = hv_declared_in_NL
+        con.execute(f"""CREATE OR REPLACE VIEW hv_oss AS SELECT * FROM {view} WHERE "Consignee Country" IS DISTINCT FROM 'NL'""")
+        oss = (con, "hv_oss")
+
+        combined_vat_per_country = HighValueProcessor.create_combined_oss_vat_per_country(
+            SqlBackend.calculate_vat_per_country(oss),
+            SqlBackend.calculate_return_vat_per_country(oss),
+        )
+        HighValueProcessor.store_oss_data(combined_vat_per_country)
+        return combined_vat_per_country
+
+    @staticmethod
+    def hv_nl_rgr(hv_declared_in_NL: Relation, duty_dict: Dict[str, float]):
+        relation = SqlBackend.duty_paid(hv_declared_in_NL, duty_dict)
+        combined_refunds = HighValueProcessor.duty_vat_hv_merge(
+            SqlBackend.calculate_rgr_vat_return(relation, Config.VAT_RATES["NL"]),
+            SqlBackend.calculate_duty_for_returned_items(relation),
+        )
+        HighValueProcessor.store_nl_refunds_data(combined_refunds)
+
+        return (
+            SqlBackend.calculate_broker_vat(relation, exclude_nl_destination=False),
+            SqlBackend.calculate_broker_vat(relation, exclude_nl_destination=True),
+            combined_refunds,
+        )
+
+    # ==================== HV DECLARED IN IE ==============================
+
+    @staticmethod
+    def hv_ie_rgr(hv_declared_in_IE: Relation, duty_dict: Dict[str, float]) -> pd.DataFrame:
+        con, view = SqlBackend.duty_paid(hv_declared_in_IE, duty_dict)
+        # IE imports must be domestic (IE→IE only); validation reports the others
+        non_ie_dest = con.execute(
+            f"""SELECT DISTINCT "Consignee Country" FROM {view} WHERE "Consignee Country" IS DISTINCT FROM 'IE'"""
+        ).fetchall()
+        if non_ie_dest:
+            HighValueProcessor.warn_outside_ie([row[0] for row in non_ie_dest])
+        con.execute(f"""CREATE OR REPLACE VIEW {view}_domestic AS SELECT * FROM {view} WHERE "Consignee Country" = 'IE'""")
+        return_rgr = SqlBackend.calculate_rgr_vat_return((con, f"{view}_domestic"), Config.VAT_RATES["IE"])
+        return_rgr["Total Refund"] = return_rgr["Total VAT Refund"]
+        HighValueProcessor.store_ie_hv_data(return_rgr)
+        return return_rgr
+
+    @staticmethod
+    def hv_returned_lines(high_value: Relation) -> pd.DataFrame:
+        """HV ledger lines with returns, in line order."""
+        _, view = high_value
+        return _query(high_value, f"""
+            SELECT * EXCLUDE (line_no) FROM {view}
+            WHERE "Line Item Quantity Returned" > 0
+            ORDER BY line_no
+        """)
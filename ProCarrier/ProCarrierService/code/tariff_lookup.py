@@ -0,0 +1,93 @@
+"""Duty rate parsing and goods code lookup of the EU tariff.
+
+Tariff rates are keyed by "<origin>:<goods code>", with "ERGA OMNES" for the
+rate that applies to any origin. A line's rate is the one of the longest
+prefix of its goods code that the tariff has: first among the rates for the
+line's origin, then among ERGA OMNES. The EU tariff (DutyProcessor) uses a
+single prefix length of 4 digits.
+
+The Samos UK Global Tariff index (Samos/uk_tariff.py) follows the same design
+with every code length in its extract. Samos is a standalone project, so it
+keeps its own copy of these functions; change both together.
+
+The whole column is looked up at once, with one hash lookup per prefix length.
+"""
+
+import re
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+# Origin of the rates that apply to any origin
+ERGA_OMNES = "ERGA OMNES"
+
+
+def normalize_codes(codes: pd.Series) -> pd.Series:
+    """Goods codes as digit-only strings ('3303.00.1000' -> '3303001000')."""
+    if pd.api.types.is_float_dtype(codes):
+        # Numeric codes from columns with gaps are read as float
+        codes = codes.astype("Int64")
+    return codes.astype(str).str.replace(r"\D", "", regex=True)
+
+
+def parse_duty_rate(val):
+    """
+    Parse duty strings and return duty rate as float (e.g. '12.000 %' -> 0.12).
+    Returns np.nan when no percentage can be found (e.g. 'NAR', 'Cond: ...').
+    """
+    if pd.isna(val):
+        return np.nan
+    s = str(val).strip()
+    # Look for percentage like '12.000 %' or '12%' with optional spaces and commas,
+    # else take a purely numeric string as a percentage
+    m = re.search(r"([\d]+[.,]?\d*)\s*%", s) or re.search(r"^([\d]+[.,]?\d*)$", s)
+    if m:
+        return float(m.group(1).replace(",", ".")) / 100.0
+    # No quantitative value found
+    return np.nan
+
+
+def lookup_duty_rates(
+        tariff: pd.Series,
+        codes: pd.Series,
+        origins: Optional[pd.Series] = None,
+        lengths: Optional[Iterable[int]] = None,
+) -> pd.Series:
+    """
+    Duty rate of every line by the longest goods code prefix in the tariff.
+
+    Args:
+        tariff: rate per "<origin>:<goods code>" key
+        codes: goods codes of the lines
+        origins: ISO origin country per line; None looks up ERGA OMNES rates only
+        lengths: prefix lengths to try (default: every code length in the tariff)
+
+    Returns:
+        Rate per line, NaN where the tariff has no prefix of the code
+    """
+    index = codes.index
+    codes = normalize_codes(codes)
+
+    if lengths is None:
+        tariff_codes = tariff.index.to_series().str.split(":", n=1).str[1]
+        lengths = tariff_codes.str.len().unique()
+    lengths = sorted(lengths, reverse=True)
+    rates = tariff.to_numpy(dtype=float)
+
+    prefixes = [pd.Series(ERGA_OMNES + ":", index=index)]
+    if origins is not None:
+        prefixes.insert(0, origins.astype(str).str.strip().str.upper() + ":")
+
+    result = np.full(len(codes), np.nan)
+    for prefix in prefixes:
+        for length in lengths:
+            pending = np.flatnonzero(np.isnan(result))
+            if len(pending) == 0:
+                break
+            candidates = prefix.iloc[pending] + codes.iloc[pending].str[:length]
+            found = tariff.index.get_indexer(candidates)
+            hits = found >= 0
+            result[pending[hits]] = rates[found[hits]]
+
+    return pd.Series(result, index=index)
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The pipeline modules import each other by flat name (from config import Config)
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
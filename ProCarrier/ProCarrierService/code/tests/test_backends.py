@@ -0,0 +1,128 @@
+"""Differential test: every backend produces the pandas backend's figures and reports."""
+
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from config import run_context
+from duty_processor import DutyProcessor
+from main import FILING_REPORTS, process_data
+
+SAMPLES = Path(__file__).resolve().parents[2]
+
+INPUTS = [("JUL-SEP DATA.csv", "csv"), ("OCT DATA.xlsx", "xlsx")]
+
+BACKENDS = ["pandas", "polars", "duckdb"]
+
+# A few of the sample files' 4-digit HS codes; every other code has no duty rate
+TARIFF = pd.DataFrame({
+    "Goods code": ["6204000000", "6204420000", "4202000000", "6110000000", "6104000000", "7117000000", "6403000000"],
+    "Origin": ["ERGA OMNES", "ERGA OMNES", "ERGA OMNES", "ERGA OMNES", "ERGA OMNES", "CN", "ERGA OMNES"],
+    "Duty": ["12.000 %", "10.000 %", "3.700 %", "12.000 %", "NAR", "4.000 %", "8 %"],
+})
+
+
+def assert_same(expected, actual, label):
+    if isinstance(expected, pd.DataFrame):
+        pd.testing.assert_frame_equal(
+            expected.reset_index(drop=True), actual.reset_index(drop=True),
+            check_dtype=False, rtol=1e-9, obj=label,
+        )
+    elif isinstance(expected, dict):
+        assert expected.keys() == actual.keys(), label
+        for key in expected:
+            assert_same(expected[key], actual[key], f"{label}[{key}]")
+    elif isinstance(expected, (tuple, list)):
+        assert len(expected) == len(actual), label
+        for i, (e, a) in enumerate(zip(expected, actual)):
+            assert_same(e, a, f"{label}[{i}]")
+    else:
+        assert float(actual) == pytest.approx(float(expected), rel=1e-9), label
+
+
+@pytest.fixture(scope="module")
+def tariff(tmp_path_factory):
+    path = tmp_path_factory.mktemp("tariff") / "tariff.xlsx"
+    TARIFF.to_excel(path, index=False)
+    return str(path)
+
+
+@pytest.fixture(scope="module")
+def runs(tariff, tmp_path_factory):
+    """(input, backend) -> (stage results, output folder), each run once."""
+    runs = {}
+    for file_name, data_type in INPUTS:
+        for backend in BACKENDS:
+            output_dir = tmp_path_factory.mktemp(backend)
+            with run_context(DEFAULT_DUTY_EXCEL_PATH=tariff, CHECKPOINT_DIR=None, RESULT_CACHE_DIR=None):
+                results = process_data(
+                    str(SAMPLES / file_name), data_type, str(output_dir), backend=backend, outputs=FILING_REPORTS
+                )
+            runs[file_name, backend] = results, output_dir
+    return runs
+
+
+@pytest.mark.parametrize("backend", ["polars", "duckdb"])
+@pytest.mark.parametrize("file_name", [file_name for file_name, _ in INPUTS])
+def test_backend_matches_pandas(runs, file_name, backend):
+    expected, expected_dir = runs[file_name, "pandas"]
+    actual, actual_dir = runs[file_name, backend]
+
+    for stage in ["lv_ioss", "hv_nl_oss", "hv_nl_rgr", "hv_ie_rgr", "summary"]:
+        assert_same(expected[stage], actual[stage], stage)
+
+    for report in FILING_REPORTS:
+        pd.testing.assert_frame_equal(
+            pd.read_excel(expected_dir / report), pd.read_excel(actual_dir / report),
+            check_dtype=False, rtol=1e-9, obj=report,
+        )
+
+
+def test_ie_declaration_shipped_elsewhere_is_left_out(tariff, tmp_path):
+    """In report mode an IE declaration shipped outside IE is left out of the IE refunds, not fatal."""
+    lines = pd.read_csv(SAMPLES / "JUL-SEP DATA.csv", dtype=str)
+    value = pd.to_numeric(lines["Line Item Quantity Imported"]) * pd.to_numeric(lines["Line Item Unit Price"])
+    returned = pd.to_numeric(lines["Line Item Quantity Returned"]) > 0
+    declared_in_ie = lines["MRN"].str[2:4] == "IE"
+    hv_mrns = value.groupby(lines["MRN"]).sum().loc[lambda v: v > 150].index
+    mrn = lines.loc[declared_in_ie & returned & lines["MRN"].isin(hv_mrns), "MRN"].iloc[0]
+
+    shipped_elsewhere = lines.copy()
+    shipped_elsewhere.loc[shipped_elsewhere["MRN"] == mrn, "Consignee Country"] = "DE"
+    shipped_elsewhere.to_csv(tmp_path / "shipped_elsewhere.csv", index=False)
+    lines[lines["MRN"] != mrn].to_csv(tmp_path / "without.csv", index=False)
+
+    def hv_ie_rgr(file_name, backend):
+        with run_context(DEFAULT_DUTY_EXCEL_PATH=tariff, CHECKPOINT_DIR=None, RESULT_CACHE_DIR=None,
+                         VALIDATION_MODE="report"):
+            results = process_data(
+                str(tmp_path / file_name), "csv", str(tmp_path / backend), backend=backend, outputs=["HV_IE_REFUNDS.xlsx"]
+            )
+        return results["hv_ie_rgr"]
+
+    expected = hv_ie_rgr("without.csv", "pandas")
+    for backend in BACKENDS:
+        assert_same(expected, hv_ie_rgr("shipped_elsewhere.csv", backend), backend)
+
+
+def test_backends_use_the_goods_code_length(monkeypatch, tmp_path, runs):
+    """A tariff keyed by 6-digit goods codes is looked up the same way by every backend."""
+    monkeypatch.setattr(DutyProcessor, "GOODS_CODE_LENGTH", 6)
+    tariff = tmp_path / "tariff_6.xlsx"  # its own file, so the parsed 4-digit tariff is not reused
+    TARIFF.to_excel(tariff, index=False)
+
+    results = {}
+    for backend in BACKENDS:
+        with run_context(DEFAULT_DUTY_EXCEL_PATH=str(tariff), CHECKPOINT_DIR=None, RESULT_CACHE_DIR=None):
+            results[backend] = process_data(
+                str(SAMPLES / "JUL-SEP DATA.csv"), "csv", str(tmp_path / backend), backend=backend,
+                outputs=FILING_REPORTS,
+            )
+
+    expected = results["pandas"]
+    four_digit, _ = runs["JUL-SEP DATA.csv", "pandas"]
+    assert not expected["hv_nl_rgr"][2].equals(four_digit["hv_nl_rgr"][2])
+    for backend in ["polars", "duckdb"]:
+        for stage in ["hv_nl_rgr", "hv_ie_rgr", "summary"]:
+            assert_same(expected[stage], results[backend][stage], f"{backend} {stage}")
@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+
+from config import run_context
+from dedup_index import DedupIndex
+from main import dedup_source
+
+KEYS = pd.DataFrame({"Parcel ID": ["P1", "P2", "P2"], "Line Item ID": [1, 1, 1], "MRN": ["M1", "M2", "M2"]})
+
+
+def test_check_only_reads_the_index(tmp_path):
+    with run_context(DATA_DIR=f"{tmp_path}/"):
+        index = DedupIndex(tmp_path / "index")
+        duplicate, new_hashes = index.check(KEYS, "a.csv")
+        # A line repeated within the file is reported, not dropped
+        np.testing.assert_array_equal(duplicate, [False, False, False])
+        assert len(new_hashes) == 2
+        assert len(pd.read_csv(tmp_path / DedupIndex.REPORT_NAME)) == 1
+
+        # Nothing registered until the run commits
+        assert not DedupIndex(tmp_path / "index").check(KEYS, "b.csv")[0][:2].any()
+
+        index.commit(new_hashes, "a.csv")
+        assert DedupIndex(tmp_path / "index").check(KEYS, "b.csv")[0].all()
+        # Re-processing the same file does not flag its own lines
+        assert not DedupIndex(tmp_path / "index").check(KEYS, "a.csv")[0][:2].any()
+
+
+def test_sources_are_told_apart_by_folder_and_period(tmp_path):
+    with run_context(DEFAULT_RETURN_PERIOD="Q3 2024"):
+        q3 = dedup_source(str(tmp_path / "q3" / "DATA.csv"))
+        assert q3 == dedup_source(str(tmp_path / "q3" / ".." / "q3" / "DATA.csv"))
+        assert q3 != dedup_source(str(tmp_path / "q4" / "DATA.csv"))
+        assert q3 != dedup_source(str(tmp_path / "q3" / "DATA.csv"), period_split="month")
+    with run_context(DEFAULT_RETURN_PERIOD="Q4 2024"):
+        assert q3 != dedup_source(str(tmp_path / "q3" / "DATA.csv"))
@@ -0,0 +1,26 @@
+import pandas as pd
+
+from line_ledger import LineLedger
+from lookup_index import LookupIndex
+
+
+def ledger(parcels):
+    frame = pd.DataFrame({column: 0.0 for column in LineLedger.COLUMNS}, index=range(len(parcels)))
+    frame["Parcel ID"] = parcels
+    frame["MRN"] = "M1"
+    return frame
+
+
+def test_rerun_replaces_the_source_lines(tmp_path):
+    index = LookupIndex(str(tmp_path / "lookup.sqlite"))
+    try:
+        index.add_run(ledger(["P1", "P2"]), "Q3.csv (Q3 2024)", "out/")
+        index.add_run(ledger(["P3"]), "Q4.csv (Q4 2024)", "out/")
+        run_id = index.add_run(ledger(["P1", "P2"]), "Q3.csv (Q3 2024)", "out/")
+
+        assert index.runs()["source"].tolist() == ["Q4.csv (Q4 2024)", "Q3.csv (Q3 2024)"]
+        lines = index.lookup(mrn="M1")
+        assert sorted(lines["Parcel ID"]) == ["P1", "P2", "P3"]
+        assert lines.loc[lines["Parcel ID"] == "P1", "run_id"].tolist() == [run_id]
+    finally:
+        index.close()
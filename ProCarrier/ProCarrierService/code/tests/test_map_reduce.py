@@ -0,0 +1,45 @@
+"""Differential test: map_reduce over file shards produces the reports of process_data on the whole file."""
+
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from config import run_context
+from main import FILING_REPORTS, process_data
+from map_reduce import map_reduce, split_file
+
+SAMPLES = Path(__file__).resolve().parents[2]
+
+INPUTS = [("JUL-SEP DATA.csv", "csv"), ("OCT DATA.xlsx", "xlsx")]
+
+TARIFF = pd.DataFrame({
+    "Goods code": ["6204000000", "4202000000", "6110000000", "7117000000"],
+    "Origin": ["ERGA OMNES", "ERGA OMNES", "ERGA OMNES", "ERGA OMNES"],
+    "Duty": ["12.000 %", "3.700 %", "12.000 %", "4.000 %"],
+})
+
+
+@pytest.fixture(scope="module")
+def tariff(tmp_path_factory):
+    path = tmp_path_factory.mktemp("tariff") / "tariff.xlsx"
+    TARIFF.to_excel(path, index=False)
+    return str(path)
+
+
+@pytest.mark.parametrize("file_name, data_type", INPUTS)
+def test_map_reduce_matches_process_data(tariff, tmp_path, file_name, data_type):
+    source = str(SAMPLES / file_name)
+    shards = tmp_path / "shards"
+    shards.mkdir()
+
+    with run_context(DEFAULT_DUTY_EXCEL_PATH=tariff, CHECKPOINT_DIR=None, RESULT_CACHE_DIR=None):
+        process_data(source, data_type, str(tmp_path / "whole"), outputs=FILING_REPORTS)
+        shard_files = split_file(source, data_type, 5, str(shards))
+        map_reduce(shard_files, "parquet", str(tmp_path / "sharded"), workers=3, partitions=4)
+
+    for report in FILING_REPORTS:
+        pd.testing.assert_frame_equal(
+            pd.read_excel(tmp_path / "whole" / report), pd.read_excel(tmp_path / "sharded" / report),
+            check_dtype=False, rtol=1e-9, obj=report,
+        )
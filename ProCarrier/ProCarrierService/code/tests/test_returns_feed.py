@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backends import get_backend
+from returns_feed import ReturnsFeed
+
+LINES = pd.DataFrame({
+    "Parcel ID": ["P1", "P1", "P1", "P2", "P3"],
+    "Line Item ID": [1, 1, 2, 1, 1],
+    "Courier Tracking #": ["T1", "T1", "T1", "T2", "T3"],
+    "Line Item Quantity Imported": [2, 2, 1, 3, 1],
+    "Line Item Quantity Returned": [0, 0, 0, 0, 0],
+    "MRN": ["M1", "M1", "M1", "M2", "M3"],
+    "Consignee Country": ["DE", "DE", "DE", "FR", "NL"],
+})
+
+EVENTS = pd.DataFrame({
+    # P1 line 1 (repeated in the extract), P2 by tracking number only, unknown tracking number
+    "Parcel ID": ["P1", None, None],
+    "Line Item ID": ["1", None, None],
+    "Courier Tracking #": [None, "T2", "T9"],
+    "Quantity Returned": ["1", None, None],
+})
+
+# Returns go to the first occurrence of a repeated line only
+EXPECTED = [1.0, 0.0, 0.0, 3.0, 0.0]
+
+
+def test_match_with_duplicate_lines_and_tracking_events():
+    returned, exceptions = ReturnsFeed.match(LINES[ReturnsFeed.INPUT_COLUMNS], EVENTS)
+
+    assert returned.to_dict("records") == [
+        {"Parcel ID": "P1", "Line Item ID": "1", "Line Item Quantity Returned": 1.0},
+        {"Parcel ID": "P2", "Line Item ID": "1", "Line Item Quantity Returned": 3.0},
+    ]
+    assert exceptions["Issue"].tolist() == ["Unmatched parcel"]
+    np.testing.assert_array_equal(ReturnsFeed.returned_quantities(LINES, returned), EXPECTED)
+
+
+@pytest.mark.parametrize("backend", ["pandas", "polars", "duckdb"])
+def test_apply_returns_counts_duplicate_lines_once(backend, tmp_path):
+    extract = tmp_path / "lines.csv"
+    LINES.to_csv(extract, index=False)
+
+    engine = get_backend(backend)
+    lines = engine.clean(engine.read(str(extract), "csv", list(LINES.columns)))
+    returned, _ = ReturnsFeed.match(engine.line_keys(lines, ReturnsFeed.INPUT_COLUMNS), EVENTS)
+    lines = engine.apply_returns(lines, returned)
+
+    quantities = engine.line_keys(lines, ["Line Item Quantity Returned"])["Line Item Quantity Returned"]
+    np.testing.assert_array_equal(quantities.to_numpy(dtype=float), EXPECTED)
@@ -0,0 +1,33 @@
+import zipfile
+
+import pandas as pd
+
+from config import run_context
+from rgr_documents import RgrDocumentGenerator
+
+# One NL-declared parcel with a returned line
+HV_RETURNED = pd.DataFrame({
+    "Parcel ID": ["P1"],
+    "Line Item ID": [1],
+    "Line Item Name": ["Dress"],
+    "HS CODE": ["6204420000"],
+    "Line Item Quantity Imported": [2],
+    "Line Item Quantity Returned": [1],
+    "Line Item Unit Price": [100.0],
+    "MRN": ["24NL0000000000001"],
+    "Entry Date": ["2025-10-03"],
+    "Consignee Name": ["A. Customer"],
+    "Consignee Country": ["DE"],
+    "Courier Tracking #": ["T1"],
+})
+
+
+def test_document_shows_the_given_return_period(tmp_path):
+    with run_context(DATA_DIR=str(tmp_path)):
+        index = RgrDocumentGenerator.generate(HV_RETURNED, {"6204": 0.12}, "OCT 2025", workers=1)
+
+    with zipfile.ZipFile(tmp_path / RgrDocumentGenerator.ARCHIVE_NAME) as archive:
+        document = archive.read(index["Document"][0]).decode("utf-8")
+
+    assert "Return period:    OCT 2025\n" in document
+    assert "Total duty returned:   12.00\n" in document
@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+
+from duty_processor import DutyProcessor
+from tariff_lookup import lookup_duty_rates, parse_duty_rate
+
+TARIFF = pd.Series({
+    "ERGA OMNES:3303": 0.065,
+    "ERGA OMNES:3303001003": 0.12,
+    "CA:3303": 0.0,
+    "CA:3303001004": 0.03,
+})
+
+
+def test_parse_duty_rate():
+    assert parse_duty_rate("12.000 %") == 0.12
+    assert parse_duty_rate("6,5%") == 0.065
+    assert parse_duty_rate("4") == 0.04
+    assert np.isnan(parse_duty_rate("NAR"))
+    assert np.isnan(parse_duty_rate(None))
+
+
+def test_longest_prefix_origin_first():
+    codes = pd.Series(["3303.00.1004", "3303.00.1004", "3303001003", "3303001003", "9999", None])
+    origins = pd.Series(["CA", "CN", "CA", "CN", "CA", "CA"])
+
+    rates = lookup_duty_rates(TARIFF, codes, origins)
+
+    np.testing.assert_array_equal(rates.to_numpy(), [0.03, 0.065, 0.0, 0.12, np.nan, np.nan])
+
+
+def test_duty_processor_uses_four_digit_goods_codes():
+    duty_dict = {"6204": 0.12, "4202": 0.037}
+    hs_codes = pd.Series([6204420000.0, np.nan, 4202.0, 6110200000.0], index=[10, 11, 12, 13])
+
+    rates = DutyProcessor.duty_rates(hs_codes, duty_dict)
+
+    pd.testing.assert_series_equal(rates, hs_codes.astype(str).str[:4].map(duty_dict).astype(float))
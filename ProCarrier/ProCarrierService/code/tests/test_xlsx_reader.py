@@ -0,0 +1,37 @@
+"""XlsxReader reads what pd.read_excel reads, whatever the batch size."""
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from config import run_context
+from xlsx_reader import XlsxReader
+
+SAMPLES = Path(__file__).resolve().parents[2]
+
+
+@pytest.mark.parametrize("batch_rows", [7, 500])
+def test_sample_matches_read_excel(batch_rows):
+    file_name = str(SAMPLES / "OCT DATA.xlsx")
+
+    with run_context(XLSX_BATCH_ROWS=batch_rows):
+        actual = XlsxReader.read(file_name, workers=1)
+
+    pd.testing.assert_frame_equal(actual, pd.read_excel(file_name))
+
+
+@pytest.mark.parametrize("batch_rows", [2, 10])
+def test_text_column_empty_in_some_batches(tmp_path, batch_rows):
+    path = tmp_path / "lines.xlsx"
+    pd.DataFrame({
+        "Parcel ID": ["P1", "P2", "P3", "P4"],
+        "EU Export Date": [np.nan, np.nan, "2025-10-03", np.nan],
+        "Entry Date": [np.nan] * 4,
+    }).to_excel(path, index=False)
+
+    with run_context(XLSX_BATCH_ROWS=batch_rows):
+        actual = XlsxReader.read(str(path), workers=1)
+
+    pd.testing.assert_frame_equal(actual, pd.read_excel(path))
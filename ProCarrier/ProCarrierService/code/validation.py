@@ -0,0 +1,196 @@
+"""Line validation: every data rule as one vectorised mask over the run's lines.
+
+Rules with severity "error" make a line unusable for the reports:
+
+- a destination without a VAT rate;
+- an IE declaration shipped outside IE, which hv_ie_processing leaves out;
+- a missing or negative quantity or price;
+- a return above the imported quantity.
+
+All error rule hits go to VALIDATION_EXCEPTIONS.parquet, one row per line
+and rule. Each row carries the line's IDs and its 0-based position among
+the lines the run reports on ("Cleaned Line No"): IC/CH lines and lines
+dropped as duplicates are not counted, so it is not the source file row.
+With Config.VALIDATION_MODE = "quarantine", every consignment with an error
+is taken out of the run, so its lines cannot skew the consignment values of
+the rest, and the rest of the run continues.
+Otherwise the lines stay in and behave as before. The error rules need
+neither the tariff nor the HS codes, so LV-only runs read nothing extra.
+
+The "warning" rule flags HV lines whose HS code has no tariff rate and so
+pay no duty. It needs the tariff and is checked separately
+(check_duty_rates, DUTY_RATE_EXCEPTIONS.parquet), only by runs producing
+the HV duty reports.
+"""
+
+from pathlib import Path
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+from config import Config
+from duty_processor import DutyProcessor
+
+EXCEPTION_COLUMNS = [
+    "Cleaned Line No", "Rule", "Severity", "Quarantined", "Parcel ID", "Line Item ID", "MRN",
+    "Consignee Country", "HS CODE", "Line Item Quantity Imported", "Line Item Quantity Returned",
+    "Line Item Unit Price",
+]
+
+
+def _number(series: pd.Series) -> pd.Series:
+    return pd.to_numeric(series, errors="coerce")
+
+
+class LineValidator:
+    """Evaluates the rule set and builds the exceptions report."""
+
+    # Raw input columns the error rules read
+    INPUT_COLUMNS = [
+        'Parcel ID', 'MRN', 'Consignee Country',
+        'Line Item Quantity Imported', 'Line Item Quantity Returned', 'Line Item Unit Price',
+    ]
+
+    # Raw input columns the duty rate check reads
+    DUTY_INPUT_COLUMNS = [
+        'Parcel ID', 'Line Item ID', 'MRN', 'Consignee Country', 'HS CODE',
+        'Line Item Quantity Imported', 'Line Item Unit Price',
+    ]
+
+    # Rule -> severity
+    RULES = {
+        "Missing VAT rate": "error",
+        "IE declaration outside IE": "error",
+        "Invalid quantity or price": "error",
+        "Return exceeds import": "error",
+        "No duty rate for HS code": "warning",
+    }
+
+    REPORT_NAME = "VALIDATION_EXCEPTIONS.parquet"
+    DUTY_REPORT_NAME = "DUTY_RATE_EXCEPTIONS.parquet"
+
+    @staticmethod
+    def high_value(lines: pd.DataFrame) -> pd.Series:
+        """Lines of consignments above Config.CONSIGNMENT_THRESHOLD."""
+        imported = _number(lines["Line Item Quantity Imported"])
+        price = _number(lines["Line Item Unit Price"])
+        consignment_value = (imported * price).groupby(lines["MRN"]).transform("sum")
+        return consignment_value > Config.CONSIGNMENT_THRESHOLD
+
+    @staticmethod
+    def evaluate(lines: pd.DataFrame) -> Dict[str, np.ndarray]:
+        """Boolean mask per error rule, aligned with the lines."""
+        imported = _number(lines["Line Item Quantity Imported"])
+        returned = _number(lines["Line Item Quantity Returned"])
+        price = _number(lines["Line Item Unit Price"])
+
+        hv = LineValidator.high_value(lines)
+        declared_in_ie = lines["MRN"].astype(str).str[2:4].str.upper() == "IE"
+
+        masks = {
+            "Missing VAT rate": ~lines["Consignee Country"].isin(list(Config.VAT_RATES)),
+            "IE declaration outside IE": hv & declared_in_ie & (lines["Consignee Country"] != "IE"),
+            "Invalid quantity or price": (
+                imported.isna() | (imported < 0) | price.isna() | (price < 0) | (returned < 0)
+            ),
+            "Return exceeds import": returned > imported,
+        }
+        return {rule: mask.to_numpy(dtype=bool) for rule, mask in masks.items()}
+
+    @staticmethod
+    def quarantine(lines: pd.DataFrame, masks: Dict[str, np.ndarray]) -> np.ndarray:
+        """Lines of every consignment (MRN) with at least one error line."""
+        errors = np.logical_or.reduce(
+            [mask for rule, mask in masks.items() if LineValidator.RULES[rule] == "error"]
+        )
+        codes, _ = pd.factorize(lines["MRN"])
+        bad_consignments = np.zeros(len(codes) + 1, dtype=bool)
+        bad_consignments[codes[errors] + 1] = True
+        bad_consignments[0] = False  # lines without an MRN only go with their own errors
+        return bad_consignments[codes + 1] | errors
+
+    @staticmethod
+    def exceptions(lines: pd.DataFrame, masks: Dict[str, np.ndarray], quarantined: np.ndarray) -> pd.DataFrame:
+        """One row per rule hit, plus one per line quarantined only because of its consignment."""
+        hits = {rule: np.flatnonzero(mask) for rule, mask in masks.items()}
+        any_hit = np.logical_or.reduce(list(masks.values()))
+        hits["Consignment quarantined"] = np.flatnonzero(quarantined & ~any_hit)
+
+        positions = np.concatenate(list(hits.values()))
+        rules = np.repeat(list(hits), [len(rows) for rows in hits.values()])
+
+        report = lines.iloc[positions].reset_index(drop=True)
+        report.insert(0, "Cleaned Line No", positions)
+        report.insert(1, "Rule", rules)
+        report.insert(2, "Severity", pd.Series(rules).map(LineValidator.RULES).fillna("info"))
+        report.insert(3, "Quarantined", quarantined[positions])
+        return report.reindex(columns=EXCEPTION_COLUMNS).sort_values("Cleaned Line No", kind="stable")
+
+    @staticmethod
+    def store_exceptions(report: pd.DataFrame, name: str = REPORT_NAME) -> None:
+        """
+        Save an exceptions report (Parquet: big files can have millions of hits).
+        Columns the rules did not read (e.g. HS CODE in VALIDATION_EXCEPTIONS) are empty.
+        """
+        data_dir = Path(Config.DATA_DIR)
+        data_dir.mkdir(exist_ok=True)
+
+        text_columns = ["Parcel ID", "Line Item ID", "MRN", "Consignee Country", "HS CODE"]
+        report = report.astype({column: "string" for column in text_columns})
+        report.to_parquet(data_dir / name, index=False, compression="zstd")
+
+        if len(report):
+            counts = report["Rule"].value_counts().to_dict()
+            print(f"⚠️ WARNING: Validation exceptions: {counts} "
+                  f"({report.loc[report['Quarantined'], 'Cleaned Line No'].nunique()} lines quarantined)")
+
+    @staticmethod
+    def validate(lines: pd.DataFrame) -> np.ndarray:
+        """
+        Evaluate the error rules, write the exceptions report and return the lines to drop.
+
+        Args:
+            lines: the run's lines with INPUT_COLUMNS, in line order
+
+        Returns:
+            Boolean mask of quarantined lines (all False unless VALIDATION_MODE is "quarantine")
+        """
+        if Config.VALIDATION_MODE not in ["report", "quarantine"]:
+            raise ValueError(
+                f"Invalid VALIDATION_MODE: {Config.VALIDATION_MODE}. Must be 'report' or 'quarantine'"
+            )
+
+        masks = LineValidator.evaluate(lines)
+        if Config.VALIDATION_MODE == "quarantine":
+            quarantined = LineValidator.quarantine(lines, masks)
+        else:
+            quarantined = np.zeros(len(lines), dtype=bool)
+
+        LineValidator.store_exceptions(LineValidator.exceptions(lines, masks, quarantined))
+        return quarantined
+
+    @staticmethod
+    def check_duty_rates(lines: pd.DataFrame, quarantined: np.ndarray, duty_dict: Dict[str, float]) -> int:
+        """
+        Write the HV lines without a tariff rate for their HS code to DUTY_RATE_EXCEPTIONS.parquet.
+
+        Args:
+            lines: the lines given to validate, with DUTY_INPUT_COLUMNS, in line order
+            quarantined: the mask validate returned for them
+            duty_dict: max duty rate per 4-digit goods code
+
+        Returns:
+            Number of lines flagged
+        """
+        rule = "No duty rate for HS code"
+        no_rate = LineValidator.high_value(lines) & DutyProcessor.duty_rates(lines["HS CODE"], duty_dict).isna()
+        positions = np.flatnonzero(no_rate.to_numpy(dtype=bool))
+
+        report = lines.iloc[positions].reset_index(drop=True)
+        report.insert(0, "Cleaned Line No", positions)
+        report.insert(1, "Rule", rule)
+        report.insert(2, "Severity", LineValidator.RULES[rule])
+        report.insert(3, "Quarantined", quarantined[positions])
+        LineValidator.store_exceptions(report.reindex(columns=EXCEPTION_COLUMNS), LineValidator.DUTY_REPORT_NAME)
+        return len(positions)
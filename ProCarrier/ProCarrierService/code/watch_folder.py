@@ -0,0 +1,149 @@
+"""Watch-folder daemon: process client files as they are dropped into an inbox.
+
+The inbox (Config.WATCH_INBOX) is scanned every Config.WATCH_POLL_SECONDS.
+A csv/xlsx/parquet file is queued once its size and mtime have not changed
+for Config.WATCH_SETTLE_SECONDS, so files still being copied are left
+alone. Hidden files and Office lock files (".", "~$") are ignored. Queued
+files are processed one at a time by process_data. Each job's reports go to
+their own folder in the outbox (<file stem>-<timestamp>). A failing job
+writes its traceback to ERROR.txt in that folder. Afterwards the input file
+moves to the inbox's processed/ or failed/ subfolder.
+
+The process stays up, so pandas, openpyxl and the parsed duty tariff stay
+loaded between jobs. The warm-up (imports and tariff parse) runs at start
+and again on the first job of each new day; if it fails there, that job
+fails and the next one retries it. The tariff is also re-parsed
+whenever its file changes (see main.load_duty_dict).
+
+Usage:
+    python watch_folder.py
+    python watch_folder.py --inbox ../inbox --outbox ../outbox --backend polars
+"""
+
+import argparse
+import shutil
+import time
+import traceback
+from collections import deque
+from datetime import date, datetime
+from pathlib import Path
+
+import main
+from config import Config
+from data_layer import DataLayer
+
+# Input types picked up from the inbox (csv also as .csv.gz / .csv.zst)
+DATA_TYPES = ["csv", "xlsx", "parquet"]
+
+# Name prefixes of hidden and temporary files (e.g. Excel lock files)
+IGNORED_PREFIXES = (".", "~$")
+
+
+class WatchFolder:
+    """Debounced inbox scanner and the queue of jobs it feeds."""
+
+    def __init__(self, inbox: str, outbox: str, backend: str = "pandas"):
+        self.inbox = Path(inbox).resolve()
+        self.outbox = Path(outbox).resolve()
+        self.backend = backend
+        self.jobs = deque()
+        # Unsettled files: path -> ((size, mtime), time the signature was first seen)
+        self.pending = {}
+        self.warm_day = None
+
+    def warm_up(self) -> None:
+        """Load the report libraries and parse the duty tariff, so jobs start warm."""
+        started = time.monotonic()
+        import openpyxl  # noqa: F401 -- imported here so the first job does not pay for it
+
+        duty_dict = main.load_duty_dict(refresh=True)
+        self.warm_day = date.today()
+        print(f"♻️ Warm-up done in {time.monotonic() - started:.1f}s ({len(duty_dict)} tariff codes)")
+
+    def scan(self) -> None:
+        """Queue every inbox file whose size and mtime have settled."""
+        now = time.monotonic()
+        present = set()
+        for path in sorted(self.inbox.iterdir()):
+            if (
+                    not path.is_file()
+                    or path.name.startswith(IGNORED_PREFIXES)
+                    or DataLayer.data_type(path.name) not in DATA_TYPES
+                    or path in self.jobs
+            ):
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            present.add(path)
+
+            signature = (stat.st_size, stat.st_mtime_ns)
+            if path not in self.pending or self.pending[path][0] != signature:
+                self.pending[path] = (signature, now)
+            elif now - self.pending[path][1] >= Config.WATCH_SETTLE_SECONDS:
+                del self.pending[path]
+                self.jobs.append(path)
+                print(f"📥 Queued {path.name}")
+
+        for path in set(self.pending) - present:
+            del self.pending[path]
+
+    def run_job(self, path: Path) -> bool:
+        """Process one input file into its own outbox folder; returns False when the job failed."""
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        job_dir = self.outbox / f"{path.stem}-{stamp}"
+        job_dir.mkdir(parents=True, exist_ok=True)
+
+        started = time.monotonic()
+        try:
+            # A tariff missing at the daily re-warm-up fails this job, not the daemon
+            if self.warm_day != date.today():
+                self.warm_up()
+            main.process_data(str(path), DataLayer.data_type(path.name), str(job_dir), backend=self.backend)
+            succeeded = True
+        except Exception:
+            (job_dir / "ERROR.txt").write_text(traceback.format_exc(), encoding="utf-8")
+            print(f"⚠️ WARNING: {path.name} failed, see {job_dir / 'ERROR.txt'}")
+            succeeded = False
+
+        done_dir = self.inbox / ("processed" if succeeded else "failed")
+        done_dir.mkdir(exist_ok=True)
+        shutil.move(str(path), str(done_dir / f"{stamp}-{path.name}"))
+        print(f"📄 {path.name}: {'done' if succeeded else 'failed'} in {time.monotonic() - started:.1f}s -> {job_dir}")
+        return succeeded
+
+    def serve(self) -> None:
+        """Scan and process jobs until interrupted."""
+        self.inbox.mkdir(parents=True, exist_ok=True)
+        self.outbox.mkdir(parents=True, exist_ok=True)
+        self.warm_up()
+        print(f"🔎 Watching {self.inbox} (results in {self.outbox})")
+
+        while True:
+            self.scan()
+            while self.jobs:
+                self.run_job(self.jobs.popleft())
+                self.scan()
+            time.sleep(Config.WATCH_POLL_SECONDS)
+
+
+def main_loop():
+    parser = argparse.ArgumentParser(description="Process files dropped into an inbox folder.")
+    parser.add_argument("--inbox", default=Config.WATCH_INBOX)
+    parser.add_argument("--outbox", default=Config.WATCH_OUTBOX)
+    parser.add_argument("--backend", default="pandas", choices=["pandas", "polars", "duckdb"])
+    parser.add_argument("--settle", type=float, help="Seconds a file must stay unchanged before it is picked up")
+    args = parser.parse_args()
+
+    if args.settle is not None:
+        Config.WATCH_SETTLE_SECONDS = args.settle
+
+    try:
+        WatchFolder(args.inbox, args.outbox, args.backend).serve()
+    except KeyboardInterrupt:
+        print("Stopped")
+
+
+if __name__ == "__main__":
+    main_loop()
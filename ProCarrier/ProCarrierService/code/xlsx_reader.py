@@ -0,0 +1,406 @@
+"""Streaming read-only XLSX reader for consignment workbooks.
+
+pd.read_excel builds openpyxl cell objects for every cell, then holds every
+row of the sheet as a list of Python objects before parsing. Large monthly
+workbooks therefore take long to read and peak at several times their size
+in memory. XlsxReader instead streams the sheet XML out of the zip with
+expat:
+
+- only the cells of the planned columns (ReadPlanner usecols) are
+  converted;
+- every Config.XLSX_BATCH_ROWS rows become a typed DataFrame batch, parsed
+  by pandas' own TextParser, so only one batch of raw cells is held at a
+  time.
+
+Cells are converted as openpyxl (data_only) and pd.read_excel convert them:
+
+- shared / inline strings become text;
+- numbers become int where integral, else float;
+- numbers with a date or time style become datetime / timedelta;
+- error cells and pandas' missing-value strings become NaN;
+- blank rows inside the data are kept, trailing blank rows are dropped.
+
+The ArrowCsvReader.TEXT_COLUMNS (IDs and free text) are read as text,
+except that an empty one is float NaN, as with pd.read_excel. Other column
+types are inferred per batch. Batches are concatenated, so a numeric column
+with blanks in only some batches comes out as float64, as with
+pd.read_excel. A column that comes out as text although some batches looked
+numeric ("1" in an address column) is read again untyped, so its text cells
+stay text.
+
+Client workbooks may spread the lines over several sheets.
+Config.XLSX_SHEETS names the sheets to read (default ["Sheet1"]). None
+reads every sheet whose header has the planned columns, in workbook order,
+one worker process per sheet (Config.XLSX_WORKERS).
+"""
+
+import os
+import posixpath
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Set
+from xml.etree import ElementTree
+from xml.parsers import expat
+
+import numpy as np
+import pandas as pd
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format, is_timedelta_format
+from openpyxl.utils.datetime import MAC_EPOCH, WINDOWS_EPOCH, from_excel, from_ISO8601
+from pandas.io.parsers import TextParser
+
+from arrow_csv import ArrowCsvReader
+from config import Config
+
+MAIN_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+PACKAGE_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+# Bytes of sheet XML fed to the parser at a time
+READ_BYTES = 1 << 20
+
+
+def _column(reference: str) -> int:
+    """0-based column of a cell reference such as "AB12"."""
+    column = 0
+    for char in reference:
+        if char <= "9":
+            break
+        column = column * 26 + ord(char) - 64
+    return column - 1
+
+
+def _number(text: str):
+    """Numeric cell text as int when integral (openpyxl + pd.read_excel)."""
+    if "." in text or "E" in text or "e" in text:
+        value = float(text)
+        return int(value) if value.is_integer() else value
+    return int(text)
+
+
+class _Workbook:
+    """Zip members, shared strings and date styles of one workbook."""
+
+    def __init__(self, file_name: str):
+        self.file_name = file_name
+        self.zip = zipfile.ZipFile(file_name)
+
+        workbook = ElementTree.fromstring(self.zip.read("xl/workbook.xml"))
+        properties = workbook.find(f"{MAIN_NS}workbookPr")
+        date1904 = properties is not None and properties.get("date1904") in ("1", "true")
+        self.epoch = MAC_EPOCH if date1904 else WINDOWS_EPOCH
+
+        rels = ElementTree.fromstring(self.zip.read("xl/_rels/workbook.xml.rels"))
+        targets = {rel.get("Id"): rel.get("Target") for rel in rels.iter(f"{PACKAGE_REL_NS}Relationship")}
+        self.sheet_paths = {}
+        for sheet in workbook.iter(f"{MAIN_NS}sheet"):
+            target = targets[sheet.get(f"{REL_NS}id")]
+            path = target.lstrip("/") if target.startswith("/") else posixpath.normpath(f"xl/{target}")
+            self.sheet_paths[sheet.get("name")] = path
+
+        self.shared_strings = self._shared_strings()
+        self.date_styles, self.timedelta_styles = self._date_styles()
+
+    def _shared_strings(self) -> List[str]:
+        if "xl/sharedStrings.xml" not in self.zip.namelist():
+            return []
+        strings = []
+        with self.zip.open("xl/sharedStrings.xml") as source:
+            for _, element in ElementTree.iterparse(source):
+                if element.tag == f"{MAIN_NS}si":
+                    # Plain or rich text runs; phonetic hints (rPh) are not part of the value
+                    strings.append("".join(
+                        t.text or "" for t in element.iter(f"{MAIN_NS}t")
+                        if t not in element.findall(f"{MAIN_NS}rPh/{MAIN_NS}t")
+                    ))
+                    element.clear()
+        return strings
+
+    def _date_styles(self):
+        """Cell style indices whose number format is a date / a time span."""
+        if "xl/styles.xml" not in self.zip.namelist():
+            return set(), set()
+        styles = ElementTree.fromstring(self.zip.read("xl/styles.xml"))
+        custom = {
+            int(fmt.get("numFmtId")): fmt.get("formatCode")
+            for fmt in styles.iter(f"{MAIN_NS}numFmt")
+        }
+        dates, timedeltas = set(), set()
+        cell_xfs = styles.find(f"{MAIN_NS}cellXfs")
+        for index, xf in enumerate([] if cell_xfs is None else cell_xfs.findall(f"{MAIN_NS}xf")):
+            number_format_id = int(xf.get("numFmtId", 0))
+            code = custom.get(number_format_id, BUILTIN_FORMATS.get(number_format_id))
+            if code and is_date_format(code):
+                dates.add(index)
+                if is_timedelta_format(code):
+                    timedeltas.add(index)
+        return dates, timedeltas
+
+    def rows(self, sheet: str, columns: Optional[Set[int]] = None) -> Iterator[Dict[int, object]]:
+        """
+        Rows of a sheet in order as {column: value}, with {} for blank rows.
+        The first row (header) has every column; later rows only `columns`
+        (None: all).
+        """
+        if sheet not in self.sheet_paths:
+            raise ValueError(f"Workbook {self.file_name} has no sheet {sheet!r}")
+
+        parser = expat.ParserCreate()
+        parser.buffer_text = True
+        finished = []
+        state = {"row": None, "row_number": 0, "column": -1, "keep": False, "type": "n",
+                 "style": 0, "text": None, "header": True}
+        shared_strings, date_styles = self.shared_strings, self.date_styles
+
+        def start(name, attrs):
+            name = name.rpartition(":")[2]
+            if name == "c":
+                reference = attrs.get("r")
+                state["column"] = _column(reference) if reference else state["column"] + 1
+                state["keep"] = state["header"] or columns is None or state["column"] in columns
+                if state["keep"]:
+                    state["type"] = attrs.get("t", "n")
+                    state["style"] = int(attrs.get("s", 0))
+                    state["text"] = None
+            elif name in ("v", "t") and state["keep"]:
+                if state["text"] is None:
+                    state["text"] = []
+                state["collect"] = True
+            elif name == "rPh":
+                state["phonetic"] = True
+            elif name == "row":
+                number = int(attrs["r"]) if "r" in attrs else state["row_number"] + 1
+                if state["row_number"]:
+                    # Rows missing from the XML are blank rows
+                    finished.extend({} for _ in range(number - state["row_number"] - 1))
+                state["row_number"] = number
+                state["row"] = {}
+                state["column"] = -1
+
+        def end(name):
+            name = name.rpartition(":")[2]
+            if name in ("v", "t"):
+                state["collect"] = False
+            elif name == "rPh":
+                state["phonetic"] = False
+            elif name == "c" and state["keep"]:
+                text = None if state["text"] is None else "".join(state["text"])
+                state["row"][state["column"]] = self._value(text, state["type"], state["style"], date_styles,
+                                                            shared_strings)
+            elif name == "row":
+                finished.append(state["row"])
+                state["header"] = False
+
+        def characters(data):
+            if state.get("collect") and not state.get("phonetic"):
+                state["text"].append(data)
+
+        parser.StartElementHandler = start
+        parser.EndElementHandler = end
+        parser.CharacterDataHandler = characters
+
+        with self.zip.open(self.sheet_paths[sheet]) as source:
+            while True:
+                chunk = source.read(READ_BYTES)
+                parser.Parse(chunk, not chunk)
+                yield from finished
+                finished.clear()
+                if not chunk:
+                    break
+
+    def _value(self, text, cell_type, style, date_styles, shared_strings):
+        """A cell's value as pd.read_excel sees it ("" for empty cells)."""
+        if cell_type == "inlineStr":
+            return "" if text is None else text
+        if text is None or text == "":
+            return ""
+        if cell_type == "n":
+            value = _number(text)
+            if style in date_styles:
+                try:
+                    return from_excel(value, self.epoch, timedelta=style in self.timedelta_styles)
+                except (OverflowError, ValueError):
+                    return np.nan
+            return value
+        if cell_type == "s":
+            return shared_strings[int(text)]
+        if cell_type == "b":
+            return bool(int(text))
+        if cell_type == "e":
+            return np.nan
+        if cell_type == "d":
+            return from_ISO8601(text)
+        return text
+
+    def header(self, sheet: str) -> List[str]:
+        """Column names of a sheet, reading only its first row."""
+        rows = self.rows(sheet)
+        row = next(rows, {})
+        rows.close()
+        width = max(row, default=-1) + 1
+        header = [row.get(column, "") for column in range(width)]
+        while header and header[-1] == "":
+            header.pop()
+        return header
+
+    def close(self) -> None:
+        self.zip.close()
+
+
+def _read_sheet(task) -> pd.DataFrame:
+    """Worker: read one sheet of the workbook."""
+    file_name, sheet, usecols = task
+    return XlsxReader.read_sheet(file_name, sheet, usecols)
+
+
+class XlsxReader:
+    """Streams the sheets of an XLSX workbook into typed DataFrame batches."""
+
+    @staticmethod
+    def sheet_names(file_name: str) -> List[str]:
+        workbook = _Workbook(file_name)
+        try:
+            return list(workbook.sheet_paths)
+        finally:
+            workbook.close()
+
+    @staticmethod
+    def sheet_header(file_name: str, sheet: str) -> List[str]:
+        """Column names of one sheet (its first row)."""
+        workbook = _Workbook(file_name)
+        try:
+            return [column for column in workbook.header(sheet) if column != ""]
+        finally:
+            workbook.close()
+
+    @staticmethod
+    def sheets(file_name: str, usecols: Optional[List[str]] = None) -> List[str]:
+        """
+        Sheets to read: Config.XLSX_SHEETS, or with None every sheet whose
+        header has the usecols.
+
+        Raises:
+            ValueError: if a configured sheet is missing, or no sheet has the usecols
+        """
+        workbook = _Workbook(file_name)
+        try:
+            names = list(workbook.sheet_paths)
+            if Config.XLSX_SHEETS is not None:
+                missing = [sheet for sheet in Config.XLSX_SHEETS if sheet not in names]
+                if missing:
+                    raise ValueError(f"Workbook {file_name} has no sheets {missing} (sheets: {names})")
+                return list(Config.XLSX_SHEETS)
+
+            sheets = []
+            for sheet in names:
+                header = workbook.header(sheet)
+                if usecols is None or all(column in header for column in usecols):
+                    sheets.append(sheet)
+                else:
+                    print(f"⚠️ WARNING: skipping sheet {sheet!r} of {file_name}, it lacks the input columns")
+        finally:
+            workbook.close()
+
+        if not sheets:
+            raise ValueError(f"No sheet of {file_name} has the input columns {usecols}")
+        return sheets
+
+    @staticmethod
+    def read_header(file_name: str) -> List[str]:
+        """Column names of the first sheet that will be read."""
+        return XlsxReader.sheet_header(file_name, XlsxReader.sheets(file_name)[0])
+
+    @staticmethod
+    def iter_batches(
+            file_name: str,
+            sheet: str,
+            usecols: Optional[List[str]] = None,
+            batch_rows: Optional[int] = None,
+            object_columns: Optional[List[str]] = None,
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Typed DataFrames of up to batch_rows lines (default Config.XLSX_BATCH_ROWS) of one sheet.
+        The object_columns keep the cells' values (text stays text) instead of being typed per batch.
+        """
+        batch_rows = batch_rows or Config.XLSX_BATCH_ROWS
+        workbook = _Workbook(file_name)
+        try:
+            header = workbook.header(sheet)
+            usecols = header if usecols is None else usecols
+            missing = [column for column in usecols if column not in header]
+            if missing:
+                raise ValueError(f"Sheet {sheet!r} of {file_name} is missing columns {missing}")
+
+            # Planned columns in sheet order, as pd.read_excel(usecols=...) returns them
+            positions = [i for i, column in enumerate(header) if column in usecols]
+            names = [header[i] for i in positions]
+            dtype = {column: str for column in ArrowCsvReader.TEXT_COLUMNS if column in names}
+            dtype.update({column: object for column in object_columns or [] if column in names})
+
+            def parse(batch):
+                frame = TextParser(batch, names=names, header=None, dtype=dtype, skip_blank_lines=False).read()
+                for column in ArrowCsvReader.TEXT_COLUMNS:
+                    if column in names and frame[column].isna().all():
+                        # pd.read_excel reads an empty column as float NaN
+                        frame[column] = np.nan
+                return frame
+
+            rows = workbook.rows(sheet, set(positions))
+            next(rows, None)  # header
+
+            batch, blanks = [], []
+            for row in rows:
+                values = [row.get(i, "") for i in positions]
+                if not row or all(value == "" for value in row.values()):
+                    # Kept only if more data follows (pd.read_excel trims trailing blank rows)
+                    blanks.append(values)
+                    continue
+                batch.extend(blanks)
+                blanks = []
+                batch.append(values)
+                if len(batch) >= batch_rows:
+                    yield parse(batch)
+                    batch = []
+            if batch:
+                yield parse(batch)
+        finally:
+            workbook.close()
+
+    @staticmethod
+    def read_sheet(file_name: str, sheet: str, usecols: Optional[List[str]] = None) -> pd.DataFrame:
+        """One sheet as a DataFrame, built batch by batch."""
+        batches = list(XlsxReader.iter_batches(file_name, sheet, usecols))
+        if not batches:
+            return pd.DataFrame(columns=usecols or XlsxReader.sheet_header(file_name, sheet))
+        frame = pd.concat(batches, ignore_index=True)
+
+        # A text column can look numeric within one batch ("1" in an address column), while
+        # pd.read_excel keeps such a column's text as text: re-read those columns untyped
+        mixed = [
+            column for column in frame.columns
+            if frame[column].dtype == object
+            and any(batch[column].dtype != object and batch[column].notna().any() for batch in batches)
+        ]
+        if mixed:
+            untyped = pd.concat(
+                XlsxReader.iter_batches(file_name, sheet, mixed, object_columns=mixed), ignore_index=True
+            )
+            frame[mixed] = untyped[mixed]
+        return frame
+
+    @staticmethod
+    def read(file_name: str, usecols: Optional[List[str]] = None, workers: Optional[int] = None) -> pd.DataFrame:
+        """
+        The usecols (default: all) of the workbook's sheets (see sheets()),
+        concatenated in workbook order. Several sheets are read in parallel.
+        """
+        sheets = XlsxReader.sheets(file_name, usecols)
+        workers = min(workers or Config.XLSX_WORKERS or os.cpu_count() or 1, len(sheets))
+        tasks = [(file_name, sheet, usecols) for sheet in sheets]
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                frames = list(executor.map(_read_sheet, tasks))
+        else:
+            frames = [_read_sheet(task) for task in tasks]
+        if len(frames) == 1:
+            return frames[0]
+        return pd.concat(frames, ignore_index=True)
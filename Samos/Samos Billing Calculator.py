@@ -31,13 +31,19 @@ from openpyxl import Workbook
 from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 from openpyxl.utils import get_column_letter
 
+from uk_tariff import load_uk_tariff, lookup_duty_rates
+
 # ============================================================================
 # КОНСТАНТЫ
 # ============================================================================
 
 # Ставки налогов (можно изменить при необходимости)
 UK_VAT_RATE = 0.20  # 20% UK VAT
-UK_DUTY_RATE = 0.00  # 0% для парфюмерии (commodity code 3303.00.xxxx)
+UK_DUTY_RATE = 0.00  # 0% для парфюмерии (commodity code 3303.00.xxxx); без тарифа и для кодов не из тарифа
+
+# Тариф UK Duty (см. uk_tariff.py)
+UK_TARIFF_PATH = None  # выгрузка UK Global Tariff (CSV/XLSX); None -> UK_DUTY_RATE для всех строк
+DEFAULT_ORIGIN = 'CA'  # происхождение товара, если в Orders нет колонки 'Line Item Origin'
 
 # Комиссия Duty Refunds
 BASE_FEE_PER_ORDER = 1.00  # £1 за каждый заказ
@@ -78,6 +84,36 @@ def clean_data(df):
     return df
 
 
+def get_duty_rates(df):
+    """
+    Ставка UK Duty для каждой строки: по тарифу UK_TARIFF_PATH (код товара и
+    происхождение) или UK_DUTY_RATE, если тариф не задан или кода в нем нет.
+    """
+    if UK_TARIFF_PATH is None:
+        return pd.Series(UK_DUTY_RATE, index=df.index)
+
+    if 'Line Item Origin' in df.columns:
+        origins = df['Line Item Origin'].fillna(DEFAULT_ORIGIN)
+    else:
+        origins = pd.Series(DEFAULT_ORIGIN, index=df.index)
+
+    tariff = load_uk_tariff(UK_TARIFF_PATH)
+    rates = lookup_duty_rates(tariff, df['Line Item Commodity Code'], origins)
+
+    missing = rates.isna()
+    if missing.any():
+        codes = sorted(df.loc[missing, 'Line Item Commodity Code'].astype(str).unique())
+        print(f"⚠️ Кодов нет в тарифе ({missing.sum()} строк), применена ставка {UK_DUTY_RATE*100}%: {codes}")
+    return rates.fillna(UK_DUTY_RATE)
+
+
+def duty_rate_note():
+    """Источник ставки UK Duty для примечаний в счете."""
+    if UK_TARIFF_PATH is None:
+        return f"{UK_DUTY_RATE*100:g}% Duty"
+    return 'UK Global Tariff'
+
+
 def calculate_vat_and_duty(df):
 
     # Конвертируем цену из CAD в GBP
@@ -86,8 +122,9 @@ def calculate_vat_and_duty(df):
     # Рассчитываем общую стоимость позиции
     df['Line Item Total Value GBP'] = df['Line Item Unit Price GBP'] * df['Line Item Quantity Imported']
     
-    # Рассчитываем Duty (для парфюмерии обычно 0%)
-    df['UK Duty'] = df['Line Item Total Value GBP'] * UK_DUTY_RATE
+    # Рассчитываем Duty по ставке кода товара и происхождения (для парфюмерии обычно 0%)
+    df['UK Duty Rate'] = get_duty_rates(df)
+    df['UK Duty'] = df['Line Item Total Value GBP'] * df['UK Duty Rate']
     
     # Рассчитываем UK VAT (на товары + duty)
     df['UK VAT'] = (df['Line Item Total Value GBP'] + df['UK Duty']) * UK_VAT_RATE
@@ -234,7 +271,10 @@ def print_invoice_summary(invoice):
     print(f"\nСЦЕНАРИЙ A: UK ЗАКАЗЫ (товар остается в UK)")
     print(f"  Количество заказов: {invoice['UK Order Count']} шт")
     print(f"  [+] UK VAT (включается в счет):      £{invoice['UK VAT Charged']:>12,.2f}")
-    print(f"  [+] UK Duty (парфюмерия 0%):         £{invoice['UK Duty Charged']:>12,.2f}")
+    if UK_TARIFF_PATH is None:
+        print(f"  [+] UK Duty (парфюмерия 0%):         £{invoice['UK Duty Charged']:>12,.2f}")
+    else:
+        print(f"  [+] UK Duty (UK Global Tariff):      £{invoice['UK Duty Charged']:>12,.2f}")
 
     print(f"\nСЦЕНАРИЙ B: EU ЗАКАЗЫ (транзит через UK)")
     print(f"  Количество заказов: {invoice['EU Order Count']} шт")
@@ -262,7 +302,10 @@ def print_invoice_summary(invoice):
     print(f"\nПримечание: ")
     print(f"  • Курс CAD/GBP: {CAD_TO_GBP_RATE}")
     print(f"  • UK VAT: {UK_VAT_RATE*100}%")
-    print(f"  • UK Duty (парфюмерия): {UK_DUTY_RATE*100}%")
+    if UK_TARIFF_PATH is None:
+        print(f"  • UK Duty (парфюмерия): {UK_DUTY_RATE*100}%")
+    else:
+        print(f"  • UK Duty: по тарифу {UK_TARIFF_PATH}, происхождение по умолчанию {DEFAULT_ORIGIN}")
     print(f"  • EU заказы: VAT не включен в счет (возврат мгновенный)")
 
 
@@ -344,7 +387,7 @@ def generate_excel_invoice(df, invoice, output_file='Samos_Invoice_Detailed.xlsx
         invoice_data.append(['СЦЕНАРИЙ A: UK ЗАКАЗЫ', '', '', ''])
         invoice_data.append(['  Количество заказов', invoice['UK Order Count'], '', 'Товар остается в UK'])
         invoice_data.append(['  UK VAT (включается в счет)', '', invoice['UK VAT Charged'], '20% VAT'])
-        invoice_data.append(['  UK Duty (парфюмерия)', '', invoice['UK Duty Charged'], '0% Duty'])
+        invoice_data.append(['  UK Duty (парфюмерия)', '', invoice['UK Duty Charged'], duty_rate_note()])
 
         # EU заказы
         invoice_data.append(['', '', '', ''])
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+Индекс UK Global Tariff для расчета UK Duty по коду товара и стране происхождения.
+
+Выгрузка тарифа (CSV или XLSX) компилируется в индекс один раз и кэшируется
+рядом с ней (<выгрузка>.index.npz). Индекс пересобирается, только когда файл
+выгрузки меняется (размер или время изменения).
+
+Формат выгрузки:
+- 'Commodity Code' (или 'commodity' в выгрузке с gov.uk) - код товара любой
+  длины, с точками или без ('3303.00.1000', '3303001000', '3303'); нули в
+  конце кода означают всю товарную позицию ('3303000000' -> '3303');
+- 'Duty' (или 'ukgt_duty_rate') - ставка текстом, например '6.50%' или '0.00%';
+- 'Origin' (необязательно) - ISO код страны происхождения для преференциальных
+  ставок; пусто или 'ERGA OMNES' - ставка для любого происхождения.
+
+Ставки хранятся так же, как EU тариф в ProCarrier (DutyProcessor): по ключу
+(происхождение, код), при нескольких ставках на ключ берется максимальная,
+ставки без процента ('NAR', специфические £/кг) не учитываются.
+
+Поиск - по самому длинному префиксу кода, который есть в тарифе: сначала
+среди ставок страны происхождения, затем среди ERGA OMNES. Весь столбец
+ищется разом: один hash-поиск на каждую длину кода в тарифе.
+
+Samos - отдельный проект, поэтому разбор ставок и поиск живут здесь. EU тариф
+ProCarrier (ProCarrier/ProCarrierService/code/tariff_lookup.py) устроен так же:
+те же ключи '<происхождение>:<код>', тот же разбор ставок и тот же поиск, с
+одной длиной префикса (4 цифры). Изменения в разборе ставок или в поиске
+нужно вносить в оба модуля.
+"""
+
+import os
+import re
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Происхождение ставок без преференций
+ERGA_OMNES = 'ERGA OMNES'
+
+# Колонки выгрузки gov.uk -> колонки индекса
+TARIFF_COLUMNS = {
+    'commodity': 'Commodity Code',
+    'ukgt_duty_rate': 'Duty',
+    'origin': 'Origin',
+}
+
+
+def normalize_codes(codes):
+    """Коды товаров как строки из одних цифр ('3303.00.1000' -> '3303001000')."""
+    if pd.api.types.is_float_dtype(codes):
+        # Числовые коды из Excel с пропусками читаются как float
+        codes = codes.astype('Int64')
+    return codes.astype(str).str.replace(r'\D', '', regex=True)
+
+
+def parse_duty_rate(val):
+    """Ставка из текста ('6.50%' -> 0.065); np.nan, если процента нет."""
+    if pd.isna(val):
+        return np.nan
+    s = str(val).strip()
+    m = re.search(r'([\d]+[.,]?\d*)\s*%', s) or re.search(r'^([\d]+[.,]?\d*)$', s)
+    if m:
+        return float(m.group(1).replace(',', '.')) / 100.0
+    return np.nan
+
+
+def compile_tariff(file_path):
+    """
+    Компилирует выгрузку тарифа в индекс.
+
+    Returns:
+        pd.Series: ставка по ключу '<происхождение>:<код>'
+    """
+    if Path(file_path).suffix.lower() in ('.xlsx', '.xls'):
+        df = pd.read_excel(file_path, dtype=str)
+    else:
+        df = pd.read_csv(file_path, dtype=str)
+    df = df.rename(columns=TARIFF_COLUMNS)
+
+    missing = [c for c in ('Commodity Code', 'Duty') if c not in df.columns]
+    if missing:
+        raise ValueError(f"В выгрузке тарифа {file_path} нет колонок: {missing}")
+
+    # Нули в конце - вся позиция / субпозиция (не короче 4 цифр)
+    codes = normalize_codes(df['Commodity Code']).str.replace(r'^(\d{4}(?:\d\d)*?)(?:00)+$', r'\1', regex=True)
+    if 'Origin' in df.columns:
+        origins = df['Origin'].fillna(ERGA_OMNES).str.strip().str.upper().replace('', ERGA_OMNES)
+    else:
+        origins = pd.Series(ERGA_OMNES, index=df.index)
+    rates = df['Duty'].apply(parse_duty_rate)
+
+    valid = (codes != '') & rates.notna()
+    skipped = (~valid).sum()
+    if skipped:
+        print(f"⚠️ {skipped} строк тарифа без кода или процентной ставки пропущено")
+
+    tariff = rates[valid].groupby(origins[valid] + ':' + codes[valid]).max()
+    return tariff.astype(float)
+
+
+def _fingerprint(file_path):
+    stat = os.stat(file_path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def load_uk_tariff(file_path):
+    """Индекс тарифа из кэша; компилирует выгрузку, если кэша нет или она изменилась."""
+    cache_path = Path(f"{file_path}.index.npz")
+    fingerprint = _fingerprint(file_path)
+
+    if cache_path.exists():
+        with np.load(cache_path, allow_pickle=False) as cached:
+            if str(cached['fingerprint']) == fingerprint:
+                return pd.Series(cached['rates'], index=cached['keys'])
+
+    tariff = compile_tariff(file_path)
+    np.savez(
+        cache_path,
+        keys=tariff.index.to_numpy(dtype=str),
+        rates=tariff.to_numpy(),
+        fingerprint=np.array(fingerprint),
+    )
+    print(f"✓ Тариф {file_path} скомпилирован: {len(tariff)} ставок")
+    return tariff
+
+
+def lookup_duty_rates(tariff, codes, origins):
+    """
+    Ставки Duty для столбца кодов товаров по самому длинному префиксу.
+
+    Args:
+        tariff (pd.Series): индекс из load_uk_tariff
+        codes (pd.Series): коды товаров строк
+        origins (pd.Series): ISO коды стран происхождения строк
+
+    Returns:
+        pd.Series: ставка на строку, NaN - кода нет в тарифе
+    """
+    index = codes.index
+    codes = normalize_codes(codes)
+    origins = origins.astype(str).str.strip().str.upper() + ':'
+
+    tariff_codes = tariff.index.to_series().str.split(':', n=1).str[1]
+    lengths = sorted(tariff_codes.str.len().unique(), reverse=True)
+    rates = tariff.to_numpy()
+
+    result = np.full(len(codes), np.nan)
+    for prefixes in (origins, pd.Series(ERGA_OMNES + ':', index=index)):
+        for length in lengths:
+            pending = np.flatnonzero(np.isnan(result))
+            if len(pending) == 0:
+                break
+            candidates = prefixes.iloc[pending] + codes.iloc[pending].str[:length]
+            found = tariff.index.get_indexer(candidates)
+            hits = found >= 0
+            result[pending[hits]] = rates[found[hits]]
+
+    return pd.Series(result, index=index)